@@ -0,0 +1,163 @@
+# coding=utf-8
+"""Benchmark suite timing the controller methods and the DAO operations at several scales of synthetic data (see
+benchmarks.generate). For every scale, the collections are dropped and reloaded, and each operation is repeated
+and reported with its median, minimum and maximum latency and the number of operations it sends to the database
+(round trips; additional batches of a cursor are not counted). The results are written as JSON including the
+current commit, such that runs can be compared between commits via --baseline.
+
+By default the in-memory storage engine is used, such that the suite runs without a database server. Use
+--engine mongo to benchmark against the MongoDB configured in the .env file (the collections are dropped!).
+
+Run from the backend folder:
+
+    python -m benchmarks.bench_controllers [--scales 100,1000] [--repeat 5] [--engine memory] [--output results.json] [--baseline previous.json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+class RoundTrips:
+    def __init__(self):
+        """Counter of the operations sent to the database via the collections wrapped by CountingCollection."""
+        self.count = 0
+
+class CountingCollection:
+    # operations of a collection which each cause (at least) one round trip to the database
+    OPERATIONS = ['insert_one', 'insert_many', 'find', 'find_one', 'find_one_and_update', 'aggregate', 'update_one', 'update_many', 'replace_one',
+        'delete_one', 'delete_many', 'bulk_write', 'count_documents']
+
+    def __init__(self, collection, roundtrips: RoundTrips):
+        """Wrap a collection (of any storage engine) and count the operations sent through it."""
+        self._collection = collection
+        self._roundtrips = roundtrips
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if name not in self.OPERATIONS:
+            return attribute
+        def operation(*args, **kwargs):
+            self._roundtrips.count += 1
+            return attribute(*args, **kwargs)
+        return operation
+
+def measure(operation, repeat: int, roundtrips: RoundTrips, setup=None):
+    """Time an operation, which is repeated with the (optional) arguments returned by setup.
+
+    returns:
+        result -- dict containing the median, minimum and maximum latency in milliseconds and the number of round trips of one execution
+    """
+    timings = []
+    for i in range(repeat):
+        args = setup(i) if setup else ()
+        roundtrips.count = 0
+        start = time.perf_counter()
+        operation(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+        trips = roundtrips.count
+    return {'median_ms': statistics.median(timings), 'min_ms': min(timings), 'max_ms': max(timings), 'round_trips': trips}
+
+def benchmark(scale: int, args, daos: dict, roundtrips: RoundTrips):
+    """Load the synthetic data of the given scale and benchmark all operations on it.
+
+    returns:
+        results -- dict mapping the names of the operations to their measurements (see measure)
+    """
+    from benchmarks.generate import Generator, load
+    from src.controllers.usercontroller import UserController
+    from src.controllers.taskcontroller import TaskController
+
+    for dao in daos.values():
+        dao.drop()
+    generator = Generator(seed=args.seed, max_tasks=args.max_tasks, max_todos=args.max_todos)
+    users = list(generator.users(scale))
+    load(daos, users)
+    for dao in daos.values():
+        dao.collection = CountingCollection(dao.collection, roundtrips)
+
+    usercontroller = UserController(daos['user'])
+    taskcontroller = TaskController(tasks_dao=daos['task'], videos_dao=daos['video'], todos_dao=daos['todo'], users_dao=daos['user'])
+
+    # users ordered by their number of tasks: the median user is representative, the largest one shows the tail
+    ranked = sorted((documents['user'][0] for documents in users), key=lambda user: len(user['tasks']))
+    median, largest = ranked[len(ranked) // 2], ranked[-1]
+    rawtasks = next(documents['task'] for documents in users if documents['user'][0] is largest)
+    # distinct users (with at least one task) for the destructive operations, taken from the middle of the ranking
+    victims = [user for user in ranked[len(ranked) // 2:] if user['tasks']][:args.repeat]
+
+    operations = {
+        'UserController.get_user_by_email': (lambda: usercontroller.get_user_by_email(median['email']), None),
+        'UserController.get': (lambda: usercontroller.get(str(median['_id'])), None),
+        'UserController.get_page(100)': (lambda: list(usercontroller.get_page(limit=100)), None),
+        'TaskController.get': (lambda: taskcontroller.get(str(largest['tasks'][0])), None),
+        'TaskController.get_tasks_of_user(median)': (lambda: taskcontroller.get_tasks_of_user(str(median['_id'])), None),
+        'TaskController.get_tasks_of_user(largest)': (lambda: taskcontroller.get_tasks_of_user(str(largest['_id'])), None),
+        'TaskController.create(10 todos)': (lambda: taskcontroller.create({'userid': str(median['_id']), 'title': 'Benchmark', 'description': 'Benchmark',
+            'url': 'benchmark', 'todos': [f'Todo {i}' for i in range(10)]}), None),
+        'TaskController.delete_of_user': (lambda user: taskcontroller.delete_of_user(str(user['_id'])), lambda i: (victims[i % len(victims)],)),
+        'DAO.findOne': (lambda: daos['user'].findOne(str(median['_id'])), None),
+        'DAO.find(tasks of largest)': (lambda: daos['task'].find(filter={'_id': {'$in': largest['tasks']}}), None),
+        'DAO.to_json(tasks of largest)': (lambda: [daos['task'].to_json(task) for task in rawtasks], None)
+    }
+
+    results = {}
+    for name, (operation, setup) in operations.items():
+        results[name] = measure(operation, args.repeat, roundtrips, setup=setup)
+        print(f'{scale:>8} users  {name:<45} {results[name]["median_ms"]:10.3f} ms  {results[name]["round_trips"]:4} round trips', file=sys.stderr)
+    results['documents'] = {name: len([document for documents in users for document in documents[name]]) for name in daos}
+    return results
+
+def compare(results: dict, baseline: dict):
+    """Print the ratio of the median latencies of the current results to the ones of a baseline run."""
+    print(f'comparison to {baseline.get("commit")}:', file=sys.stderr)
+    for scale, operations in results['scales'].items():
+        for name, measurement in operations.items():
+            previous = baseline.get('scales', {}).get(scale, {}).get(name)
+            if name != 'documents' and previous:
+                ratio = measurement['median_ms'] / previous['median_ms'] if previous['median_ms'] else float('inf')
+                print(f'{scale:>8} users  {name:<45} {ratio:6.2f}x  ({previous["round_trips"]} -> {measurement["round_trips"]} round trips)', file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the controllers and data access objects at several scales')
+    parser.add_argument('--scales', default='100,1000', help='comma separated numbers of users')
+    parser.add_argument('--max-tasks', type=int, default=1000, help='maximum number of tasks per user')
+    parser.add_argument('--max-todos', type=int, default=100, help='maximum number of todos per task')
+    parser.add_argument('--seed', type=int, default=42, help='seed of the data generator')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed repetitions per operation')
+    parser.add_argument('--engine', choices=['memory', 'mongo'], default='memory', help='storage engine (see STORAGE_ENGINE)')
+    parser.add_argument('--output', help='optional file to write the results to (JSON)')
+    parser.add_argument('--baseline', help='optional results of a previous run to compare to')
+    args = parser.parse_args()
+
+    from src.util.config import updateConfig
+    updateConfig({'STORAGE_ENGINE': args.engine, 'DAO_CACHE': 'false'})
+    from src.util.daos import getDao
+    daos = {name: getDao(collection_name=name) for name in ['user', 'task', 'video', 'todo']}
+    roundtrips = RoundTrips()
+
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    results = {
+        'commit': commit or None,
+        'engine': args.engine,
+        'seed': args.seed,
+        'max_tasks': args.max_tasks,
+        'max_todos': args.max_todos,
+        'repeat': args.repeat,
+        'python': sys.version.split()[0],
+        'scales': {}
+    }
+    for scale in [int(scale) for scale in args.scales.split(',')]:
+        results['scales'][str(scale)] = benchmark(scale, args, daos, roundtrips)
+
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            compare(results, json.load(f))
+
+if __name__ == '__main__':
+    main()
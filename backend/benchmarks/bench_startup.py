@@ -0,0 +1,65 @@
+# coding=utf-8
+"""Startup benchmark tracking the cold-start latency of the server: every sample starts a fresh interpreter,
+which imports the main module (which creates the app) and reports the elapsed time, the number of running
+threads and the number of MongoDB clients created during startup (which should be 0, as the data access
+objects connect lazily).
+
+Run from the backend folder:
+
+    python -m benchmarks.bench_startup [--samples 10] [--output startup.json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+PROBE = '''
+import json, threading, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+main.create_app()
+created = time.perf_counter()
+from src.util.clients import clients
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'threads': threading.active_count(),
+    'clients': len(clients)
+}))
+'''
+
+def sample():
+    """Start a fresh interpreter and measure the startup of the server."""
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', PROBE], capture_output=True, text=True, check=True).stdout
+    total = (time.perf_counter() - start) * 1000
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_ms'] = total
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the cold start of the server')
+    parser.add_argument('--samples', type=int, default=10, help='number of fresh interpreters to start')
+    parser.add_argument('--output', help='optional file to write the results to (JSON)')
+    args = parser.parse_args()
+
+    samples = [sample() for _ in range(args.samples)]
+    results = {
+        'samples': len(samples),
+        'threads': max(s['threads'] for s in samples),
+        'clients': max(s['clients'] for s in samples)
+    }
+    for key in ['process_ms', 'import_ms', 'create_app_ms']:
+        values = [s[key] for s in samples]
+        results[key] = {'median': statistics.median(values), 'min': min(values), 'max': max(values)}
+
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+if __name__ == '__main__':
+    main()
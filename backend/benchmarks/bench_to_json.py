@@ -0,0 +1,62 @@
+# coding=utf-8
+"""Micro-benchmark comparing the conversion of MongoDB documents to JSON via the json_util round trip
+(json.loads(json_util.dumps(...)) followed by jsonify) with the direct conversion of src.util.bsonjson.
+
+Run from the backend folder:
+
+    python -m benchmarks.bench_to_json [--tasks 50] [--todos 10] [--repeat 20]
+"""
+import argparse
+import datetime
+import json
+import timeit
+
+from bson import json_util
+from bson.objectid import ObjectId
+from flask import Flask
+
+from src.util.bsonjson import to_json, BSONJSONProvider
+
+def make_task(todos: int):
+    """Create a populated task document of realistic size (as returned by the task aggregation pipeline)."""
+    return {
+        '_id': ObjectId(),
+        'title': 'Improve Devtools',
+        'description': 'Upgrade the tools used for web development. In order to keep web development effective, the right choice of tools is critical.',
+        'startdate': datetime.datetime.utcnow(),
+        'duedate': datetime.datetime.utcnow() + datetime.timedelta(days=7),
+        'categories': ['web', 'tools'],
+        'requires': [ObjectId(), ObjectId()],
+        'video': {'_id': ObjectId(), 'url': 'U_gANjtv28g'},
+        'todos': [{'_id': ObjectId(), 'description': f'Todo number {i}', 'done': i % 2 == 0} for i in range(todos)]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the BSON to JSON conversion of task documents')
+    parser.add_argument('--tasks', type=int, default=50, help='number of tasks per response')
+    parser.add_argument('--todos', type=int, default=10, help='number of todos per task')
+    parser.add_argument('--repeat', type=int, default=20, help='number of timed repetitions')
+    args = parser.parse_args()
+
+    documents = [make_task(args.todos) for _ in range(args.tasks)]
+    assert [to_json(d) for d in documents] == [json.loads(json_util.dumps(d)) for d in documents]
+
+    app = Flask('benchmark')
+    legacyprovider = app.json
+    provider = BSONJSONProvider(app)
+
+    candidates = {
+        'to_json (dumps/loads)': lambda: [json.loads(json_util.dumps(d)) for d in documents],
+        'to_json (bsonjson)': lambda: [to_json(d) for d in documents],
+        'response (dumps/loads + jsonify)': lambda: legacyprovider.dumps([json.loads(json_util.dumps(d)) for d in documents]),
+        'response (bsonjson + jsonify)': lambda: provider.dumps([to_json(d) for d in documents]),
+        'response (provider only)': lambda: provider.dumps(documents)
+    }
+
+    print(f'{args.tasks} tasks with {args.todos} todos each, best of {args.repeat}')
+    for name, candidate in candidates.items():
+        best = min(timeit.repeat(candidate, number=1, repeat=args.repeat))
+        print(f'{name:<35} {best * 1000:8.3f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+# coding=utf-8
+"""Seeded generator of synthetic users, tasks, videos and todos at configurable scale. The number of tasks per
+user and of todos per task follow a heavy-tailed (log-normal) distribution capped at the given maxima, such that
+most users have a handful of tasks while a few have very many. The same seed always produces the same data
+(including the ids).
+
+Run from the backend folder to load the data into the database configured in the .env file (or the environment):
+
+    python -m benchmarks.generate [--users 100000] [--max-tasks 1000] [--max-todos 100] [--seed 42] [--drop]
+"""
+import argparse
+import datetime
+import json
+import random
+import struct
+import time
+
+from bson.objectid import ObjectId
+
+FIRSTNAMES = ['Jane', 'John', 'Alice', 'Bob', 'Carol', 'Dave', 'Erin', 'Frank', 'Grace', 'Heidi', 'Ivan', 'Judy', 'Mallory', 'Niaj', 'Olivia', 'Peggy', 'Rupert', 'Sybil', 'Trent', 'Victor', 'Walter']
+LASTNAMES = ['Doe', 'Smith', 'Johnson', 'Brown', 'Garcia', 'Miller', 'Davis', 'Lopez', 'Wilson', 'Anderson', 'Taylor', 'Moore', 'Martin', 'Lee', 'Clark', 'Lewis', 'Walker', 'Young', 'King', 'Scott']
+TOPICS = ['Devtools', 'Tech Stacks', 'Javascript', 'Python', 'Testing', 'Databases', 'Security', 'Accessibility', 'Performance', 'Design Patterns', 'Refactoring', 'Cloud', 'Containers', 'Git', 'Algorithms']
+VERBS = ['Improve', 'Learn', 'Explore', 'Master', 'Review', 'Practice', 'Understand', 'Apply']
+CATEGORIES = ['web', 'tools', 'backend', 'frontend', 'testing', 'devops', 'theory']
+TODOS = ['Watch video', 'Take notes', 'Summarize the main points', 'Try the examples', 'Discuss with a colleague', 'Apply it in a project', 'Write a blog post', 'Review the comments']
+ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'
+
+# all generated ids and dates start from this point in time
+EPOCH = datetime.datetime(2023, 1, 1)
+
+class Generator:
+    def __init__(self, seed: int = 42, max_tasks: int = 1000, max_todos: int = 100):
+        """Create a generator of synthetic data.
+
+        parameters:
+            seed -- seed of the random number generator
+            max_tasks -- maximum number of tasks per user
+            max_todos -- maximum number of todos per task
+        """
+        self.random = random.Random(seed)
+        self.max_tasks = max_tasks
+        self.max_todos = max_todos
+        self.counter = 0
+
+    def id(self):
+        """Create a reproducible ObjectId, whose timestamp increases with every id (like ids created over time)."""
+        self.counter += 1
+        timestamp = int(EPOCH.timestamp()) + self.counter // 1000
+        return ObjectId(struct.pack('>I', timestamp) + self.random.getrandbits(64).to_bytes(8, 'big'))
+
+    def count(self, mu: float, sigma: float, maximum: int):
+        return min(maximum, int(self.random.lognormvariate(mu, sigma)))
+
+    def user(self, index: int):
+        """Generate one user (with a unique email address) together with all of its tasks.
+
+        returns:
+            documents -- dict mapping the collection names (user, task, video, todo) to the lists of generated documents
+        """
+        first, last = self.random.choice(FIRSTNAMES), self.random.choice(LASTNAMES)
+        user = {'_id': self.id(), 'firstName': first, 'lastName': last, 'email': f'{first.lower()}.{last.lower()}.{index}@example.com', 'tasks': []}
+        documents = {'user': [user], 'task': [], 'video': [], 'todo': []}
+
+        for _ in range(self.count(1.5, 1.2, self.max_tasks)):
+            video = {'_id': self.id(), 'url': ''.join(self.random.choice(ALPHABET) for _ in range(11))}
+            todos = [{'_id': self.id(), 'description': self.random.choice(TODOS), 'done': self.random.random() < 0.3}
+                for _ in range(self.count(1.2, 0.9, self.max_todos))]
+            start = EPOCH + datetime.timedelta(days=self.random.randrange(365), minutes=self.random.randrange(1440))
+            topic = self.random.choice(TOPICS)
+            task = {
+                '_id': self.id(),
+                'title': f'{self.random.choice(VERBS)} {topic}',
+                'description': f'Get better at {topic.lower()}. ' * self.random.randint(1, 5),
+                'startdate': start,
+                'duedate': start + datetime.timedelta(days=self.random.randint(1, 60)),
+                'categories': self.random.sample(CATEGORIES, self.random.randint(0, 3)),
+                'video': video['_id'],
+                'todos': [todo['_id'] for todo in todos]
+            }
+            user['tasks'].append(task['_id'])
+            documents['task'].append(task)
+            documents['video'].append(video)
+            documents['todo'] += todos
+        return documents
+
+    def users(self, n: int):
+        """Generate n users (see user) one after another, such that arbitrarily large data sets can be streamed into the database."""
+        for index in range(n):
+            yield self.user(index)
+
+def load(daos: dict, users, chunk_size: int = 10000):
+    """Insert generated users into the collections of the given data access objects, buffering the documents of each collection and inserting them in chunks of unordered insert_many operations.
+
+    parameters:
+        daos -- dict mapping the collection names (user, task, video, todo) to data access objects
+        users -- iterable of generated users (see Generator.users)
+        chunk_size -- maximum number of documents per insert_many operation
+
+    returns:
+        counts -- dict mapping the collection names to the number of inserted documents
+    """
+    buffers = {name: [] for name in daos}
+    counts = {name: 0 for name in daos}
+
+    def flush(name):
+        if buffers[name]:
+            daos[name].collection.insert_many(buffers[name], ordered=False)
+            counts[name] += len(buffers[name])
+            buffers[name] = []
+
+    for documents in users:
+        for name, items in documents.items():
+            buffers[name] += items
+            if len(buffers[name]) >= chunk_size:
+                flush(name)
+    for name in daos:
+        flush(name)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description='Load synthetic data into the database')
+    parser.add_argument('--users', type=int, default=1000, help='number of users')
+    parser.add_argument('--max-tasks', type=int, default=1000, help='maximum number of tasks per user')
+    parser.add_argument('--max-todos', type=int, default=100, help='maximum number of todos per task')
+    parser.add_argument('--seed', type=int, default=42, help='seed of the random number generator')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='number of documents per insert_many operation')
+    parser.add_argument('--drop', action='store_true', help='drop the collections before loading')
+    args = parser.parse_args()
+
+    from src.util.daos import getDao
+    daos = {name: getDao(collection_name=name) for name in ['user', 'task', 'video', 'todo']}
+    if args.drop:
+        for dao in daos.values():
+            dao.drop()
+
+    start = time.perf_counter()
+    generator = Generator(seed=args.seed, max_tasks=args.max_tasks, max_todos=args.max_todos)
+    counts = load(daos, generator.users(args.users), chunk_size=args.chunk_size)
+    print(json.dumps({'counts': counts, 'seconds': time.perf_counter() - start}, indent=4))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,402 @@
+# coding=utf-8
+"""HTTP load generator replaying a configurable mix of calls against the routes of the server, either closed-loop
+(every client sends its next request as soon as the previous one is answered) or open-loop (requests are scheduled
+at a fixed target rate, independent of the response times, and their latency is measured from the scheduled start,
+such that queueing in an overloaded server is not hidden). Per route, the latency percentiles (p50, p95, p99,
+p999), a latency histogram, the throughput, the status codes and the error rate are reported as JSON.
+
+Before the load starts, the harness creates its own users (with unique email addresses), tasks and todos through
+the API, such that it works against a database in any state. Routes which delete objects only delete objects
+created by the load test itself.
+
+Run from the backend folder against a running server (e.g., python main.py with a local mongod), or start the
+server as a subprocess with --start:
+
+    python -m benchmarks.loadtest [--url http://localhost:5000] [--start] [--mode closed|open] [--clients 16]
+        [--rps 200] [--duration 30] [--mix mix.json] [--output results.json]
+
+The mix is a JSON object mapping route names (see ROUTES) to relative weights; routes missing from the mix are
+not called.
+"""
+import argparse
+import http.client
+import json
+import os
+import queue
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+
+# upper bounds (in milliseconds) of the buckets of the latency histograms
+BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, float('inf')]
+
+class State:
+    def __init__(self, prefix: str):
+        """Objects known to the load test: the fixture objects created during setup, which are only read and updated, and the objects created during the load, which may also be deleted."""
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.users = []
+        self.tasks = []
+        self.todos = []
+        self.created = {'user': [], 'task': [], 'todo': []}
+        self.counter = 0
+
+    def unique(self):
+        with self.lock:
+            self.counter += 1
+            return f'{self.prefix}-{self.counter}'
+
+    def add(self, kind: str, id: str):
+        with self.lock:
+            self.created[kind].append(id)
+
+    def take(self, kind: str):
+        """Remove and return an object created during the load (or None if there is none)."""
+        with self.lock:
+            if self.created[kind]:
+                return self.created[kind].pop()
+            return None
+
+def oid(document: dict):
+    return document['_id']['$oid']
+
+def remember_task(state: State, body):
+    """Response handler of the routes which return a populated task, remembering the task (and its todos)."""
+    if body:
+        state.add('task', oid(body))
+        for todo in body.get('todos', []):
+            state.add('todo', oid(todo))
+
+def create_user(state: State, rng: random.Random):
+    email = f'{state.unique()}@loadtest.example.com'
+    return 'POST', '/users/create', {'firstName': 'Load', 'lastName': 'Test', 'email': email}, lambda state, body: state.add('user', oid(body))
+
+def create_task(state: State, rng: random.Random, prefix: str = ''):
+    userid, _ = rng.choice(state.users)
+    form = {'userid': userid, 'title': f'Task {state.unique()}', 'description': 'Created by the load test', 'url': 'dQw4w9WgXcQ',
+        'todos': [f'Todo {i}' for i in range(rng.randint(1, 5))]}
+    return 'POST', f'/tasks{prefix}/create', form, remember_task
+
+def create_todo(state: State, rng: random.Random, prefix: str = ''):
+    return 'POST', f'/todos{prefix}/create', {'taskid': rng.choice(state.tasks), 'description': f'Todo {state.unique()}'}, lambda state, body: state.add('todo', oid(body))
+
+def delete(kind: str, path: str):
+    def request(state: State, rng: random.Random):
+        id = state.take(kind)
+        return ('DELETE', path.format(id=id), None, None) if id else None
+    return request
+
+# the calls of every route: a function of the state and a random number generator returning the method, the path, the
+# form data and an optional handler of the (JSON) response body, or None if the route cannot be called right now
+ROUTES = {
+    'GET /': lambda state, rng: ('GET', '/', None, None),
+    'GET /users/all': lambda state, rng: ('GET', '/users/all', None, None),
+    'GET /users/all?limit=100': lambda state, rng: ('GET', '/users/all?limit=100', None, None),
+    'GET /users/<id>': lambda state, rng: ('GET', f'/users/{rng.choice(state.users)[0]}', None, None),
+    'GET /users/bymail/<email>': lambda state, rng: ('GET', f'/users/bymail/{rng.choice(state.users)[1]}', None, None),
+    'POST /users/create': create_user,
+    'PUT /users/<id>': lambda state, rng: ('PUT', f'/users/{rng.choice(state.users)[0]}', {'lastName': f'Test {rng.randint(0, 9)}'}, None),
+    'DELETE /users/<id>': delete('user', '/users/{id}'),
+    'GET /tasks/byid/<id>': lambda state, rng: ('GET', f'/tasks/byid/{rng.choice(state.tasks)}', None, None),
+    'GET /tasks/ofuser/<id>': lambda state, rng: ('GET', f'/tasks/ofuser/{rng.choice(state.users)[0]}', None, None),
+    'POST /tasks/create': create_task,
+    'PUT /tasks/byid/<id>': lambda state, rng: ('PUT', f'/tasks/byid/{rng.choice(state.tasks)}', {'data': json.dumps({'$set': {'description': f'Updated {rng.randint(0, 9)}'}})}, None),
+    'DELETE /tasks/byid/<id>': delete('task', '/tasks/byid/{id}'),
+    'GET /todos/byid/<id>': lambda state, rng: ('GET', f'/todos/byid/{rng.choice(state.todos)}', None, None),
+    'POST /todos/create': create_todo,
+    'PUT /todos/byid/<id>': lambda state, rng: ('PUT', f'/todos/byid/{rng.choice(state.todos)}', {'data': json.dumps({'$set': {'done': rng.random() < 0.5}})}, None),
+    'DELETE /todos/byid/<id>': delete('todo', '/todos/byid/{id}'),
+    'GET /users/async/<id>': lambda state, rng: ('GET', f'/users/async/{rng.choice(state.users)[0]}', None, None),
+    'GET /tasks/async/byid/<id>': lambda state, rng: ('GET', f'/tasks/async/byid/{rng.choice(state.tasks)}', None, None),
+    'GET /tasks/async/ofuser/<id>': lambda state, rng: ('GET', f'/tasks/async/ofuser/{rng.choice(state.users)[0]}', None, None),
+    'POST /tasks/async/create': lambda state, rng: create_task(state, rng, prefix='/async'),
+    'POST /todos/async/create': lambda state, rng: create_todo(state, rng, prefix='/async'),
+    'POST /populate': lambda state, rng: ('POST', '/populate', None, None)
+}
+
+# default mix of a mostly reading workload (/populate is left out, as it fails once its users exist)
+MIX = {
+    'GET /': 1,
+    'GET /users/all?limit=100': 2,
+    'GET /users/<id>': 10,
+    'GET /users/bymail/<email>': 10,
+    'POST /users/create': 2,
+    'PUT /users/<id>': 2,
+    'DELETE /users/<id>': 1,
+    'GET /tasks/byid/<id>': 10,
+    'GET /tasks/ofuser/<id>': 20,
+    'POST /tasks/create': 4,
+    'PUT /tasks/byid/<id>': 2,
+    'DELETE /tasks/byid/<id>': 1,
+    'GET /todos/byid/<id>': 10,
+    'POST /todos/create': 4,
+    'PUT /todos/byid/<id>': 4,
+    'DELETE /todos/byid/<id>': 2,
+    'GET /tasks/async/ofuser/<id>': 5
+}
+
+class Client:
+    def __init__(self, url: str, timeout: float):
+        """HTTP client keeping one connection to the server (reconnecting whenever the server closes it)."""
+        parsed = urllib.parse.urlsplit(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.timeout = timeout
+        self.connection = None
+
+    def send(self, method: str, path: str, form: dict = None):
+        """Send a request and return the status code and the (JSON) response body."""
+        body, headers = None, {}
+        if form is not None:
+            body = urllib.parse.urlencode(form, doseq=True)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                if response.will_close:
+                    self.close()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # the server closed an idle keep-alive connection: retry once on a new connection
+                self.close()
+                if attempt == 1:
+                    raise
+            except Exception as e:
+                self.close()
+                raise
+        content = json.loads(data) if data and response.getheader('Content-Type', '').startswith('application/json') else None
+        return response.status, content
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+class Recorder:
+    def __init__(self):
+        """Collects the latencies and outcomes of all requests per route."""
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+        self.skipped = {}
+
+    def record(self, route: str, latency: float, status):
+        with self.lock:
+            self.latencies.setdefault(route, []).append(latency)
+            statuses = self.statuses.setdefault(route, {})
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def skip(self, route: str):
+        with self.lock:
+            self.skipped[route] = self.skipped.get(route, 0) + 1
+
+def percentile(values: list, p: float):
+    """Obtain the p-th percentile (nearest rank) of a sorted list of values."""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, int(round(p / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+def summarize(latencies: list, statuses: dict, errors: int, skipped: int, duration: float):
+    values = sorted(latency * 1000 for latency in latencies)
+    # number of requests per bucket, whose upper bound is le (the last bucket, le = None, is unbounded)
+    counts = [0] * len(BUCKETS)
+    bucket = 0
+    for value in values:
+        while value > BUCKETS[bucket]:
+            bucket += 1
+        counts[bucket] += 1
+    histogram = [{'le': None if bound == float('inf') else bound, 'count': count} for bound, count in zip(BUCKETS, counts)]
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'error_rate': errors / len(values) if values else 0.0,
+        'skipped': skipped,
+        'throughput_rps': len(values) / duration if duration else 0.0,
+        'latency_ms': {
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'p99': percentile(values, 99),
+            'p999': percentile(values, 99.9),
+            'mean': sum(values) / len(values) if values else None,
+            'max': values[-1] if values else None
+        },
+        'histogram_ms': histogram,
+        'status': statuses
+    }
+
+def report(recorder: Recorder, duration: float, config: dict):
+    """Obtain the results in a stable JSON structure (keys are sorted on output)."""
+    routes = {}
+    for route in set(recorder.latencies) | set(recorder.skipped):
+        routes[route] = summarize(recorder.latencies.get(route, []), recorder.statuses.get(route, {}), recorder.errors.get(route, 0), recorder.skipped.get(route, 0), duration)
+    everything = [latency for latencies in recorder.latencies.values() for latency in latencies]
+    statuses = {}
+    for route_statuses in recorder.statuses.values():
+        for status, count in route_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+    return {
+        'config': config,
+        'duration_s': duration,
+        'routes': routes,
+        'total': summarize(everything, statuses, sum(recorder.errors.values()), sum(recorder.skipped.values()), duration)
+    }
+
+def setup(client: Client, state: State, users: int, tasks: int):
+    """Create the fixture objects of the load test through the API."""
+    for _ in range(users):
+        email = f'{state.unique()}@loadtest.example.com'
+        status, user = client.send('POST', '/users/create', {'firstName': 'Load', 'lastName': 'Test', 'email': email})
+        if status != 200:
+            raise RuntimeError(f'Could not create a user (status {status})')
+        state.users.append((oid(user), email))
+        for _ in range(tasks):
+            status, task = client.send('POST', '/tasks/create', {'userid': oid(user), 'title': f'Task {state.unique()}', 'description': 'Fixture of the load test',
+                'url': 'dQw4w9WgXcQ', 'todos': ['Watch video', 'Take notes', 'Apply it']})
+            if status != 200:
+                raise RuntimeError(f'Could not create a task (status {status})')
+            state.tasks.append(oid(task))
+            state.todos += [oid(todo) for todo in task['todos']]
+
+def call(client: Client, state: State, recorder: Recorder, route: str, rng: random.Random, start: float = None):
+    """Send one request of the given route and record its latency (measured from start, if given, for open-loop load)."""
+    request = ROUTES[route](state, rng)
+    if request is None:
+        recorder.skip(route)
+        return
+    method, path, form, handler = request
+    start = time.perf_counter() if start is None else start
+    try:
+        status, body = client.send(method, path, form)
+        if handler is not None and status == 200:
+            handler(state, body)
+    except Exception as e:
+        status = e.__class__.__name__
+    recorder.record(route, time.perf_counter() - start, status)
+
+def closed_loop(args, state: State, recorder: Recorder, routes: list, weights: list):
+    deadline = time.perf_counter() + args.duration
+    def run(index):
+        rng = random.Random(args.seed + index)
+        client = Client(args.url, args.timeout)
+        while time.perf_counter() < deadline:
+            call(client, state, recorder, rng.choices(routes, weights)[0], rng)
+            if args.think:
+                time.sleep(rng.expovariate(1 / args.think))
+        client.close()
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def open_loop(args, state: State, recorder: Recorder, routes: list, weights: list):
+    scheduled = queue.Queue()
+    def run(index):
+        rng = random.Random(args.seed + index)
+        client = Client(args.url, args.timeout)
+        while True:
+            item = scheduled.get()
+            if item is None:
+                break
+            route, start = item
+            call(client, state, recorder, route, rng, start=start)
+        client.close()
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(args.clients)]
+    for thread in threads:
+        thread.start()
+
+    # schedule the requests as a Poisson process at the target rate
+    rng = random.Random(args.seed)
+    begin = time.perf_counter()
+    next = begin
+    while next < begin + args.duration:
+        delay = next - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        scheduled.put((rng.choices(routes, weights)[0], next))
+        next += rng.expovariate(args.rps)
+    for _ in threads:
+        scheduled.put(None)
+    for thread in threads:
+        thread.join()
+
+def start_server(url: str):
+    """Start the server (main.py) as a subprocess listening on the port of the given url and wait until it responds."""
+    port = urllib.parse.urlsplit(url).port or 80
+    environment = dict(os.environ, PORT=str(port), FLASK_BIND_IP='127.0.0.1')
+    server = subprocess.Popen([sys.executable, 'main.py'], env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    client = Client(url, timeout=1)
+    for _ in range(100):
+        try:
+            client.send('GET', '/')
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError('The server did not start')
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a mix of HTTP calls against the server and report latency percentiles per route')
+    parser.add_argument('--url', default='http://localhost:5000', help='base url of the server')
+    parser.add_argument('--start', action='store_true', help='start the server (main.py) as a subprocess for the duration of the test')
+    parser.add_argument('--mode', choices=['closed', 'open'], default='closed', help='closed-loop (clients wait for responses) or open-loop (fixed arrival rate)')
+    parser.add_argument('--clients', type=int, default=16, help='number of concurrent clients (connections)')
+    parser.add_argument('--rps', type=float, default=100, help='target request rate of the open-loop mode')
+    parser.add_argument('--think', type=float, default=0, help='mean think time (in seconds) between the requests of a closed-loop client')
+    parser.add_argument('--duration', type=float, default=30, help='duration of the load in seconds')
+    parser.add_argument('--timeout', type=float, default=30, help='timeout of a request in seconds')
+    parser.add_argument('--mix', help='JSON file mapping route names to weights (default: a mostly reading mix)')
+    parser.add_argument('--users', type=int, default=20, help='number of users created as fixture')
+    parser.add_argument('--tasks', type=int, default=5, help='number of tasks created per fixture user')
+    parser.add_argument('--seed', type=int, default=42, help='seed of the random choices')
+    parser.add_argument('--output', help='optional file to write the results to (JSON)')
+    args = parser.parse_args()
+
+    mix = MIX
+    if args.mix:
+        with open(args.mix, 'r') as f:
+            mix = json.load(f)
+    unknown = [route for route in mix if route not in ROUTES]
+    if unknown:
+        parser.error(f'unknown routes in the mix: {", ".join(unknown)}')
+    routes = [route for route, weight in mix.items() if weight > 0]
+    weights = [mix[route] for route in routes]
+
+    server = start_server(args.url) if args.start else None
+    try:
+        state = State(prefix=f'loadtest-{uuid.uuid4().hex[:8]}')
+        setup(Client(args.url, args.timeout), state, args.users, args.tasks)
+
+        recorder = Recorder()
+        begin = time.perf_counter()
+        if args.mode == 'closed':
+            closed_loop(args, state, recorder, routes, weights)
+        else:
+            open_loop(args, state, recorder, routes, weights)
+        duration = time.perf_counter() - begin
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    config = {key: value for key, value in vars(args).items() if key not in ['output', 'start']}
+    config['mix'] = mix
+    results = report(recorder, duration, config)
+    print(json.dumps(results, indent=4, sort_keys=True))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
@@ -1,51 +1,110 @@
 # coding=utf-8
-import os, json
-from dotenv import dotenv_values, load_dotenv
-load_dotenv()
+import json
 
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, current_app, request, g
 from flask_cors import CORS, cross_origin
 
 from src.blueprints.userblueprint import user_blueprint
 from src.blueprints.taskblueprint import task_blueprint
 from src.blueprints.todoblueprint import todo_blueprint
+from src.blueprints.jobblueprint import job_blueprint
+from src.blueprints.statisticsblueprint import statistics_blueprint
 
 from src.controllers.usercontroller import UserController
 from src.controllers.taskcontroller import TaskController
 from src.util.daos import getDao
-
-
-app = Flask('todoapp')
-
-# configure CORS for cross-origin resource sharing (between the frontend and backend)
-cors = CORS(app)
-app.config['CORS_HEADERS'] = 'Content-Type'
-
-# register blueprints
-app.register_blueprint(blueprint=user_blueprint, url_prefix='/users')
-app.register_blueprint(blueprint=task_blueprint, url_prefix='/tasks')
-app.register_blueprint(blueprint=todo_blueprint, url_prefix='/todos')
+from src.util.clients import getPoolOptions, getPoolStatistics
+from src.util.cache import getCacheStatistics
+from src.util.bsonjson import BSONJSONProvider
+from src.util.config import getConfig, updateConfig
+from src.util.metrics import exposition, request_started, request_finished
+from src.util import querytracker
+from src.util.compression import compress
+from src.util.jobs import getJobQueue, enqueue
 
 
 # simple heartbeat method to check if the server is running
-@app.route('/')
 @cross_origin()
 def ping():
-    VERSION = dotenv_values('.env').get('VERSION')
-    return jsonify({'version': VERSION}), 200
+    return jsonify({'version': current_app.config['VERSION']}), 200
 
-# simple population method that adds initial data to the database
-@app.route('/populate', methods=['POST'])
+# usage statistics of the shared MongoDB connection pools, which help to size the pools for the number of workers
+@cross_origin()
+def pool():
+    return jsonify({'options': getPoolOptions(), 'pools': getPoolStatistics()}), 200
+
+# hit, miss and eviction counters of the document caches of the data access objects (if enabled)
+@cross_origin()
+def cache():
+    return jsonify(getCacheStatistics()), 200
+
+# declared indexes which are missing, as well as undeclared and unused indexes of all collections
+@cross_origin()
+def indexes():
+    return jsonify({name: getDao(collection_name=name).report_indexes() for name in ['user', 'task', 'video', 'todo', 'job', 'dashboard', 'statistic']}), 200
+
+# request counts and latencies per route, operation counts and latencies per data access object and collection, and the
+# usage of the connection pools in the Prometheus text format
+def metrics():
+    return Response(exposition(pools=getPoolStatistics()), status=200, mimetype='text/plain; version=0.0.4')
+
+def start_request():
+    g.metrics_start = request_started()
+
+def record_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+def finish_request(exception):
+    if 'metrics_start' in g:
+        # label by the rule (e.g., /users/<id>) instead of the path, such that the number of series stays bounded
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        request_finished(g.metrics_start, route, request.method, g.get('metrics_status', 500))
+
+def start_tracking():
+    if current_app.debug or getConfig().get('QUERY_DEBUG', 'false').lower() == 'true':
+        g.querytracker = querytracker.QueryTracker()
+        g.querytracker_token = querytracker.current.set(g.querytracker)
+
+def report_queries(response):
+    if 'querytracker' in g:
+        tracker = g.querytracker
+        repeated = tracker.repeated(threshold=int(getConfig().get('QUERY_REPEAT_THRESHOLD', 3)))
+        response.headers['X-Query-Count'] = str(tracker.count)
+        response.headers['X-Query-Repeated'] = str(sum(group['count'] for group in repeated))
+        for group in repeated:
+            print(f'Repeated queries in {request.method} {request.path}: {group["count"]} x {group["command"]} {group["collection"]} {group["shape"]}')
+    return response
+
+def stop_tracking(exception):
+    if 'querytracker_token' in g:
+        querytracker.current.reset(g.querytracker_token)
+
+# simple population method that adds initial data to the database (with ?async=true in a background job)
 @cross_origin()
 def populate():
+    if request.args.get('async', '').lower() == 'true':
+        return enqueue('populate')
+    return jsonify(populate_data()), 200
+
+def populate_data(progress=None):
+    """Add the users and tasks of src/static/data/dummy.json to the database.
+
+    parameters:
+        progress -- optional function which is called with the number of created users and the total number of users
+
+    returns:
+        response -- dict containing the ids of the created users under the key users
+    """
     usercontroller = UserController(getDao(collection_name='user'))
     taskcontroller = TaskController(tasks_dao=getDao(collection_name='task'), videos_dao=getDao(collection_name='video'), todos_dao=getDao(collection_name='todo'), users_dao=getDao(collection_name='user'))
 
     response = {'users': []}
+    tasks = []
     with open(f'./src/static/data/dummy.json', 'r') as f:
         dummydata = json.load(f)
 
-        for userdata in dummydata:
+        for index, userdata in enumerate(dummydata):
             user = usercontroller.create({
                 'firstName': userdata['firstName'], 
                 'lastName': userdata['lastName'], 
@@ -53,7 +112,7 @@ def populate():
             })
 
             for taskdata in userdata['tasks']:
-                taskcontroller.create({
+                tasks.append({
                     'userid': user['_id']['$oid'],
                     'title': taskdata['title'],
                     'description': taskdata['description'],
@@ -62,19 +121,78 @@ def populate():
                 })
 
             response['users'].append(user['_id']['$oid'])
-
-    return jsonify(response), 200
+            if progress is not None:
+                # the creation of all tasks counts as one more step
+                progress(index + 1, len(dummydata) + 1)
+
+    # create the tasks of all users at once
+    taskcontroller.create_many(tasks)
+
+    return response
+
+def create_app(config: dict = None):
+    """Create and configure the flask app. The configuration (see src.util.config) is read only once and creating the app does not connect to the database: the data access objects connect and ensure their collections lazily on first use, and in every forked worker process on its own, such that the app can safely be created before a prefork server (e.g., gunicorn --preload) forks its workers.
+
+    parameters:
+        config -- optional dict of configuration values overriding the .env file and the environment variables
+
+    returns:
+        app -- the flask app
+    """
+    if config:
+        updateConfig(config)
+
+    app = Flask('todoapp')
+    app.config['VERSION'] = getConfig().get('VERSION')
+    # serialize responses (including remaining BSON values like ObjectIds) in a single pass
+    app.json = BSONJSONProvider(app)
+
+    # configure CORS for cross-origin resource sharing (between the frontend and backend)
+    # the cursor of the next page (see GET /users/all) is readable by cross-origin clients
+    CORS(app, expose_headers=['X-Next-After'])
+    app.config['CORS_HEADERS'] = 'Content-Type'
+
+    # compress large responses as negotiated via Accept-Encoding (registered first, such that it runs after all other
+    # after_request functions)
+    app.after_request(compress)
+
+    # record the metrics of every request (see /metrics)
+    app.before_request(start_request)
+    app.after_request(record_status)
+    app.teardown_request(finish_request)
+
+    # in debug mode (or with QUERY_DEBUG=true), count the queries of every request and flag repeated ones (N+1 queries)
+    app.before_request(start_tracking)
+    app.after_request(report_queries)
+    app.teardown_request(stop_tracking)
+
+    # register blueprints
+    app.register_blueprint(blueprint=user_blueprint, url_prefix='/users')
+    app.register_blueprint(blueprint=task_blueprint, url_prefix='/tasks')
+    app.register_blueprint(blueprint=todo_blueprint, url_prefix='/todos')
+    app.register_blueprint(blueprint=job_blueprint, url_prefix='/jobs')
+    app.register_blueprint(blueprint=statistics_blueprint, url_prefix='/statistics')
+
+    app.add_url_rule('/', view_func=ping)
+    app.add_url_rule('/pool', view_func=pool)
+    app.add_url_rule('/cache', view_func=cache)
+    app.add_url_rule('/indexes', view_func=indexes)
+    app.add_url_rule('/metrics', view_func=metrics)
+    app.add_url_rule('/populate', view_func=populate, methods=['POST'])
+    getJobQueue().register('populate', populate_data)
+
+    return app
+
+app = create_app()
 
 # main loop
 if __name__ == '__main__':
     # print the URL map, which lists all API endpoints of this flask server
     print(app.url_map)
 
-    host = '0.0.0.0'
-    if (os.environ.get('FLASK_BIND_IP')):
-        # in case the environment variables contain a different IP address, overwrite the host value
-        host = os.environ.get('FLASK_BIND_IP')
+    # in case the configuration contains a different IP address, overwrite the host value
+    host = getConfig().get('FLASK_BIND_IP', '0.0.0.0')
 
-    port = os.environ.get('PORT')
+    port = getConfig().get('PORT')
     app.run(host, port)
     
\ No newline at end of file
@@ -0,0 +1,28 @@
+from flask import Blueprint, jsonify, abort
+from flask_cors import cross_origin
+
+from bson.errors import InvalidId
+
+from src.util.jobs import getJobQueue
+jobs = getJobQueue()
+
+# instantiate the flask blueprint
+job_blueprint = Blueprint('job_blueprint', __name__)
+
+# obtain the status and progress of a background job (see src.util.jobs)
+@job_blueprint.route('/<id>', methods=['GET'])
+@cross_origin()
+def get_job(id):
+    try:
+        job = jobs.get(id)
+    except InvalidId as e:
+        abort(400, 'Invalid job id')
+    except Exception as e:
+        print(f'{e.__class__.__name__}: {e}')
+        abort(500, 'Unknown server error')
+    if job is None:
+        abort(404, 'Job not found')
+    # the status changes until the job has finished
+    response = jsonify(job)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response, 200
@@ -0,0 +1,35 @@
+from flask import Blueprint, jsonify, abort
+from flask_cors import cross_origin
+
+from bson.errors import InvalidId
+
+from src.util.statistics import getStatistics
+statistics = getStatistics()
+
+# instantiate the flask blueprint
+statistics_blueprint = Blueprint('statistics_blueprint', __name__)
+
+# obtain the global figures, which are served precomputed and refreshed in the background (see src.util.statistics)
+@statistics_blueprint.route('', methods=['GET'])
+@cross_origin()
+def get_overview():
+    try:
+        return jsonify(statistics.overview()), 200
+    except Exception as e:
+        print(f'{e.__class__.__name__}: {e}')
+        abort(500, 'Unknown server error')
+
+# obtain the figures of one user (its tasks, overdue tasks, todo completion and most used categories)
+@statistics_blueprint.route('/users/<id>', methods=['GET'])
+@cross_origin()
+def get_user_statistics(id):
+    try:
+        figures = statistics.of_user(id)
+    except InvalidId as e:
+        abort(400, 'Invalid id')
+    except Exception as e:
+        print(f'{e.__class__.__name__}: {e}')
+        abort(500, 'Unknown server error')
+    if figures is None:
+        abort(404, 'User not found')
+    return jsonify(figures), 200
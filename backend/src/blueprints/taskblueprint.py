@@ -2,12 +2,27 @@ from flask import Blueprint, jsonify, abort, request
 from flask_cors import cross_origin
 
 from pymongo.errors import WriteError
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
 import json
 
 #import src.controllers.taskcontroller as controller
 from src.controllers.taskcontroller import TaskController
-from src.util.daos import getDao
-controller = TaskController(tasks_dao=getDao(collection_name='task'), videos_dao=getDao(collection_name='video'), todos_dao=getDao(collection_name='todo'), users_dao=getDao(collection_name='user'))
+from src.controllers.asynctaskcontroller import AsyncTaskController
+from src.util.daos import getDao, getAsyncDao
+from src.util.taskstorage import getTaskStorage
+from src.util.dashboards import getDashboards
+from src.util.versions import getVersions, conditional
+from src.util.batch import requestedIds
+from src.util.jobs import getJobQueue, enqueue
+versions = getVersions()
+embedded = (getTaskStorage() == 'embedded')
+dashboards = getDashboards()
+controller = TaskController(tasks_dao=getDao(collection_name='task'), videos_dao=getDao(collection_name='video'), todos_dao=getDao(collection_name='todo'), users_dao=getDao(collection_name='user'), versions=versions, embedded=embedded, dashboards=dashboards)
+asynccontroller = AsyncTaskController(tasks_dao=getAsyncDao(collection_name='task'), videos_dao=getAsyncDao(collection_name='video'), todos_dao=getAsyncDao(collection_name='todo'), users_dao=getAsyncDao(collection_name='user'), versions=versions, embedded=embedded, dashboards=dashboards)
+
+# the creation of large tasks can run as a background job (see src.util.jobs), whose result is the new task
+getJobQueue().register('createtask', lambda progress, data: controller.get(controller.create(data)))
 
 # instantiate the flask blueprint
 task_blueprint = Blueprint('task_blueprint', __name__)
@@ -24,9 +39,14 @@ def create():
             if key in data and isinstance(data[key], list):
                 data[key] = data[key][0]
 
+        if request.args.get('async', '').lower() == 'true':
+            # e.g., a task with very many todos is created in a background job
+            return enqueue('createtask', {'data': data})
+
+        # respond with the new (populated) task only, instead of all tasks of the user
         taskid = controller.create(data)
-        tasks = controller.get_tasks_of_user(userid)
-        return jsonify(tasks), 200
+        task = controller.get(taskid)
+        return jsonify(task), 200
     except WriteError as e:
         abort(400, 'Invalid input data')
     except Exception as e:
@@ -39,17 +59,32 @@ def create():
 def get(id):
     try:
         if request.method == 'GET':
-            task = controller.get(id)
-            return jsonify(task), 200
+            # the task is only populated if the version known to the client is outdated
+            return conditional(versions, f'task:{ObjectId(id)}', lambda: controller.get(id))
         elif request.method == 'PUT':
             data = request.form.to_dict(flat=True)['data']
             data = json.loads(data.replace("'", "\""))
 
-            task = controller.update(id, data)
+            task = controller.update(id, data, return_document=True)
             return jsonify(task), 200
         elif request.method == 'DELETE':
             result = controller.delete(id=id)
             return jsonify({"success": result}), 200
+    except InvalidId as e:
+        abort(400, 'Invalid id')
+    except Exception as e:
+        print(f'{e.__class__.__name__}: {e}')
+        abort(500, 'Unknown server error')
+
+# obtain several populated tasks at once (see src.util.batch for the format of the ids), in the requested order and with the ids of the missing tasks
+@task_blueprint.route('/byids', methods=['POST'])
+@cross_origin()
+def get_many():
+    try:
+        tasks = controller.get_many(requestedIds())
+        return jsonify(tasks), 200
+    except (ValueError, InvalidId) as e:
+        abort(400, 'Invalid ids')
     except Exception as e:
         print(f'{e.__class__.__name__}: {e}')
         abort(500, 'Unknown server error')
@@ -59,8 +94,69 @@ def get(id):
 @cross_origin()
 def get_tasks_of_user(id):
     try:
-        tasks = controller.get_tasks_of_user(id)
+        return conditional(versions, f'tasksof:{ObjectId(id)}', lambda: controller.get_tasks_of_user(id))
+    except InvalidId as e:
+        abort(400, 'Invalid id')
+    except Exception as e:
+        print(f'{e.__class__.__name__}: {e}')
+        abort(500, 'Unknown server error')
+
+# asynchronous variants of the routes above, whose independent database operations run concurrently
+# (the app-wide CORS configuration applies, as cross_origin does not support coroutines)
+@task_blueprint.route('/async/create', methods=['POST'])
+async def create_async():
+    try:
+        data = request.form.to_dict(flat=False)
+        userid = data['userid'][0]
+        # convert all non-array fields back to simple values
+        for key in ['title', 'description', 'start', 'due', 'userid', 'url']:
+            if key in data and isinstance(data[key], list):
+                data[key] = data[key][0]
+
+        taskid = await asynccontroller.create(data)
+        task = await asynccontroller.get(taskid)
+        return jsonify(task), 200
+    except WriteError as e:
+        abort(400, 'Invalid input data')
+    except Exception as e:
+        print(f'{e.__class__.__name__}: {e}')
+        abort(500, 'Unknown server error')
+
+@task_blueprint.route('/async/byid/<id>', methods=['GET', 'PUT', 'DELETE'])
+async def get_async(id):
+    try:
+        if request.method == 'GET':
+            task = await asynccontroller.get(id)
+            return jsonify(task), 200
+        elif request.method == 'PUT':
+            data = request.form.to_dict(flat=True)['data']
+            data = json.loads(data.replace("'", "\""))
+
+            task = await asynccontroller.update(id, data, return_document=True)
+            return jsonify(task), 200
+        elif request.method == 'DELETE':
+            result = await asynccontroller.delete(id=id)
+            return jsonify({"success": result}), 200
+    except Exception as e:
+        print(f'{e.__class__.__name__}: {e}')
+        abort(500, 'Unknown server error')
+
+@task_blueprint.route('/async/byids', methods=['POST'])
+async def get_many_async():
+    try:
+        tasks = await asynccontroller.get_many(requestedIds())
+        return jsonify(tasks), 200
+    except (ValueError, InvalidId) as e:
+        abort(400, 'Invalid ids')
+    except Exception as e:
+        print(f'{e.__class__.__name__}: {e}')
+        abort(500, 'Unknown server error')
+
+@task_blueprint.route('/async/ofuser/<id>', methods=['GET'])
+async def get_tasks_of_user_async(id):
+    try:
+        tasks = await asynccontroller.get_tasks_of_user(id)
         return jsonify(tasks), 200
     except Exception as e:
         print(f'{e.__class__.__name__}: {e}')
-        abort(500, 'Unknown server error')
\ No newline at end of file
+        abort(500, 'Unknown server error')
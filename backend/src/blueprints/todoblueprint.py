@@ -4,10 +4,20 @@ from flask_cors import cross_origin
 import json
 
 from pymongo.errors import WriteError
+from bson.errors import InvalidId
 
 from src.controllers.todocontroller import TodoController
-from src.util.daos import getDao
-controller = TodoController(todo_dao=getDao(collection_name='todo'), tasks_dao=getDao(collection_name='task'))
+from src.controllers.asynctodocontroller import AsyncTodoController
+from src.util.daos import getDao, getAsyncDao
+from src.util.taskstorage import getTaskStorage
+from src.util.dashboards import getDashboards
+from src.util.batch import requestedIds
+from src.util.config import getConfig
+from src.util.versions import getVersions
+embedded = (getTaskStorage() == 'embedded')
+dashboards = getDashboards()
+controller = TodoController(todo_dao=getDao(collection_name='todo'), tasks_dao=getDao(collection_name='task'), versions=getVersions(), embedded=embedded, dashboards=dashboards)
+asynccontroller = AsyncTodoController(todo_dao=getAsyncDao(collection_name='todo'), tasks_dao=getAsyncDao(collection_name='task'), versions=getVersions(), embedded=embedded, dashboards=dashboards)
 
 # instantiate the flask blueprint
 todo_blueprint = Blueprint('todo_blueprint', __name__)
@@ -40,7 +50,7 @@ def get_todo(id):
             data = request.form.to_dict(flat=True)['data']
             data = json.loads(data.replace("'", "\""))
 
-            todo = controller.update(id, data)
+            todo = controller.update(id, data, return_document=True)
             return jsonify(todo), 200
         # delete an existing todo
         elif request.method == 'DELETE':
@@ -48,4 +58,66 @@ def get_todo(id):
             return jsonify({'id': id}), 200
     except Exception as e:
         print(f'{e.__class__.__name__}: {e}')
-        abort(500, 'Unknown server error')
\ No newline at end of file
+        abort(500, 'Unknown server error')
+
+# obtain several todos at once (see src.util.batch for the format of the ids), in the requested order and with the ids of the missing todos
+@todo_blueprint.route('/byids', methods=['POST'])
+@cross_origin()
+def get_many():
+    try:
+        todos = controller.get_many(requestedIds())
+        return jsonify(todos), 200
+    except (ValueError, InvalidId) as e:
+        abort(400, 'Invalid ids')
+    except Exception as e:
+        print(f'{e.__class__.__name__}: {e}')
+        abort(500, 'Unknown server error')
+
+# execute several create, update, delete and done operations (see TodoController.batch) given as JSON body of the form
+# {"operations": [...]} at once, and report the result of every operation
+@todo_blueprint.route('/batch', methods=['POST'])
+@cross_origin()
+def batch():
+    data = request.get_json(silent=True)
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or len(operations) > int(getConfig().get('MAX_BATCH_OPERATIONS', 1000)):
+        abort(400, 'Invalid operations')
+    try:
+        results = controller.batch(operations)
+        return jsonify({'results': results}), 200
+    except Exception as e:
+        print(f'{e.__class__.__name__}: {e}')
+        abort(500, 'Unknown server error')
+
+# asynchronous variants of the routes above, whose independent database operations run concurrently
+# (the app-wide CORS configuration applies, as cross_origin does not support coroutines)
+@todo_blueprint.route('/async/create', methods=['POST'])
+async def create_async():
+    try:
+        data = request.form.to_dict(flat=True)
+        todo = await asynccontroller.create(data)
+        return jsonify(todo), 200
+    except WriteError as e:
+        abort(400, 'Invalid input data')
+    except Exception as e:
+        print(f'{e.__class__.__name__}: {e}')
+        abort(500, 'Unknown server error')
+
+@todo_blueprint.route('/async/byid/<id>', methods=['GET', 'PUT', 'DELETE'])
+async def get_todo_async(id):
+    try:
+        if request.method == 'GET':
+            todo = await asynccontroller.get(id)
+            return jsonify(todo), 200
+        elif request.method == 'PUT':
+            data = request.form.to_dict(flat=True)['data']
+            data = json.loads(data.replace("'", "\""))
+
+            todo = await asynccontroller.update(id, data, return_document=True)
+            return jsonify(todo), 200
+        elif request.method == 'DELETE':
+            await asynccontroller.delete(id)
+            return jsonify({'id': id}), 200
+    except Exception as e:
+        print(f'{e.__class__.__name__}: {e}')
+        abort(500, 'Unknown server error')
@@ -1,13 +1,30 @@
-from flask import Blueprint, jsonify, abort, request
+from flask import Blueprint, Response, jsonify, abort, request, current_app, stream_with_context
 from flask_cors import cross_origin
 
 from pymongo.errors import WriteError
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
 
-from src.util.daos import getDao
+from src.util.daos import getDao, getAsyncDao
+from src.util.taskstorage import getTaskStorage
+from src.util.dashboards import getDashboards
 from src.controllers.usercontroller import UserController
 from src.controllers.taskcontroller import TaskController
-controller = UserController(getDao(collection_name='user'))
-taskcontroller = TaskController(tasks_dao=getDao(collection_name='task'), videos_dao=getDao(collection_name='video'), todos_dao=getDao(collection_name='todo'), users_dao=getDao(collection_name='user'))
+from src.controllers.asyncusercontroller import AsyncUserController
+from src.controllers.asynctaskcontroller import AsyncTaskController
+from src.util.versions import getVersions, conditional
+from src.util.batch import requestedIds
+from src.util.jobs import getJobQueue, enqueue
+versions = getVersions()
+embedded = (getTaskStorage() == 'embedded')
+dashboards = getDashboards()
+controller = UserController(getDao(collection_name='user'), versions=versions, dashboards=dashboards)
+taskcontroller = TaskController(tasks_dao=getDao(collection_name='task'), videos_dao=getDao(collection_name='video'), todos_dao=getDao(collection_name='todo'), users_dao=getDao(collection_name='user'), versions=versions, embedded=embedded, dashboards=dashboards)
+asynccontroller = AsyncUserController(getAsyncDao(collection_name='user'), versions=versions, dashboards=dashboards)
+asynctaskcontroller = AsyncTaskController(tasks_dao=getAsyncDao(collection_name='task'), videos_dao=getAsyncDao(collection_name='video'), todos_dao=getAsyncDao(collection_name='todo'), users_dao=getAsyncDao(collection_name='user'), versions=versions, embedded=embedded, dashboards=dashboards)
+
+# the deletion of large users can run as a background job (see src.util.jobs)
+getJobQueue().register('deleteuser', lambda progress, id: taskcontroller.delete_user(id=id))
 
 # instantiate the flask blueprint
 user_blueprint = Blueprint('user_blueprint', __name__)
@@ -32,24 +49,42 @@ def create_user():
 @cross_origin()
 def get_user(id):
     try:
-        # get a specific user
+        # get a specific user (or 304 if the version known to the client is still current), which is never served from the
+        # document cache, as another process may have modified the user since it has been cached
         if request.method == 'GET':
-            user = controller.get(id)
-            return jsonify(user), 200
+            return conditional(versions, f'user:{ObjectId(id)}', lambda: controller.get(id, cached=False))
         # update the user
         elif request.method == 'PUT':
             data = request.form
-            update_result = controller.update(id, data)
-            user = controller.get(id)
+            user = controller.update(id, data, return_document=True)
             return jsonify(user), 200
-        # delete a user
+        # delete a user (including all of his tasks)
         elif request.method == 'DELETE':
-            taskcontroller.delete_of_user(id=id)
-            result = controller.delete(id=id)
-            return jsonify({"success": result}), 200
+            if request.args.get('async', '').lower() == 'true':
+                # large users can be deleted in a background job, such that the request returns right away
+                return enqueue('deleteuser', {'id': id})
+            counts = taskcontroller.delete_user(id=id)
+            return jsonify({"success": True, "deleted": counts}), 200
+    except InvalidId as e:
+        abort(400, 'Invalid id')
+    except Exception as e:
+        print(f'{e.__class__.__name__}: {e}')
+        abort(500, 'Unknown server error')
+
+# obtain the dashboard of a user (the user, its populated tasks and the counts of done todos) from one precomputed document (see src.util.dashboards)
+@user_blueprint.route('/<id>/dashboard', methods=['GET'])
+@cross_origin()
+def get_dashboard(id):
+    try:
+        dashboard = dashboards.get(id)
+    except InvalidId as e:
+        abort(400, 'Invalid id')
     except Exception as e:
         print(f'{e.__class__.__name__}: {e}')
         abort(500, 'Unknown server error')
+    if dashboard is None:
+        abort(404, 'User not found')
+    return jsonify(dashboard), 200
 
 # obtain one user by id (and optionally update him)
 @user_blueprint.route('/bymail/<email>', methods=['GET'])
@@ -62,13 +97,75 @@ def get_user_by_mail(email):
         print(f'{e.__class__.__name__}: {e}')
         abort(500, 'Unknown server error')
 
-# obtain all users and return them
-@user_blueprint.route('/all', methods=['GET'])
+# obtain several users at once (see src.util.batch for the format of the ids), in the requested order and with the ids of the missing users
+@user_blueprint.route('/byids', methods=['POST'])
 @cross_origin()
-def get_users():
+def get_many():
     try:
-        users = controller.get_all()
+        users = controller.get_many(requestedIds())
         return jsonify(users), 200
+    except (ValueError, InvalidId) as e:
+        abort(400, 'Invalid ids')
+    except Exception as e:
+        print(f'{e.__class__.__name__}: {e}')
+        abort(500, 'Unknown server error')
+
+# obtain all users and return them (optionally page by page via ?limit=<n>&after=<id>, or streamed as NDJSON via ?stream=true)
+@user_blueprint.route('/all', methods=['GET'])
+@cross_origin(expose_headers=['X-Next-After'])
+def get_users():
+    try:
+        # parsed explicitly, as type=int would turn an invalid limit into the default (i.e., all users)
+        limit = int(request.args.get('limit', 0))
+        after = request.args.get('after')
+        stream = request.args.get('stream', '').lower() == 'true' or request.accept_mimetypes.best == 'application/x-ndjson'
+
+        if stream:
+            # send one user per line as soon as it arrives from the database cursor
+            users = controller.get_page(limit=limit, after=after)
+            lines = (current_app.json.dumps(user) + '\n' for user in users)
+            return Response(stream_with_context(lines), status=200, mimetype='application/x-ndjson')
+
+        if limit == 0 and after is None:
+            users = controller.get_all()
+            return jsonify(users), 200
+
+        users = list(controller.get_page(limit=limit, after=after))
+        response = jsonify(users)
+        if limit > 0 and len(users) == limit:
+            # the id of the last user of this page is the starting point of the next page
+            response.headers['X-Next-After'] = users[-1]['_id']['$oid']
+        return response, 200
+    except (ValueError, InvalidId) as e:
+        abort(400, 'Invalid limit or after id')
     except Exception as e:
         print(f'{e.__class__.__name__}: {e}')
-        abort(500, 'Unknown server error')
\ No newline at end of file
+        abort(500, 'Unknown server error')
+
+# asynchronous variants of the routes above, whose independent database operations run concurrently
+# (the app-wide CORS configuration applies, as cross_origin does not support coroutines)
+@user_blueprint.route('/async/<id>', methods=['GET', 'PUT', 'DELETE'])
+async def get_user_async(id):
+    try:
+        if request.method == 'GET':
+            user = await asynccontroller.get(id)
+            return jsonify(user), 200
+        elif request.method == 'PUT':
+            data = request.form
+            user = await asynccontroller.update(id, data, return_document=True)
+            return jsonify(user), 200
+        elif request.method == 'DELETE':
+            counts = await asynctaskcontroller.delete_user(id=id)
+            return jsonify({"success": True, "deleted": counts}), 200
+    except Exception as e:
+        print(f'{e.__class__.__name__}: {e}')
+        abort(500, 'Unknown server error')
+
+@user_blueprint.route('/async/bymail/<email>', methods=['GET'])
+async def get_user_by_mail_async(email):
+    try:
+        user = await asynccontroller.get_user_by_email(email)
+        return jsonify(user), 200
+    except Exception as e:
+        print(f'{e.__class__.__name__}: {e}')
+        abort(500, 'Unknown server error')
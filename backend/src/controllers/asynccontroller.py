@@ -0,0 +1,66 @@
+from src.util.asyncdao import AsyncDAO, run
+from src.util.versions import Versions
+
+class AsyncController:
+    def __init__(self, dao: AsyncDAO, versions: Versions = None):
+        """Instantiate an asynchronous controller, the counterpart of src.controllers.controller.Controller for async
+        route handlers: every method is a coroutine which awaits the asynchronous data access object, such that
+        independent database operations can run concurrently.
+
+        parameters:
+            dao -- asynchronous data access object, which has to grant access to the specific collection of the database
+            versions -- optional version counters (see src.util.versions), which are incremented by every modification
+        """
+        self.dao = dao
+        self.versions = versions
+
+    async def touch(self, ids: list, collection_name: str = None):
+        """See Controller.touch."""
+        if self.versions is not None:
+            await run(self.versions.touch, collection_name or self.dao.collection_name, ids)
+
+    async def create(self, data: dict):
+        """See Controller.create."""
+        try:
+            return await self.dao.create(data)
+        except Exception as e:
+            raise
+
+    async def get(self, id: str):
+        """See Controller.get."""
+        try:
+            return await self.dao.findOne(id)
+        except Exception as e:
+            raise
+
+    async def get_many(self, ids: list):
+        """See Controller.get_many."""
+        try:
+            return await self.dao.find_by_ids(ids)
+        except Exception as e:
+            raise
+
+    async def get_all(self):
+        """See Controller.get_all."""
+        try:
+            return await self.dao.find()
+        except Exception as e:
+            raise
+
+    async def update(self, id: str, data: dict, return_document: bool = False):
+        """See Controller.update."""
+        try:
+            result = await self.dao.update(id=id, update_data=data, return_document=return_document)
+            await self.touch([id])
+            return result
+        except Exception as e:
+            raise
+
+    async def delete(self, id: str):
+        """See Controller.delete."""
+        try:
+            result = await self.dao.delete(id=id)
+            await self.touch([id])
+            return result
+        except Exception as e:
+            raise
@@ -0,0 +1,291 @@
+from bson.objectid import ObjectId
+from pymongo.errors import WriteError
+import asyncio
+
+from src.controllers.asynccontroller import AsyncController
+from src.controllers.taskcontroller import prepare_tasks, embed_tasks, populated, video_documents, todo_documents, reference_tasks, assign_tasks, creation_keys, cascade_keys, populate_stages, tasks_lookup
+from src.util.asyncdao import AsyncDAO, run
+from src.util.dashboards import Dashboards
+from src.util.taskstorage import references, substitute, is_reference
+from src.util.versions import Versions
+
+class AsyncTaskController(AsyncController):
+    def __init__(self, tasks_dao: AsyncDAO, videos_dao: AsyncDAO, todos_dao: AsyncDAO, users_dao: AsyncDAO, versions: Versions = None, embedded: bool = False, dashboards: Dashboards = None):
+        super().__init__(dao=tasks_dao, versions=versions)
+        self.videos_dao = videos_dao
+        self.todos_dao = todos_dao
+        self.users_dao = users_dao
+        # see TaskController
+        self.embedded = embedded
+        self.dashboards = dashboards
+
+    async def create(self, data: dict):
+        """See TaskController.create.
+
+        returns:
+            id -- the unique identifier of the newly created task object
+
+        raises:
+            KeyError -- in case an important key is missing in the data dict
+            WriteError -- in case an object violates the validator of its collection
+            Exception -- in case any database operation fails
+        """
+        try:
+            return (await self.create_many([data]))[0]
+        except Exception as e:
+            raise
+
+    async def create_many(self, data: list):
+        """See TaskController.create_many. The videos and the todos of the new tasks are inserted concurrently. If any write operation fails, the objects created so far are removed again.
+
+        returns:
+            ids -- list of the unique identifiers of the newly created task objects (in the order of the given data)
+
+        raises:
+            KeyError -- in case an important key is missing in one of the data dicts
+            WriteError -- in case an object violates the validator of its collection
+            Exception -- in case any database operation fails
+        """
+        tasks = prepare_tasks(data)
+
+        try:
+            created = {self.videos_dao: [], self.todos_dao: [], self.dao: []}
+            inserted = []
+            try:
+                taskids = await self._insert_tasks(tasks, created, inserted)
+            except Exception as e:
+                # remove the objects which have already been created to avoid orphans
+                await asyncio.gather(*[dao.delete_many(ids) for dao, ids in created.items()])
+                raise
+
+            if self.versions is not None:
+                await run(self.versions.bump, creation_keys(tasks, taskids))
+            if self.dashboards is not None:
+                await run(self.dashboards.add_tasks, inserted)
+            return taskids
+        except Exception as e:
+            raise
+
+    async def _insert_tasks(self, tasks: list, created: dict, inserted: list = None):
+        """Insert the videos and todos of the given (userid, task) tuples concurrently, then the tasks, and assign the tasks to their users. The ids of all created objects are collected in the created dict (keyed by the DAO), and the (userid, populated task) tuples of the new tasks in the inserted list if given.
+        """
+        async def insert(dao, documents):
+            result = await dao.create_many(documents, ordered=True)
+            created[dao] += [obj['_id']['$oid'] for obj in result['inserted']]
+            if result['errors']:
+                error = result['errors'][0]
+                raise WriteError(error['errmsg'], code=error['code'])
+            return [ObjectId(obj['_id']['$oid']) for obj in result['inserted']]
+
+        if self.embedded:
+            documents = embed_tasks(tasks)
+        else:
+            # add the video urls and create all todos at once
+            videos, todos = await asyncio.gather(insert(self.videos_dao, video_documents(tasks)), insert(self.todos_dao, todo_documents(tasks)))
+            documents = reference_tasks(tasks, videos, todos)
+
+        # create the task objects and assign them to their users
+        taskids = await insert(self.dao, documents)
+
+        assignments = assign_tasks(tasks, taskids)
+        if assignments:
+            await self.users_dao.bulk_write(assignments)
+
+        if inserted is not None:
+            inserted[:] = populated(tasks, documents, taskids)
+        return [str(taskid) for taskid in taskids]
+
+    async def get(self, id: str):
+        """See TaskController.get.
+
+        returns:
+            task -- the populated task object
+            None -- if no task is associated to the given id
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        try:
+            tasks = await self.get_populated(filter={'_id': ObjectId(id)})
+            if tasks:
+                return tasks[0]
+            return None
+        except Exception as e:
+            raise
+
+    async def get_many(self, ids: list):
+        """See TaskController.get_many.
+
+        returns:
+            result -- dict containing the populated tasks in the order of the given ids under the key 'found' and the ids without a task under the key 'missing'
+
+        raises:
+            bson.errors.InvalidId -- in case one of the ids is not valid
+            Exception -- in case any database operation fails
+        """
+        try:
+            result = await self.dao.find_by_ids(ids, pipeline=self.populate_stages())
+            await self.resolve(result['found'])
+            return result
+        except Exception as e:
+            raise
+
+    async def get_tasks_of_user(self, id: str):
+        """See TaskController.get_tasks_of_user.
+
+        returns:
+            tasks -- list of populated tasks associated to that user
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        try:
+            users = await self.users_dao.aggregate([
+                {'$match': {'_id': ObjectId(id)}},
+                {'$lookup': self.tasks_lookup()},
+                {'$project': {'_id': 0, 'tasks': 1}}
+            ])
+            if users:
+                return await self.resolve(users[0]['tasks'])
+            return []
+        except Exception as e:
+            raise
+
+    async def get_populated(self, filter: dict):
+        """See TaskController.get_populated."""
+        try:
+            return await self.resolve(await self.dao.aggregate([{'$match': filter}] + self.populate_stages()))
+        except Exception as e:
+            raise
+
+    def tasks_lookup(self):
+        """See TaskController.tasks_lookup."""
+        return tasks_lookup(self.dao.collection_name, self.populate_stages())
+
+    def populate_stages(self):
+        """See TaskController.populate_stages."""
+        if self.embedded:
+            return []
+        return populate_stages(self.videos_dao.collection_name, self.todos_dao.collection_name)
+
+    async def resolve(self, tasks: list):
+        """See TaskController.resolve. The videos and the todos are looked up concurrently."""
+        async def lookup(dao, ids):
+            if ids:
+                return {obj['_id']['$oid']: obj for obj in (await dao.find_by_ids(ids))['found']}
+            return {}
+
+        videoids, todoids = references(tasks)
+        videos, todos = await asyncio.gather(lookup(self.videos_dao, videoids), lookup(self.todos_dao, todoids))
+        return substitute(tasks, videos, todos)
+
+    async def populate_task(self, task):
+        """Populate a given task object by resolving dependencies (see TaskController.populate_task), where the video and the todos are looked up concurrently.
+
+        parameters:
+            task -- task object with reference ids (external keys)
+
+        returns:
+            task -- task object with resolved references
+        """
+        async def video():
+            if is_reference(task.get('video')):
+                return await self.videos_dao.findOne(task['video']['$oid'])
+            return task.get('video')
+
+        async def todos():
+            _, todoids = references([task])
+            if not todoids:
+                return task.get('todos', [])
+            found = (await self.todos_dao.find_by_ids(todoids))['found']
+            if len(todoids) == len(task['todos']):
+                return found
+            # the task embeds some of its todos (see src.util.taskstorage)
+            return substitute([{'todos': task['todos']}], {}, {todo['_id']['$oid']: todo for todo in found})[0]['todos']
+
+        task['video'], task['todos'] = await asyncio.gather(video(), todos())
+        return task
+
+    async def update(self, id: str, data: dict, return_document: bool = False):
+        """See TaskController.update."""
+        try:
+            result = await super().update(id, data, return_document=return_document)
+            if self.dashboards is not None:
+                await run(self.dashboards.invalidate, taskids=[id])
+            return result
+        except Exception as e:
+            raise
+
+    async def delete(self, id: str):
+        """See TaskController.delete."""
+        try:
+            result = await super().delete(id)
+            if self.dashboards is not None:
+                await run(self.dashboards.invalidate, taskids=[id])
+            return result
+        except Exception as e:
+            raise
+
+    async def delete_of_user(self, id: str):
+        """See TaskController.delete_of_user.
+
+        returns:
+            n -- number of deleted tasks
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        try:
+            return (await self._delete_cascade(id, delete_user=False))['task']
+        except Exception as e:
+            raise
+
+    async def delete_user(self, id: str):
+        """See TaskController.delete_user. The tasks, videos and todos are deleted concurrently.
+
+        returns:
+            counts -- dict containing the number of deleted objects per collection (keys 'user', 'task', 'video' and 'todo')
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        try:
+            return await self._delete_cascade(id, delete_user=True)
+        except Exception as e:
+            raise
+
+    async def _delete_cascade(self, id: str, delete_user: bool):
+        """Collect the ids of all tasks, videos and todos associated to the user once and delete them concurrently with one delete_many per collection.
+        """
+        counts = {'task': 0, 'video': 0, 'todo': 0}
+        if delete_user:
+            counts['user'] = 0
+
+        user = await self.users_dao.findOne(id)
+        if user is None:
+            return counts
+
+        if user.get('tasks'):
+            taskids = [task['$oid'] for task in user['tasks']]
+            tasks = (await self.dao.find_by_ids(taskids, projection={'video': 1, 'todos': 1}))['found']
+
+            # embedded videos and todos are deleted with their tasks
+            videoids, todoids = references(tasks)
+            deletions = {}
+            deletions['video'] = self.videos_dao.delete_many(videoids)
+            deletions['todo'] = self.todos_dao.delete_many(todoids)
+            deletions['task'] = self.dao.delete_many(taskids)
+            counts.update(zip(deletions.keys(), await asyncio.gather(*deletions.values())))
+
+        # the user is deleted last, such that its references remain if any deletion fails
+        if delete_user:
+            counts['user'] = await self.users_dao.delete_many([id])
+
+        if self.versions is not None:
+            await run(self.versions.bump, cascade_keys(id, user))
+        if self.dashboards is not None:
+            if delete_user:
+                await run(self.dashboards.invalidate, userids=[id])
+            else:
+                await run(self.dashboards.clear_tasks, id)
+        return counts
@@ -0,0 +1,116 @@
+from src.controllers.asynccontroller import AsyncController
+from src.controllers.todocontroller import ordered
+from src.util.asyncdao import AsyncDAO, run
+from src.util.bsonjson import to_json
+from src.util.dashboards import Dashboards
+from src.util.taskstorage import embedded_todo, positional
+from src.util.versions import Versions
+
+from bson.objectid import ObjectId
+import asyncio
+
+class AsyncTodoController(AsyncController):
+    def __init__(self, todo_dao: AsyncDAO, tasks_dao: AsyncDAO, versions: Versions = None, embedded: bool = False, dashboards: Dashboards = None):
+        super().__init__(dao=todo_dao, versions=versions)
+        self.tasks_dao = tasks_dao
+        self.embedded = embedded
+        self.dashboards = dashboards
+
+    async def create(self, data: dict):
+        """See TodoController.create. If the todo is associated to a task, the task is looked up while the todo is created.
+
+        parameters:
+            data -- dict containing a description under the key description
+
+        returns:
+            todo -- created todo object upon success
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        try:
+            if 'taskid' in data:
+                data = dict(data)
+                taskid = data.pop('taskid')
+
+                if 'done' in data:
+                    if isinstance(data['done'], str):
+                        data['done'] = (data['done'].lower() == 'true')
+
+                if self.embedded:
+                    todo = dict(data, _id=ObjectId())
+                    task = await self.tasks_dao.findOne(id=taskid)
+                    await self.tasks_dao.update(id=task['_id']['$oid'], update_data={'$push' : {'todos': todo}})
+                    todo = to_json(todo)
+                else:
+                    task, todo = await asyncio.gather(self.tasks_dao.findOne(id=taskid), self.dao.create(data))
+                    await self.tasks_dao.update(id=task['_id']['$oid'], update_data={'$push' : {'todos': ObjectId(todo['_id']['$oid'])}})
+                await self.touch([task['_id']['$oid']], collection_name='task')
+                if self.dashboards is not None:
+                    await run(self.dashboards.add_todo, task['_id']['$oid'], todo)
+
+                return todo
+            else:
+                return await self.dao.create(data)
+        except Exception as e:
+            raise
+
+    async def get(self, id: str):
+        """See TodoController.get. Both locations of the todo are looked up concurrently."""
+        try:
+            task, todo = await asyncio.gather(self.tasks_dao.find_one_by({'todos._id': ObjectId(id)}, projection={'todos': 1}), self.dao.findOne(id))
+            embedded = embedded_todo(task, id)
+            found = [embedded, todo] if self.embedded else [todo, embedded]
+            return next((todo for todo in found if todo is not None), None)
+        except Exception as e:
+            raise
+
+    async def update(self, id: str, data: dict, return_document: bool = False):
+        """See TodoController.update."""
+        try:
+            for update in ordered(self.embedded, self._update_embedded, self._update_referenced):
+                todo = await update(id, data)
+                if todo is not None:
+                    if self.dashboards is not None:
+                        await run(self.dashboards.update_todo, todo)
+                    return todo if return_document else True
+            return None if return_document else False
+        except Exception as e:
+            raise
+
+    async def delete(self, id: str):
+        """See TodoController.delete."""
+        try:
+            for delete in ordered(self.embedded, self._delete_embedded, self._delete_referenced):
+                if await delete(id):
+                    if self.dashboards is not None:
+                        await run(self.dashboards.remove_todo, id)
+                    return True
+            return False
+        except Exception as e:
+            raise
+
+    async def _update_embedded(self, id: str, data: dict):
+        task = await self.tasks_dao.update_by({'todos._id': ObjectId(id)}, positional(data), return_document=True, projection={'todos': 1})
+        if task is not None:
+            await self.touch([task['_id']['$oid']], collection_name='task')
+        return embedded_todo(task, id)
+
+    async def _update_referenced(self, id: str, data: dict):
+        todo = await self.dao.update(id=id, update_data=data, return_document=True)
+        if todo is not None:
+            await self.touch([id])
+        return todo
+
+    async def _delete_embedded(self, id: str):
+        task = await self.tasks_dao.update_by({'todos._id': ObjectId(id)}, {'$pull': {'todos': {'_id': ObjectId(id)}}}, return_document=True, projection={'_id': 1})
+        if task is not None:
+            await self.touch([task['_id']['$oid']], collection_name='task')
+        return task is not None
+
+    async def _delete_referenced(self, id: str):
+        deleted = await self.dao.delete_many([id])
+        if deleted:
+            await self.touch([id])
+        return deleted > 0
+
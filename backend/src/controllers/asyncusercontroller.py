@@ -0,0 +1,46 @@
+from src.controllers.asynccontroller import AsyncController
+from src.controllers.usercontroller import emailValidator
+from src.util.asyncdao import AsyncDAO, run
+from src.util.dashboards import Dashboards
+from src.util.versions import Versions
+
+import re
+
+class AsyncUserController(AsyncController):
+    def __init__(self, dao: AsyncDAO, versions: Versions = None, dashboards: Dashboards = None):
+        super().__init__(dao=dao, versions=versions)
+        self.dashboards = dashboards
+
+    async def create(self, data: dict):
+        """See UserController.create."""
+        try:
+            user = await super().create(data)
+            if self.versions is not None:
+                await run(self.versions.bump, [f'user:{user["_id"]["$oid"]}', f'tasksof:{user["_id"]["$oid"]}'])
+            return user
+        except Exception as e:
+            raise
+
+    async def get_user_by_email(self, email: str):
+        """See UserController.get_user_by_email.
+
+        raises:
+            ValueError -- in case the email parameter is not valid (i.e., conforming <local-part>@<domain>.<host>)
+            Exception -- in case any database operation fails
+        """
+        if not re.fullmatch(emailValidator, email):
+            raise ValueError('Error: invalid email address')
+
+        try:
+            return await self.dao.find_one_by({'email': email})
+        except Exception as e:
+            raise
+
+    async def update(self, id, data, return_document: bool = False):
+        try:
+            result = await super().update(id=id, data={'$set': data}, return_document=return_document)
+            if self.dashboards is not None:
+                await run(self.dashboards.update_user, id, data)
+            return result
+        except Exception as e:
+            raise
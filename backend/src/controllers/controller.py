@@ -1,15 +1,32 @@
 from  src.util.dao import DAO
+from src.util.versions import Versions
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING
 
 class Controller:
-    def __init__(self, dao: DAO):
+    def __init__(self, dao: DAO, versions: Versions = None):
         """Instantiate a controller, which acts as a mediator between the data access object and the blueprints.
         The main purpose of a controller is to abstract the data access from the blueprint routes, such that they can be
         executed outside of server operations.
 
         parameters:
             dao -- data access object, which has to grant access to the specific collection of the database
+            versions -- optional version counters (see src.util.versions), which are incremented by every modification
         """
         self.dao = dao
+        self.versions = versions
+
+    def touch(self, ids: list, collection_name: str = None, session=None):
+        """Increment the versions of all representations including the modified objects (see src.util.versions.Versions.touch), if this controller keeps track of versions.
+
+        parameters:
+            ids -- list of id values of the modified objects
+            collection_name -- the name of the collection of the modified objects (defaults to the collection of this controller)
+            session -- optional client session in which the operations are executed
+        """
+        if self.versions is not None:
+            self.versions.touch(collection_name or self.dao.collection_name, ids, session=session)
 
     def create(self, data: dict):
         """Create a new object in the database and return the newly created object. The database object will contain
@@ -27,12 +44,13 @@ class Controller:
             raise
 
     # get a user by id
-    def get(self, id: str):
+    def get(self, id: str, cached: bool = True):
         """Search for an object by id and return the associated database object. The database object will contain
         a unique id, which is accessible at ob['_id']['$oid] in the jsonified form.
 
         parameters:
             id -- the unique identifier of the object
+            cached -- if False, the object is read from the database instead of the document cache (see DAO.findOne)
 
         returns:
             user -- if an object associated to the given id can be found
@@ -42,7 +60,27 @@ class Controller:
             Exception -- in case the database operation fails, raise an exception
         """
         try:
-            return self.dao.findOne(id)
+            return self.dao.findOne(id, cached=cached)
+        except Exception as e:
+            raise
+
+    def get_many(self, ids: list):
+        """Search for several objects by their ids at once (see DAO.find_by_ids). The database objects will contain
+        a unique id, which is accessible at ob['_id']['$oid] in the jsonified form.
+
+        parameters:
+            ids -- list of the unique identifiers of the objects
+
+        returns:
+            result -- dict containing the found objects in the order of the given ids under the key 'found' and the ids
+                without an associated object under the key 'missing'
+
+        raises:
+            bson.errors.InvalidId -- in case one of the ids is not valid
+            Exception -- in case the database operation fails, raise an exception
+        """
+        try:
+            return self.dao.find_by_ids(ids)
         except Exception as e:
             raise
 
@@ -61,7 +99,33 @@ class Controller:
         except Exception as e:
             raise
 
-    def update(self, id: str, data: dict):
+    def get_page(self, limit: int = 0, after: str = None):
+        """Gathers the objects of the respective collection of the database page by page (keyset pagination): the objects are ordered by their id and each page starts right after the id of the last object of the previous page, such that no objects have to be skipped on the database side.
+
+        parameters:
+            limit -- maximum number of objects of the page (0 means no limit)
+            after -- the unique identifier of the last object of the previous page (None for the first page)
+
+        returns:
+            objects -- generator yielding the objects of the page
+
+        raises:
+            ValueError -- in case the limit is negative
+            bson.errors.InvalidId -- in case the after id is not valid
+            Exception -- in case the database operation fails, raise an exception
+        """
+        if limit < 0:
+            raise ValueError('The limit of a page must not be negative')
+        filter = {}
+        if after is not None:
+            filter['_id'] = {'$gt': ObjectId(after)}
+
+        try:
+            return self.dao.iter_find(filter=filter, sort=[('_id', ASCENDING)], limit=limit)
+        except Exception as e:
+            raise
+
+    def update(self, id: str, data: dict, return_document: bool = False):
         """Locates an object in the respective collection of the database and updates it with the given data 
         values.
 
@@ -69,16 +133,19 @@ class Controller:
             id -- the unique identifier of the object
             data -- a dict where the top level keys are valid MongoDB update operators (e.g., $set, $push), 
                 and the values of those keys again dicts where the keys are fieldnames and the values the new values.
+            return_document -- if True, return the updated object (obtained in the same round trip as the update)
 
         returns: 
             True -- if the update was successful
             False -- if the update failed
+            object -- the updated object, if return_document is True (None if no object is associated to the id)
             
         raises:
             Exception -- in case the database operation fails, raise an exception
         """
         try:
-            update_result = self.dao.update(id=id, update_data=data)
+            update_result = self.dao.update(id=id, update_data=data, return_document=return_document)
+            self.touch([id])
             return update_result
         except Exception as e:
             raise
@@ -98,6 +165,7 @@ class Controller:
         """
         try:
             result = self.dao.delete(id=id)
+            self.touch([id])
             return result
         except Exception as e:
             raise
\ No newline at end of file
@@ -1,95 +1,227 @@
 from bson.objectid import ObjectId
 from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import WriteError
 
 from src.controllers.controller import Controller
 from src.util.dao import DAO
+from src.util.dashboards import Dashboards
+from src.util.taskstorage import references, substitute
+from src.util.versions import Versions
 
 class TaskController(Controller):
-    def __init__(self, tasks_dao: DAO, videos_dao: DAO, todos_dao: DAO, users_dao: DAO):
-        super().__init__(dao=tasks_dao)
+    def __init__(self, tasks_dao: DAO, videos_dao: DAO, todos_dao: DAO, users_dao: DAO, versions: Versions = None, embedded: bool = False, dashboards: Dashboards = None):
+        super().__init__(dao=tasks_dao, versions=versions)
         self.videos_dao = videos_dao
         self.todos_dao = todos_dao
         self.users_dao = users_dao
+        # if True, the videos and todos of new tasks are embedded in the task documents (see src.util.taskstorage)
+        self.embedded = embedded
+        # optional materialized dashboards of the users, which are updated by the modifications (see src.util.dashboards)
+        self.dashboards = dashboards
 
-    def create(self, data: dict):
-        """Create a new task object based on the data contained in the dict. The data must contain at least a userid, a video url and a title. If todos are contained in the data, create todo objects and associate them to the task
+    def create(self, data: dict, transactional: bool = False):
+        """Create a new task object based on the data contained in the dict. The data must contain at least a userid, a video url and a title. If todos are contained in the data, create todo objects and associate them to the task. See create_many for the write operations this involves.
 
         attributes:
             data -- dict containing the data of the new task (at least a title, url, and userid)
+            transactional -- if True, execute all write operations within one transaction (requires a replica set)
 
         returns:
-            task -- newly created task object
+            id -- the unique identifier of the newly created task object
         
         raises:
             KeyError -- in case an important key is missing in the data dict
+            WriteError -- in case an object violates the validator of its collection
             Exception -- in case any database operation fails
         """
+        try:
+            return self.create_many([data], transactional=transactional)[0]
+        except Exception as e:
+            raise
 
-        # store the userid
-        if 'userid' not in data:
-            raise KeyError('When creating a task object, the userid of the associated user must be given')
-        uid = data['userid']
-        del data['userid']
+    def create_many(self, data: list, transactional: bool = False):
+        """Create several new task objects (potentially for several users) in a fixed number of round trips: one bulk insert of all videos, one of all todos, one of all tasks and one bulk update assigning the tasks to their users. In the embedded storage mode, the videos and todos are part of the tasks and hence not inserted separately. If any write operation fails, the objects created so far are either rolled back within the transaction or, if not transactional, removed again.
 
-        
-        # fill default values for missing values
-        if 'startdate' not in data:
-            data['startdate'] = datetime.today()
-        if 'categories' not in data:
-            data['categories'] = []
+        attributes:
+            data -- list of dicts containing the data of the new tasks (each at least a title, url, todos and userid)
+            transactional -- if True, execute all write operations within one transaction (requires a replica set)
+
+        returns:
+            ids -- list of the unique identifiers of the newly created task objects (in the order of the given data)
+
+        raises:
+            KeyError -- in case an important key is missing in one of the data dicts
+            WriteError -- in case an object violates the validator of its collection
+            Exception -- in case any database operation fails
+        """
+        tasks = prepare_tasks(data)
+        inserted = []
 
         try:
-            # add the video url
-            video = self.videos_dao.create({'url': data['url']})
-            del data['url']
-            data['video'] = ObjectId(video['_id']['$oid'])
-
-            # create and add todos
-            todos = []
-            for todo in data['todos']:
-                todoobj = self.todos_dao.create({'description': todo, 'done': False})
-                todos.append(ObjectId(todoobj['_id']['$oid']))
-            data['todos'] = todos
-
-            # create the task object and assign it to the user
-            task = self.dao.create(data)
-            self.users_dao.update(
-                uid, {'$push': {'tasks': ObjectId(task['_id']['$oid'])}})
-            return task['_id']['$oid']
+            if transactional:
+                with self.dao.start_session() as session:
+                    taskids = session.with_transaction(lambda s: self._insert_tasks(tasks, session=s, inserted=inserted))
+            else:
+                created = {self.videos_dao: [], self.todos_dao: [], self.dao: []}
+                try:
+                    taskids = self._insert_tasks(tasks, created=created, inserted=inserted)
+                except Exception as e:
+                    # remove the objects which have already been created to avoid orphans
+                    for dao, ids in created.items():
+                        dao.delete_many(ids)
+                    raise
+
+            # the users and their lists of tasks have changed, and the new tasks obtain their version counters (see Versions.tags)
+            if self.versions is not None:
+                self.versions.bump(creation_keys(tasks, taskids))
+            if self.dashboards is not None:
+                self.dashboards.add_tasks(inserted)
+            return taskids
         except Exception as e:
             raise
 
+    def _insert_tasks(self, tasks: list, session=None, created: dict = None, inserted: list = None):
+        """Insert the videos, todos and tasks of the given (userid, task) tuples and assign the tasks to their users. The ids of all created objects are collected in the created dict (keyed by the DAO) if given, and the (userid, populated task) tuples of the new tasks in the inserted list (see populated).
+        """
+        def insert(dao, documents):
+            result = dao.create_many(documents, ordered=True, session=session)
+            if created is not None:
+                created[dao] += [obj['_id']['$oid'] for obj in result['inserted']]
+            if result['errors']:
+                error = result['errors'][0]
+                raise WriteError(error['errmsg'], code=error['code'])
+            return [ObjectId(obj['_id']['$oid']) for obj in result['inserted']]
+
+        if self.embedded:
+            documents = embed_tasks(tasks)
+        else:
+            # add the video urls and create all todos at once
+            videos = insert(self.videos_dao, video_documents(tasks))
+            todos = insert(self.todos_dao, todo_documents(tasks))
+            documents = reference_tasks(tasks, videos, todos)
+
+        # create the task objects and assign them to their users
+        taskids = insert(self.dao, documents)
+
+        assignments = assign_tasks(tasks, taskids)
+        if assignments:
+            self.users_dao.bulk_write(assignments, session=session)
+
+        if inserted is not None:
+            inserted[:] = populated(tasks, documents, taskids)
+        return [str(taskid) for taskid in taskids]
+
     def get(self, id: str):
+        """Return the task object with the given id, where the video and the todos are already resolved (see populate_task).
+
+        attributes:
+            id -- the unique identifier of a task object
+
+        returns:
+            task -- the populated task object
+            None -- if no task is associated to the given id
+
+        raises:
+            Exception -- in case any database operation fails
+        """
         try:
-            task = super().get(id)
-            return self.populate_task(task)
+            tasks = self.get_populated(filter={'_id': ObjectId(id)})
+            if tasks:
+                return tasks[0]
+            return None
         except Exception as e:
             raise
 
+    def get_many(self, ids: list):
+        """Return the task objects with the given ids, where the video and the todos are already resolved. The tasks are looked up in chunks of ids (see DAO.find_by_ids), each populated by one aggregation pipeline.
+
+        attributes:
+            ids -- list of unique identifiers of task objects
+
+        returns:
+            result -- dict containing the populated tasks in the order of the given ids under the key 'found' and the ids without a task under the key 'missing'
+
+        raises:
+            bson.errors.InvalidId -- in case one of the ids is not valid
+            Exception -- in case any database operation fails
+        """
+        try:
+            result = self.dao.find_by_ids(ids, pipeline=self.populate_stages())
+            self.resolve(result['found'])
+            return result
+        except Exception as e:
+            raise
 
     def get_tasks_of_user(self, id: str):
-        """Return all task objects that are associated to a specific user.
+        """Return all task objects that are associated to a specific user. The user, the tasks and their references are resolved in one single aggregation pipeline (i.e., one round trip to the database).
 
         attributes:
             id -- the unique identifier of a user object
 
         returns:
-            tasks -- list of tasks associated to that user
+            tasks -- list of populated tasks associated to that user
 
         raises:
             Exception -- in case any database operation fails
         """
         try:
-            user = self.users_dao.findOne(id)
-            tasks = self.dao.find(filter={'_id': user['tasks']}, toid=['_id'])
+            users = self.users_dao.aggregate([
+                {'$match': {'_id': ObjectId(id)}},
+                {'$lookup': self.tasks_lookup()},
+                {'$project': {'_id': 0, 'tasks': 1}}
+            ])
+            if users:
+                return self.resolve(users[0]['tasks'])
+            return []
+        except Exception as e:
+            raise
+
+    def tasks_lookup(self):
+        """Obtain the $lookup stage which replaces the task ids of a user by the populated tasks (see tasks_lookup)."""
+        return tasks_lookup(self.dao.collection_name, self.populate_stages())
+
+    def get_populated(self, filter: dict):
+        """Return all task objects compliant to the given filter, where the video and the todos are already resolved (see populate_stages).
+
+        attributes:
+            filter -- dict containing key value pairs of (MongoDB typed) properties and applicable filters
 
-            for task in tasks:
-                self.populate_task(task)
+        returns:
+            tasks -- list of populated tasks
 
-            return tasks
+        raises:
+            Exception -- in case any database operation fails
+        """
+        try:
+            return self.resolve(self.dao.aggregate([{'$match': filter}] + self.populate_stages()))
         except Exception as e:
             raise
 
+    def populate_stages(self):
+        """Obtain the aggregation pipeline stages which populate a task (see populate_stages). In the embedded storage mode, tasks are read without any stages, and the references which have not been migrated yet are resolved afterwards (see resolve).
+
+        returns:
+            stages -- list of aggregation pipeline stages
+        """
+        if self.embedded:
+            return []
+        return populate_stages(self.videos_dao.collection_name, self.todos_dao.collection_name)
+
+    def resolve(self, tasks: list):
+        """Replace the references which remain in the given (json) tasks by the referenced objects, which are looked up with at most one query per collection (none if the tasks embed their videos and todos). This completes the tasks read in the embedded storage mode while they are migrated (see src.util.taskstorage).
+
+        parameters:
+            tasks -- list of tasks, which are modified in place
+
+        returns:
+            tasks -- the given tasks
+        """
+        videoids, todoids = references(tasks)
+        videos = {video['_id']['$oid']: video for video in self.videos_dao.find_by_ids(videoids)['found']} if videoids else {}
+        todos = {todo['_id']['$oid']: todo for todo in self.todos_dao.find_by_ids(todoids)['found']} if todoids else {}
+        return substitute(tasks, videos, todos)
+
     def populate_task(self, task):
         """Populate a given task object by resolving dependencies: replace the id contained in the video attribute by the actual video object and replace each todo id contained in the todos attribute by all actual todo objects
 
@@ -99,16 +231,33 @@ class TaskController(Controller):
         returns:
             task -- task object with resolved references        
         """
-        # populate the video of the task
-        video = self.videos_dao.findOne(task['video']['$oid'])
-        task['video'] = video
-
-        # populate the todos of the task
-        todos = self.todos_dao.find(filter={'_id': task['todos']}, toid=['_id'])
-        task['todos'] = todos
+        populated = self.get_populated(filter={'_id': ObjectId(task['_id']['$oid'])})
+        if populated:
+            task['video'] = populated[0]['video']
+            task['todos'] = populated[0]['todos']
 
         return task
 
+    def update(self, id: str, data: dict, return_document: bool = False):
+        """Update the task with the given id (see Controller.update). The dashboard containing the task is rebuilt on its next read."""
+        try:
+            result = super().update(id, data, return_document=return_document)
+            if self.dashboards is not None:
+                self.dashboards.invalidate(taskids=[id])
+            return result
+        except Exception as e:
+            raise
+
+    def delete(self, id: str):
+        """Delete the task with the given id (see Controller.delete). The dashboard containing the task is rebuilt on its next read."""
+        try:
+            result = super().delete(id)
+            if self.dashboards is not None:
+                self.dashboards.invalidate(taskids=[id])
+            return result
+        except Exception as e:
+            raise
+
     def delete_of_user(self, id: str):
         """Delete all tasks that are associated to a user with the given ID. This includes each video and all todo items associated to each of the tasks.
         
@@ -122,18 +271,228 @@ class TaskController(Controller):
             Exception -- in case any database operation fails
         """
         try:
-            user = self.users_dao.findOne(id)
-            if 'tasks' in user:
-                tasks = self.dao.find(filter={'_id': user['tasks']}, toid=['_id'])
+            return self._delete_cascade(id, delete_user=False)['task']
+        except Exception as e:
+            raise
 
-                for task in tasks:
-                    self.videos_dao.delete(id=task['video']['$oid'])
-                    for todo in task['todos']:
-                        self.todos_dao.delete(id=todo['$oid'])
-                    self.dao.delete(id=task['_id']['$oid'])
+    def delete_user(self, id: str, transactional: bool = False):
+        """Delete a user with the given ID together with all associated tasks, videos and todo items. Independent of the number of tasks, this takes one read of the user, one read of the task references and one delete_many per collection.
 
-                return len(tasks)
-            else:
-                return 0
+        parameters:
+            id -- the unique identifier of a user object
+            transactional -- if True, execute all operations within one transaction (requires a replica set)
+
+        returns:
+            counts -- dict containing the number of deleted objects per collection (keys 'user', 'task', 'video' and 'todo')
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        try:
+            if transactional:
+                with self.dao.start_session() as session:
+                    return session.with_transaction(lambda s: self._delete_cascade(id, delete_user=True, session=s))
+            return self._delete_cascade(id, delete_user=True)
         except Exception as e:
-            raise
\ No newline at end of file
+            raise
+
+    def _delete_cascade(self, id: str, delete_user: bool, session=None):
+        """Collect the ids of all tasks, videos and todos associated to the user once and delete them with one delete_many per collection.
+        """
+        counts = {'task': 0, 'video': 0, 'todo': 0}
+        if delete_user:
+            counts['user'] = 0
+
+        user = self.users_dao.findOne(id, session=session)
+        if user is None:
+            return counts
+
+        if user.get('tasks'):
+            taskids = [task['$oid'] for task in user['tasks']]
+            tasks = self.dao.find_by_ids(taskids, projection={'video': 1, 'todos': 1}, session=session)['found']
+
+            # embedded videos and todos are deleted with their tasks
+            videoids, todoids = references(tasks)
+
+            counts['video'] = self.videos_dao.delete_many(videoids, session=session)
+            counts['todo'] = self.todos_dao.delete_many(todoids, session=session)
+            counts['task'] = self.dao.delete_many(taskids, session=session)
+
+        if delete_user:
+            counts['user'] = self.users_dao.delete_many([id], session=session)
+
+        if self.versions is not None:
+            self.versions.bump(cascade_keys(id, user), session=session)
+        if self.dashboards is not None:
+            if delete_user:
+                self.dashboards.invalidate(userids=[id], session=session)
+            else:
+                self.dashboards.clear_tasks(id, session=session)
+        return counts
+
+def prepare_tasks(data: list):
+    """Separate the userid from the data of each new task and fill default values for missing properties.
+
+    parameters:
+        data -- list of dicts containing the data of the new tasks
+
+    returns:
+        tasks -- list of (userid, task) tuples, where each task is a copy of the given data
+
+    raises:
+        KeyError -- in case the userid is missing in one of the data dicts
+    """
+    tasks = []
+    for taskdata in data:
+        # store the userid
+        if 'userid' not in taskdata:
+            raise KeyError('When creating a task object, the userid of the associated user must be given')
+        task = dict(taskdata)
+        uid = task['userid']
+        del task['userid']
+
+        # fill default values for missing values
+        if 'startdate' not in task:
+            task['startdate'] = datetime.today()
+        if 'categories' not in task:
+            task['categories'] = []
+        tasks.append((uid, task))
+    return tasks
+
+def video_documents(tasks: list):
+    """Build the video documents of the given (userid, task) tuples (see prepare_tasks) for the reference storage mode."""
+    return [{'url': task['url']} for _, task in tasks]
+
+def todo_documents(tasks: list):
+    """Build the todo documents of all given (userid, task) tuples (see prepare_tasks) for the reference storage mode, in the order of the tasks."""
+    return [{'description': todo, 'done': False} for _, task in tasks for todo in task['todos']]
+
+def reference_tasks(tasks: list, videos: list, todos: list):
+    """Build the task documents of the given (userid, task) tuples for the reference storage mode, which reference their inserted video and todos.
+
+    parameters:
+        tasks -- list of (userid, task) tuples (see prepare_tasks)
+        videos -- list of the ids of the inserted videos (see video_documents), one per task
+        todos -- list of the ids of the inserted todos (see todo_documents)
+
+    returns:
+        documents -- list of the task documents
+    """
+    todos = iter(todos)
+    documents = []
+    for (_, task), video in zip(tasks, videos):
+        document = dict(task)
+        del document['url']
+        document['video'] = video
+        document['todos'] = [next(todos) for _ in task['todos']]
+        documents.append(document)
+    return documents
+
+def assign_tasks(tasks: list, taskids: list):
+    """Build the write requests which append the ids of new tasks to the tasks of their users (one request per user).
+
+    parameters:
+        tasks -- list of (userid, task) tuples (see prepare_tasks)
+        taskids -- list of the ids of the inserted tasks
+
+    returns:
+        requests -- list of UpdateOne requests on the user collection
+    """
+    assignments = {}
+    for (uid, _), taskid in zip(tasks, taskids):
+        assignments.setdefault(uid, []).append(taskid)
+    return [UpdateOne({'_id': ObjectId(uid)}, {'$push': {'tasks': {'$each': ids}}}) for uid, ids in assignments.items()]
+
+def creation_keys(tasks: list, taskids: list):
+    """Obtain the version keys (see src.util.versions) of the representations changed by the creation of tasks: the users and their lists of tasks, as well as the new tasks, which thereby obtain their version counters."""
+    return [f'{scope}:{uid}' for uid, _ in tasks for scope in ('user', 'tasksof')] + [f'task:{taskid}' for taskid in taskids]
+
+def cascade_keys(id: str, user: dict):
+    """Obtain the version keys of the representations changed by the deletion of the tasks of a user (or the user itself), given the (json) user object."""
+    return [f'user:{id}', f'tasksof:{id}'] + [f'task:{task["$oid"]}' for task in user.get('tasks', [])]
+
+def populate_stages(videos_collection: str, todos_collection: str):
+    """Obtain the aggregation pipeline stages which populate a task: the id contained in the video attribute is replaced by the actual video object (or None, if it does not exist) and the todo ids contained in the todos attribute are replaced by the actual todo objects. Embedded videos and todos (see src.util.taskstorage) are kept.
+
+    parameters:
+        videos_collection, todos_collection -- the names of the video and todo collections
+
+    returns:
+        stages -- list of aggregation pipeline stages
+    """
+    return [
+        {'$lookup': {
+            'from': videos_collection,
+            'localField': 'video',
+            'foreignField': '_id',
+            'as': 'referencedVideo'
+        }},
+        {'$lookup': {
+            'from': todos_collection,
+            'localField': 'todos',
+            'foreignField': '_id',
+            'as': 'referencedTodos'
+        }},
+        {'$set': {
+            'video': {'$cond': [
+                {'$eq': [{'$type': '$video'}, 'object']},
+                '$video',
+                {'$ifNull': [{'$arrayElemAt': ['$referencedVideo', 0]}, None]}
+            ]},
+            'todos': {'$concatArrays': [
+                {'$filter': {'input': {'$ifNull': ['$todos', []]}, 'cond': {'$eq': [{'$type': '$$this'}, 'object']}}},
+                '$referencedTodos'
+            ]}
+        }},
+        {'$unset': ['referencedVideo', 'referencedTodos']}
+    ]
+
+def tasks_lookup(tasks_collection: str, stages: list):
+    """Obtain the $lookup stage which replaces the task ids of a user by the tasks, to which the given stages are applied (e.g., see populate_stages)."""
+    lookup = {
+        'from': tasks_collection,
+        'localField': 'tasks',
+        'foreignField': '_id',
+        'as': 'tasks'
+    }
+    if stages:
+        lookup['pipeline'] = stages
+    return lookup
+
+def populated(tasks: list, documents: list, taskids: list):
+    """Build the populated task documents of newly inserted tasks from their data, without reading them back (e.g., to add them to the dashboards of their users).
+
+    parameters:
+        tasks -- list of (userid, task) tuples (see prepare_tasks)
+        documents -- list of the inserted task documents, which either reference or embed their video and todos
+        taskids -- list of the ids of the inserted tasks
+
+    returns:
+        tasks -- list of (userid, populated task document) tuples
+    """
+    result = []
+    for (uid, task), document, taskid in zip(tasks, documents, taskids):
+        populated = dict(document, _id=taskid)
+        if isinstance(document['video'], ObjectId):
+            populated['video'] = {'_id': document['video'], 'url': task['url']}
+            populated['todos'] = [{'_id': todoid, 'description': description, 'done': False} for todoid, description in zip(document['todos'], task['todos'])]
+        result.append((uid, populated))
+    return result
+
+def embed_tasks(tasks: list):
+    """Build the task documents of the given (userid, task) tuples for the embedded storage mode (see src.util.taskstorage), which contain their video and todo objects.
+
+    parameters:
+        tasks -- list of (userid, task) tuples (see prepare_tasks)
+
+    returns:
+        documents -- list of the task documents
+    """
+    documents = []
+    for _, task in tasks:
+        document = dict(task)
+        del document['url']
+        document['video'] = {'_id': ObjectId(), 'url': task['url']}
+        document['todos'] = [{'_id': ObjectId(), 'description': todo, 'done': False} for todo in task['todos']]
+        documents.append(document)
+    return documents
@@ -1,15 +1,25 @@
 from src.controllers.controller import Controller
 from  src.util.dao import DAO
+from src.util.dashboards import Dashboards
+from src.util.taskstorage import is_reference, embedded_todo, positional
+from src.util.versions import Versions
 
 from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo import InsertOne, UpdateOne, UpdateMany, DeleteOne
+from pymongo.errors import BulkWriteError
 
 class TodoController(Controller):
-    def __init__(self, todo_dao: DAO, tasks_dao: DAO):
-        super().__init__(dao=todo_dao)
+    def __init__(self, todo_dao: DAO, tasks_dao: DAO, versions: Versions = None, embedded: bool = False, dashboards: Dashboards = None):
+        super().__init__(dao=todo_dao, versions=versions)
         self.tasks_dao = tasks_dao
+        # if True, new todos of a task are embedded in the task document (see src.util.taskstorage)
+        self.embedded = embedded
+        # optional materialized dashboards of the users, which are updated by the modifications (see src.util.dashboards)
+        self.dashboards = dashboards
 
     def create(self, data: dict):
-        """Given a valid dict containing the data of the new todo item create a new todo item and return the newly created item. If in addition a taskid attribute is given, then the new todo object will be automatically associated to the task object.
+        """Given a valid dict containing the data of the new todo item create a new todo item and return the newly created item. If in addition a taskid attribute is given, then the new todo object will be automatically associated to the task object (in the embedded storage mode, the todo is embedded in the task).
 
         parameters: 
             data -- dict containing a description under the key description
@@ -30,11 +40,324 @@ class TodoController(Controller):
                     if isinstance(data['done'], str):
                         data['done'] = (data['done'].lower() == 'true')
 
-                todo = self.dao.create(data)
-                self.tasks_dao.update(id=task['_id']['$oid'], update_data={'$push' : {'todos': ObjectId(todo['_id']['$oid'])}})
+                if self.embedded:
+                    todo = dict(data, _id=ObjectId())
+                    self.tasks_dao.update(id=task['_id']['$oid'], update_data={'$push' : {'todos': todo}})
+                    todo = self.dao.to_json(todo)
+                else:
+                    todo = self.dao.create(data)
+                    self.tasks_dao.update(id=task['_id']['$oid'], update_data={'$push' : {'todos': ObjectId(todo['_id']['$oid'])}})
+                self.touch([task['_id']['$oid']], collection_name='task')
+                if self.dashboards is not None:
+                    self.dashboards.add_todo(task['_id']['$oid'], todo)
 
                 return todo
             else:
                 return self.dao.create(data)
         except Exception as e:
-            raise
\ No newline at end of file
+            raise
+
+    def get(self, id: str):
+        """Return the todo with the given id, which is either stored in the todo collection or embedded in a task (see src.util.taskstorage). The location of the todos of the configured storage mode is looked up first.
+
+        parameters:
+            id -- the unique identifier of the todo
+
+        returns:
+            todo -- the todo object
+            None -- if no todo is associated to the given id
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        try:
+            for lookup in self._ordered(self._get_embedded, super().get):
+                todo = lookup(id)
+                if todo is not None:
+                    return todo
+            return None
+        except Exception as e:
+            raise
+
+    def get_many(self, ids: list):
+        """Search for several todos by their ids at once, which are either stored in the todo collection (see DAO.find_by_ids) or embedded in tasks (one query for all of them). The location of the todos of the configured storage mode is looked up first, and the other one only for the todos which have not been found.
+
+        parameters:
+            ids -- list of the unique identifiers of the todos
+
+        returns:
+            result -- dict containing the found todos in the order of the given ids under the key 'found' and the ids without a todo under the key 'missing'
+
+        raises:
+            bson.errors.InvalidId -- in case one of the ids is not valid
+            Exception -- in case any database operation fails
+        """
+        try:
+            ids = [str(ObjectId(id)) for id in ids]
+            todos = {}
+            for lookup in self._ordered(self._find_embedded, self._find_referenced):
+                remaining = [id for id in dict.fromkeys(ids) if id not in todos]
+                if remaining:
+                    todos.update(lookup(remaining))
+            return {
+                'found': [todos[id] for id in ids if id in todos],
+                'missing': [id for id in dict.fromkeys(ids) if id not in todos]
+            }
+        except Exception as e:
+            raise
+
+    def update(self, id: str, data: dict, return_document: bool = False):
+        """Update the todo with the given id (see Controller.update), where an embedded todo is updated within its task (see src.util.taskstorage). The location of the todos of the configured storage mode is tried first.
+
+        returns:
+            True -- if the update was successful
+            False -- if no todo is associated to the given id
+            todo -- the updated todo, if return_document is True (None if no todo is associated to the id)
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        try:
+            for update in self._ordered(self._update_embedded, self._update_referenced):
+                todo = update(id, data)
+                if todo is not None:
+                    if self.dashboards is not None:
+                        self.dashboards.update_todo(todo)
+                    return todo if return_document else True
+            return None if return_document else False
+        except Exception as e:
+            raise
+
+    def delete(self, id: str):
+        """Delete the todo with the given id, where an embedded todo is removed from its task (see src.util.taskstorage). The location of the todos of the configured storage mode is tried first.
+
+        returns:
+            True -- if the todo has been deleted
+            False -- if no todo is associated to the given id
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        try:
+            for delete in self._ordered(self._delete_embedded, self._delete_referenced):
+                if delete(id):
+                    if self.dashboards is not None:
+                        self.dashboards.remove_todo(id)
+                    return True
+            return False
+        except Exception as e:
+            raise
+
+    def _ordered(self, embedded, referenced):
+        """See ordered."""
+        return ordered(self.embedded, embedded, referenced)
+
+    def _get_embedded(self, id: str):
+        task = self.tasks_dao.find_one_by({'todos._id': ObjectId(id)}, projection={'todos': 1})
+        return embedded_todo(task, id)
+
+    def _find_embedded(self, ids: list):
+        tasks = self.tasks_dao.find(filter={'todos._id': {'$in': [ObjectId(id) for id in ids]}}, projection={'todos': 1})
+        return {todo['_id']['$oid']: todo for task in tasks for todo in task.get('todos') or [] if not is_reference(todo) and todo['_id']['$oid'] in ids}
+
+    def _find_referenced(self, ids: list):
+        return {todo['_id']['$oid']: todo for todo in self.dao.find_by_ids(ids)['found']}
+
+    def _update_embedded(self, id: str, data: dict):
+        task = self.tasks_dao.update_by({'todos._id': ObjectId(id)}, positional(data), return_document=True, projection={'todos': 1})
+        if task is not None:
+            self.touch([task['_id']['$oid']], collection_name='task')
+        return embedded_todo(task, id)
+
+    def _update_referenced(self, id: str, data: dict):
+        todo = self.dao.update(id=id, update_data=data, return_document=True)
+        if todo is not None:
+            self.touch([id])
+        return todo
+
+    def _delete_embedded(self, id: str):
+        task = self.tasks_dao.update_by({'todos._id': ObjectId(id)}, {'$pull': {'todos': {'_id': ObjectId(id)}}}, return_document=True, projection={'_id': 1})
+        if task is not None:
+            self.touch([task['_id']['$oid']], collection_name='task')
+        return task is not None
+
+    def _delete_referenced(self, id: str):
+        deleted = self.dao.delete_many([id])
+        if deleted:
+            self.touch([id])
+        return deleted > 0
+
+    def batch(self, operations: list):
+        """Execute several operations on todo items at once, with a fixed number of round trips independent of the number of operations: one lookup of the involved tasks (including the tasks embedding the involved todos, see src.util.taskstorage), one lookup of the involved todos in the todo collection (only if todos are updated or deleted, such that operations on todos which do not exist fail), one bulk write of all operations on the todo collection and one bulk write of all operations on the task collection (associating the created todos to their tasks and modifying the embedded todos). The operations are independent of each other, i.e., a failing operation does not prevent the others. Every operation is a dict with the key op and one of the following forms:
+            {'op': 'create', 'description': ..., 'done': ..., 'taskid': ...} -- create a todo (optionally associated to a task)
+            {'op': 'update', 'id': ..., 'data': ...} -- update a todo, where data either contains MongoDB update operators (e.g., {'$set': {'done': True}}) or the new values of the properties
+            {'op': 'delete', 'id': ...} -- delete a todo
+            {'op': 'done', 'taskid': ..., 'done': ...} -- mark all todos of a task as done (or not done, if done is False)
+
+        parameters:
+            operations -- list of operation dicts
+
+        returns:
+            results -- list containing one dict per operation (in the same order) with the key ok and either the id of the affected todo (the created todo for create, and the taskid for done) or the error message under the key error
+
+        raises:
+            Exception -- in case any database operation fails for another reason than a write error
+        """
+        results = [None] * len(operations)
+        # the write requests on the todo and task collections and the index of the operation of each request
+        requests, origins = [], []
+        taskrequests, taskorigins = [], []
+        created = {}
+
+        def fail(index, message):
+            results[index] = {'ok': False, 'error': message}
+
+        def write(request, index):
+            requests.append(request)
+            origins.append(index)
+
+        def writetask(request, index):
+            taskrequests.append(request)
+            taskorigins.append([index])
+
+        try:
+            # look up all tasks involved at once (operations referring to invalid or missing tasks fail below)
+            taskids, todoids = set(), set()
+            for operation in operations:
+                if not isinstance(operation, dict):
+                    continue
+                if operation.get('op') in ('create', 'done') and ObjectId.is_valid(str(operation.get('taskid'))):
+                    taskids.add(str(operation['taskid']))
+                if operation.get('op') in ('update', 'delete') and ObjectId.is_valid(str(operation.get('id'))):
+                    todoids.add(str(operation['id']))
+            tasks, embedding, existing = {}, {}, set()
+            if todoids:
+                found = self.tasks_dao.find(filter={'$or': [
+                    {'_id': {'$in': [ObjectId(id) for id in taskids]}},
+                    {'todos._id': {'$in': [ObjectId(id) for id in todoids]}}
+                ]}, projection={'todos': 1})
+                tasks = {task['_id']['$oid']: task for task in found}
+                # the task embedding each of the involved todos
+                embedding = {todo['_id']['$oid']: taskid for taskid, task in tasks.items() for todo in task.get('todos') or [] if not is_reference(todo) and todo['_id']['$oid'] in todoids}
+                stored = {todo['_id']['$oid'] for todo in self.dao.find_by_ids(list(todoids), projection={'_id': 1})['found']}
+                existing = stored | set(embedding)
+                if not self.embedded:
+                    # while tasks are migrated, the copy in the todo collection takes precedence in the reference mode (see TodoController._ordered)
+                    embedding = {id: taskid for id, taskid in embedding.items() if id not in stored}
+            elif taskids:
+                tasks = {task['_id']['$oid']: task for task in self.tasks_dao.find_by_ids(list(taskids), projection={'todos': 1})['found']}
+
+            for index, operation in enumerate(operations):
+                if not isinstance(operation, dict):
+                    fail(index, 'Operation must be an object')
+                    continue
+                op = operation.get('op')
+                try:
+                    if op == 'create':
+                        todo = {key: value for key, value in operation.items() if key not in ('op', 'taskid')}
+                        if isinstance(todo.get('done'), str):
+                            todo['done'] = (todo['done'].lower() == 'true')
+                        todo.setdefault('done', False)
+                        taskid = operation.get('taskid')
+                        if taskid is not None and str(taskid) not in tasks:
+                            raise ValueError(f'Task {taskid} does not exist')
+                        todo['_id'] = ObjectId()
+                        if self.embedded and taskid is not None:
+                            created[index] = (todo, str(taskid))
+                        else:
+                            write(InsertOne(todo), index)
+                            created[index] = (todo['_id'], str(taskid) if taskid is not None else None)
+                        results[index] = {'ok': True, 'id': str(todo['_id'])}
+                    elif op == 'update':
+                        data = operation.get('data')
+                        if not isinstance(data, dict) or not data:
+                            raise ValueError('An update requires data')
+                        if not all(key.startswith('$') for key in data):
+                            data = {'$set': data}
+                        id = str(ObjectId(operation.get('id')))
+                        if id not in existing:
+                            raise ValueError(f'Todo {id} does not exist')
+                        if id in embedding:
+                            writetask(UpdateOne({'_id': ObjectId(embedding[id]), 'todos._id': ObjectId(id)}, positional(data)), index)
+                        else:
+                            write(UpdateOne({'_id': ObjectId(id)}, data), index)
+                        results[index] = {'ok': True, 'id': str(operation['id'])}
+                    elif op == 'delete':
+                        id = str(ObjectId(operation.get('id')))
+                        if id not in existing:
+                            raise ValueError(f'Todo {id} does not exist')
+                        # later operations of the batch on the deleted todo fail
+                        existing.discard(id)
+                        if id in embedding:
+                            writetask(UpdateOne({'_id': ObjectId(embedding[id])}, {'$pull': {'todos': {'_id': ObjectId(id)}}}), index)
+                        else:
+                            write(DeleteOne({'_id': ObjectId(id)}), index)
+                        results[index] = {'ok': True, 'id': str(operation['id'])}
+                    elif op == 'done':
+                        taskid = str(operation.get('taskid'))
+                        if taskid not in tasks:
+                            raise ValueError(f'Task {taskid} does not exist')
+                        done = operation.get('done', True)
+                        if isinstance(done, str):
+                            done = (done.lower() == 'true')
+                        todos = tasks[taskid].get('todos') or []
+                        referenced = [ObjectId(todo['$oid']) for todo in todos if is_reference(todo)]
+                        if referenced:
+                            write(UpdateMany({'_id': {'$in': referenced}}, {'$set': {'done': bool(done)}}), index)
+                        for todo in todos:
+                            if not is_reference(todo):
+                                writetask(UpdateOne({'_id': ObjectId(taskid), 'todos._id': ObjectId(todo['_id']['$oid'])}, {'$set': {'todos.$.done': bool(done)}}), index)
+                        results[index] = {'ok': True, 'taskid': taskid}
+                    else:
+                        raise ValueError(f'Unknown operation {op}')
+                except (ValueError, TypeError, InvalidId) as e:
+                    fail(index, str(e))
+
+            if requests:
+                try:
+                    self.dao.bulk_write(requests, ordered=False)
+                except BulkWriteError as e:
+                    for error in e.details['writeErrors']:
+                        fail(origins[error['index']], error['errmsg'])
+
+            # associate the created todos (or embed them) to their tasks
+            assignments = {}
+            for index, (todo, taskid) in created.items():
+                if results[index]['ok'] and taskid is not None:
+                    assignments.setdefault(taskid, []).append((todo, index))
+            for taskid, assigned in assignments.items():
+                taskrequests.append(UpdateOne({'_id': ObjectId(taskid)}, {'$push': {'todos': {'$each': [todo for todo, _ in assigned]}}}))
+                taskorigins.append([index for _, index in assigned])
+            if taskrequests:
+                try:
+                    self.tasks_dao.bulk_write(taskrequests, ordered=False)
+                except BulkWriteError as e:
+                    for error in e.details['writeErrors']:
+                        for index in taskorigins[error['index']]:
+                            fail(index, error['errmsg'])
+
+            # the (populated) tasks of the modified todos have changed
+            modified = [operation['id'] for index, operation in enumerate(operations) if results[index]['ok'] and operation.get('op') in ('update', 'delete')]
+            self.touch([id for id in modified if str(id) not in embedding])
+            touched = list(assignments) + [embedding[str(id)] for id in modified if str(id) in embedding]
+            touched += [operation['taskid'] for index, operation in enumerate(operations) if results[index]['ok'] and operation.get('op') == 'done']
+            self.touch(touched, collection_name='task')
+            if self.dashboards is not None:
+                # the dashboards containing the modified todos are rebuilt on their next read
+                self.dashboards.invalidate(taskids=touched, todoids=[id for id in modified if ObjectId.is_valid(str(id))])
+
+            return results
+        except Exception as e:
+            raise
+
+def ordered(embedded: bool, onembedded, onreferenced):
+    """Order the operations on embedded and on referenced todos, such that the one of the configured storage mode comes first. While tasks are migrated, a todo may exist in both locations: only the location of the configured mode may be modified, such that the migration can reconcile the other one.
+
+    parameters:
+        embedded -- whether the embedded storage mode is configured (see src.util.taskstorage)
+        onembedded, onreferenced -- the operations on an embedded and on a referenced todo
+
+    returns:
+        operations -- list of both operations in the order in which they are tried
+    """
+    return [onembedded, onreferenced] if embedded else [onreferenced, onembedded]
@@ -1,23 +1,37 @@
 from src.controllers.controller import Controller
 from src.util.dao import DAO
+from src.util.dashboards import Dashboards
+from src.util.versions import Versions
 
 import re
 emailValidator = re.compile(r'.*@.*')
 
 class UserController(Controller):
-    def __init__(self, dao: DAO):
-        super().__init__(dao=dao)
+    def __init__(self, dao: DAO, versions: Versions = None, dashboards: Dashboards = None):
+        super().__init__(dao=dao, versions=versions)
+        # optional materialized dashboards of the users (see src.util.dashboards)
+        self.dashboards = dashboards
+
+    def create(self, data: dict):
+        """Create a new user (see Controller.create) together with the version counters of its representations (see src.util.versions), such that they can be revalidated from the first read on."""
+        try:
+            user = super().create(data)
+            if self.versions is not None:
+                self.versions.bump([f'user:{user["_id"]["$oid"]}', f'tasksof:{user["_id"]["$oid"]}'])
+            return user
+        except Exception as e:
+            raise
 
     def get_user_by_email(self, email: str):
         """Given a valid email address of an existing account, return the user object contained in the database associated
-        to that user. For now, do not assume that the email attribute is unique. Additionally print a warning message containing the email
-        address if the search returns multiple users.
+        to that user. The email attribute is unique (see the declared indexes of the user collection), hence the user is 
+        looked up via the index.
 
         parameters:
             email -- an email address string
 
         returns:
-            user -- the user object associated to that email address (if multiple users are associated to that email: return the first one)
+            user -- the user object associated to that email address
             None -- if no user is associated to that email address
 
         raises:
@@ -29,21 +43,15 @@ class UserController(Controller):
             raise ValueError('Error: invalid email address')
 
         try:
-            users = self.dao.find({'email': email})
-            if users:
-                if len(users) == 1:
-                    return users[0]
-                else:
-                    print(f'Warning: more than one user found with mail {email}')
-                    return users[0]
-            else:
-                return None
+            return self.dao.find_one_by({'email': email})
         except Exception as e:
             raise
 
-    def update(self, id, data):
+    def update(self, id, data, return_document: bool = False):
         try:
-            update_result = super().update(id=id, data={'$set': data})
+            update_result = super().update(id=id, data={'$set': data}, return_document=return_document)
+            if self.dashboards is not None:
+                self.dashboards.update_user(id, data)
             return update_result
         except Exception as e:
             raise
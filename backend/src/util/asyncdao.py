@@ -0,0 +1,115 @@
+# coding=utf-8
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.util.dao import DAO
+from src.util.config import getConfig
+
+# executor running the blocking pymongo operations of all asynchronous data access objects of the process
+executor = None
+lock = threading.Lock()
+
+def getExecutor():
+    """Obtain the executor of the asynchronous data access objects, which is created on first use. Its number of threads (configuration value ASYNC_DAO_THREADS) bounds the number of database operations in flight and should not exceed the size of the connection pool (see src.util.clients).
+
+    returns:
+        executor -- the shared concurrent.futures.ThreadPoolExecutor
+    """
+    global executor
+    with lock:
+        if executor is None:
+            threads = int(getConfig().get('ASYNC_DAO_THREADS', 16))
+            executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='asyncdao')
+        return executor
+
+def resetExecutor():
+    """Forget the executor in a forked child process, as its threads only exist in the parent process."""
+    global executor, lock
+    executor = None
+    lock = threading.Lock()
+
+os.register_at_fork(after_in_child=resetExecutor)
+
+async def run(operation, *args, **kwargs):
+    """Run a blocking operation on the executor of the asynchronous data access objects (see getExecutor).
+
+    parameters:
+        operation -- the function to run, which is called with the given arguments
+
+    returns:
+        result -- the result of the operation
+    """
+    loop = asyncio.get_running_loop()
+    # run the operation in a copy of the current context, such that it is recorded in the query tracker of the request (see src.util.querytracker)
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(getExecutor(), functools.partial(context.run, operation, *args, **kwargs))
+
+class AsyncDAO:
+    def __init__(self, dao: DAO):
+        """Establish an asynchronous data access object, which offers the operations of a (synchronous) data access object as coroutines. Every operation is run on a shared thread pool (just like motor does for pymongo), such that the event loop is free to process other coroutines, e.g., independent lookups combined via asyncio.gather, while the operation waits on the database. Since the synchronous data access object is wrapped, both share the connection pool, the document cache and the storage engine.
+
+        parameters:
+            dao -- the synchronous data access object of the collection
+        """
+        self.dao = dao
+        self.collection_name = dao.collection_name
+
+    @property
+    def collection(self):
+        """The collection of the wrapped data access object (connecting to it blocks on first use, see DAO.collection)."""
+        return self.dao.collection
+
+    async def _run(self, operation, *args, **kwargs):
+        return await run(operation, *args, **kwargs)
+
+    async def create(self, data: dict, read_back: bool = False):
+        """See DAO.create."""
+        return await self._run(self.dao.create, data, read_back=read_back)
+
+    async def create_many(self, data: list, ordered: bool = False, chunk_size: int = 1000):
+        """See DAO.create_many."""
+        return await self._run(self.dao.create_many, data, ordered=ordered, chunk_size=chunk_size)
+
+    async def findOne(self, id: str):
+        """See DAO.findOne."""
+        return await self._run(self.dao.findOne, id)
+
+    async def find_one_by(self, filter: dict, projection: dict = None):
+        """See DAO.find_one_by."""
+        return await self._run(self.dao.find_one_by, filter, projection=projection)
+
+    async def find_by_ids(self, ids: list, projection: dict = None, pipeline: list = None, chunk_size: int = 500):
+        """See DAO.find_by_ids."""
+        return await self._run(self.dao.find_by_ids, ids, projection=projection, pipeline=pipeline, chunk_size=chunk_size)
+
+    async def find(self, filter=None, toid: list = None, projection: dict = None):
+        """See DAO.find."""
+        return await self._run(self.dao.find, filter=filter, toid=toid, projection=projection)
+
+    async def aggregate(self, pipeline: list):
+        """See DAO.aggregate."""
+        return await self._run(self.dao.aggregate, pipeline)
+
+    async def update(self, id: str, update_data: dict, return_document: bool = False, projection: dict = None):
+        """See DAO.update."""
+        return await self._run(self.dao.update, id, update_data, return_document=return_document, projection=projection)
+
+    async def update_by(self, filter: dict, update_data: dict, return_document: bool = False, projection: dict = None):
+        """See DAO.update_by."""
+        return await self._run(self.dao.update_by, filter, update_data, return_document=return_document, projection=projection)
+
+    async def delete(self, id: str):
+        """See DAO.delete."""
+        return await self._run(self.dao.delete, id)
+
+    async def delete_many(self, ids: list):
+        """See DAO.delete_many."""
+        return await self._run(self.dao.delete_many, ids)
+
+    async def bulk_write(self, requests: list, ordered: bool = True):
+        """See DAO.bulk_write."""
+        return await self._run(self.dao.bulk_write, requests, ordered=ordered)
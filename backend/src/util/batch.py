@@ -0,0 +1,25 @@
+from flask import request
+
+from src.util.config import getConfig
+
+def requestedIds():
+    """Obtain the ids of a batch request, which are either given as JSON body of the form {"ids": [...]} or as form field ids (repeated or containing comma separated ids). The number of ids per request is limited by the configuration value MAX_BATCH_IDS (default 1000).
+
+    returns:
+        ids -- list of the requested ids (strings)
+
+    raises:
+        ValueError -- in case the ids are malformed or exceed the limit
+    """
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        ids = data.get('ids', [])
+        if not isinstance(ids, list) or not all(isinstance(id, str) for id in ids):
+            raise ValueError('Error: ids must be a list of strings')
+    else:
+        ids = [id.strip() for value in request.form.getlist('ids') for id in value.split(',') if id.strip()]
+
+    limit = int(getConfig().get('MAX_BATCH_IDS', 1000))
+    if len(ids) > limit:
+        raise ValueError(f'Error: at most {limit} ids can be requested at once')
+    return ids
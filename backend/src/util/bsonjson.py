@@ -0,0 +1,74 @@
+import datetime
+import json
+import math
+
+from bson import json_util
+from bson.objectid import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+def to_json(data):
+    """Transform a MongoDB document into a json object by walking it once. The result is identical to the relaxed extended JSON produced by json.loads(json_util.dumps(data)), i.e., an ObjectId is mapped to {'$oid': ...} and a datetime to {'$date': ...}. Values of rarely used BSON types are delegated to json_util.
+
+    parameters:
+        data -- the MongoDB document (or any value contained in it)
+
+    returns:
+        dict -- the document converted to JSON
+    """
+    datatype = type(data)
+    if datatype is str or datatype is int or datatype is bool or data is None:
+        return data
+    if datatype is dict or isinstance(data, dict):
+        return {key: to_json(value) for key, value in data.items()}
+    if datatype is list or datatype is tuple:
+        return [to_json(value) for value in data]
+    if datatype is ObjectId:
+        return {'$oid': str(data)}
+    if datatype is datetime.datetime:
+        return encode_datetime(data)
+    if datatype is float and math.isfinite(data):
+        return data
+    return json.loads(json_util.dumps(data))
+
+def from_json(data):
+    """Transform a json object (as produced by to_json) back into a MongoDB document, e.g., to use a value read before as a condition of a query filter.
+
+    parameters:
+        data -- the json object (or any value contained in it)
+
+    returns:
+        document -- the document with BSON values (ObjectId, datetime, ...)
+    """
+    return json_util.loads(json.dumps(data))
+
+def encode_datetime(value: datetime.datetime):
+    """Transform a datetime into its relaxed extended JSON representation. Naive datetimes are interpreted as UTC, like pymongo does.
+
+    parameters:
+        value -- the datetime object
+
+    returns:
+        dict -- the datetime in the format {'$date': <ISO-8601 string>}
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    if value < EPOCH:
+        return json.loads(json_util.dumps(value))
+
+    offset = value.utcoffset()
+    timezone = 'Z' if not offset else value.strftime('%z')
+    millis = value.microsecond // 1000
+    fraction = '.%03d' % millis if millis else ''
+    return {'$date': f'{value.strftime("%Y-%m-%dT%H:%M:%S")}{fraction}{timezone}'}
+
+class BSONJSONProvider(DefaultJSONProvider):
+    """JSON provider for the flask app, which serializes documents that still contain BSON values (ObjectId, datetime, ...) in the same single pass as documents already converted by to_json, instead of requiring another conversion beforehand.
+    """
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, (ObjectId, datetime.datetime)):
+            return to_json(o)
+        return DefaultJSONProvider.default(o)
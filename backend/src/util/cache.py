@@ -0,0 +1,155 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from src.util.config import getConfig
+
+class DocumentCache:
+    def __init__(self, ttl: float, max_entries: int, max_bytes: int):
+        """In-process least-recently-used cache of JSON documents with a time to live, bounded by both the number of entries and their total size. Documents are stored in serialized form, such that every hit returns a fresh object which the caller may modify.
+
+        parameters:
+            ttl -- number of seconds after which an entry expires
+            max_entries -- maximum number of entries
+            max_bytes -- maximum total size of all entries (measured as the length of the serialized documents)
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.bytes = 0
+        # incremented on every invalidation, such that documents read before an invalidation are not cached afterwards
+        self.generation = 0
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def get(self, key: str):
+        """Obtain the cached document of the given key.
+
+        parameters:
+            key -- the key of the document (e.g., its id)
+
+        returns:
+            document -- a copy of the cached document
+            None -- if the key is not cached (or has expired)
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+
+            expires, serialized = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                self.counters['expirations'] += 1
+                self.counters['misses'] += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.counters['hits'] += 1
+        return json.loads(serialized)
+
+    def put(self, key: str, document: dict, generation: int = None):
+        """Cache a document under the given key, evicting the least recently used entries if the cache is full.
+
+        parameters:
+            key -- the key of the document (e.g., its id)
+            document -- the JSON document
+            generation -- the generation of the cache at the time the document was read from the database: if any invalidation happened since then, the document might be outdated and is not cached
+        """
+        serialized = json.dumps(document)
+        if len(serialized) > self.max_bytes:
+            return
+
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self.entries:
+                self._remove(key)
+
+            self.entries[key] = (time.monotonic() + self.ttl, serialized)
+            self.bytes += len(serialized)
+
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.counters['evictions'] += 1
+
+    def invalidate(self, key: str):
+        """Remove the document of the given key from the cache (e.g., after it was updated or deleted).
+
+        parameters:
+            key -- the key of the document (e.g., its id)
+        """
+        with self.lock:
+            self.generation += 1
+            if key in self.entries:
+                self._remove(key)
+                self.counters['invalidations'] += 1
+
+    def clear(self):
+        """Remove all documents from the cache (e.g., after the collection was dropped)."""
+        with self.lock:
+            self.generation += 1
+            self.counters['invalidations'] += len(self.entries)
+            self.entries.clear()
+            self.bytes = 0
+
+    def statistics(self):
+        """Obtain the counters of the cache (hits, misses, evictions, expirations and invalidations) as well as its current number of entries and size.
+
+        returns:
+            statistics -- dict of counters
+        """
+        with self.lock:
+            return dict(self.counters, entries=len(self.entries), bytes=self.bytes)
+
+    def _remove(self, key: str):
+        _, serialized = self.entries.pop(key)
+        self.bytes -= len(serialized)
+
+policies = {}
+def getCachePolicy(collection_name: str):
+    """Obtain the cache policy of a collection, which is stored in the file src/static/cache.json. A policy contains the ttl (in seconds), max_entries and max_bytes of the cache of the collection (see DocumentCache).
+
+    parameters:
+        collection_name -- the name of the collection
+
+    returns:
+        policy -- dict of the cache parameters
+        None -- if the documents of the collection should not be cached
+    """
+    if not policies:
+        with open(f'./src/static/cache.json', 'r') as f:
+            policies.update(json.load(f))
+    return policies.get(collection_name)
+
+caches = {}
+def getCache(collection_name: str):
+    """Obtain the document cache of a collection. Caching is optional and only enabled if the configuration value DAO_CACHE is set to true. Note that the cache is local to the process: changes made by other processes only become visible once the cached documents expire.
+
+    parameters:
+        collection_name -- the name of the collection
+
+    returns:
+        cache -- DocumentCache of the given collection
+        None -- if caching is disabled or the collection has no cache policy
+    """
+    if getConfig().get('DAO_CACHE', 'false').lower() != 'true':
+        return None
+    if collection_name not in caches:
+        policy = getCachePolicy(collection_name)
+        if policy is None:
+            return None
+        caches[collection_name] = DocumentCache(ttl=policy['ttl'], max_entries=policy['max_entries'], max_bytes=policy['max_bytes'])
+    return caches[collection_name]
+
+def getCacheStatistics():
+    """Obtain the statistics of the caches of all collections (see DocumentCache.statistics).
+
+    returns:
+        statistics -- dict mapping each collection name to the statistics of its cache
+    """
+    return {collection_name: cache.statistics() for collection_name, cache in caches.items()}
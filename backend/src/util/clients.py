@@ -0,0 +1,162 @@
+import os
+import threading
+
+import pymongo
+from pymongo import monitoring
+
+from src.util.config import getConfig
+from src.util import querytracker
+
+class PoolStatistics(monitoring.ConnectionPoolListener):
+    """Connection pool listener (see https://pymongo.readthedocs.io/en/stable/api/pymongo/monitoring.html) which keeps track of the connections of the pools of all servers the shared clients are connected to.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pools = {}
+
+    def pool(self, address):
+        key = f'{address[0]}:{address[1]}'
+        if key not in self.pools:
+            self.pools[key] = {'open': 0, 'in_use': 0, 'max_in_use': 0, 'checkouts': 0, 'failed_checkouts': 0, 'timeouts': 0, 'cleared': 0}
+        return self.pools[key]
+
+    def snapshot(self):
+        """Obtain the current statistics of all pools.
+
+        returns:
+            statistics -- dict mapping each server address (host:port) to a dict of counters: open connections, connections in use, the maximum number of connections in use at once, the number of checkouts, the number of failed checkouts, the number of checkouts which failed because the wait queue timed out and the number of times the pool was cleared
+        """
+        with self.lock:
+            return {address: dict(pool) for address, pool in self.pools.items()}
+
+    def connection_created(self, event):
+        with self.lock:
+            self.pool(event.address)['open'] += 1
+
+    def connection_closed(self, event):
+        with self.lock:
+            self.pool(event.address)['open'] -= 1
+
+    def connection_checked_out(self, event):
+        with self.lock:
+            pool = self.pool(event.address)
+            pool['checkouts'] += 1
+            pool['in_use'] += 1
+            pool['max_in_use'] = max(pool['max_in_use'], pool['in_use'])
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.pool(event.address)['in_use'] -= 1
+
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            pool = self.pool(event.address)
+            pool['failed_checkouts'] += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                pool['timeouts'] += 1
+
+    def pool_cleared(self, event):
+        with self.lock:
+            self.pool(event.address)['cleared'] += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+statistics = PoolStatistics()
+
+class QueryListener(monitoring.CommandListener):
+    """Command listener which records the data commands (i.e., the round trips of the queries and writes) issued by the shared clients in the query tracker of the current request (see src.util.querytracker). pymongo publishes the started event in the thread (and context) issuing the command.
+    """
+
+    # the specification of each data command, whose shape identifies repeated queries
+    COMMANDS = {
+        'find': lambda command: command.get('filter'),
+        'getMore': lambda command: None,
+        'aggregate': lambda command: command.get('pipeline'),
+        'count': lambda command: command.get('query'),
+        'distinct': lambda command: command.get('query'),
+        'findAndModify': lambda command: command.get('query'),
+        'insert': lambda command: None,
+        'update': lambda command: [update.get('q') for update in command.get('updates', [])],
+        'delete': lambda command: [delete.get('q') for delete in command.get('deletes', [])]
+    }
+
+    def started(self, event):
+        if event.command_name in self.COMMANDS:
+            collection = event.command.get(event.command_name)
+            if event.command_name == 'getMore':
+                collection = event.command.get('collection')
+            querytracker.record(event.command_name, str(collection), self.COMMANDS[event.command_name](event.command))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+listener = QueryListener()
+
+clients = {}
+lock = threading.Lock()
+def getClient(url: str):
+    """Obtain the MongoDB client for the given url. The purpose of the realization using the singleton pattern is to share one client, and hence one connection pool and one set of monitoring threads per server, among all data access objects of the process.
+    The pool can be sized via the configuration values MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_WAIT_QUEUE_TIMEOUT_MS and MONGO_SERVER_SELECTION_TIMEOUT_MS (see getPoolStatistics to monitor the usage of the pool). Clients are not shared across forked processes: a forked child process creates its own clients on first use.
+
+    parameters:
+        url -- the MongoDB connection string (something like mongodb://localhost:27017)
+
+    returns:
+        client -- pymongo.MongoClient connected to the given url
+    """
+    with lock:
+        if url not in clients:
+            clients[url] = pymongo.MongoClient(url, event_listeners=[statistics, listener], **getPoolOptions())
+        return clients[url]
+
+def getPoolOptions():
+    """Obtain the options configuring the connection pools of the clients from the configuration (see src.util.config).
+
+    returns:
+        options -- dict of keyword arguments for pymongo.MongoClient
+    """
+    config = getConfig()
+    options = {
+        'maxPoolSize': int(config.get('MONGO_MAX_POOL_SIZE', 100)),
+        'minPoolSize': int(config.get('MONGO_MIN_POOL_SIZE', 0)),
+        'serverSelectionTimeoutMS': int(config.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 30000))
+    }
+    if config.get('MONGO_WAIT_QUEUE_TIMEOUT_MS'):
+        options['waitQueueTimeoutMS'] = int(config.get('MONGO_WAIT_QUEUE_TIMEOUT_MS'))
+    return options
+
+def resetClients():
+    """Forget all clients (without closing them), which is necessary in a forked child process: the clients inherited from the parent process, including their connection pools and monitoring threads, must not be used there.
+    """
+    global statistics, lock
+    clients.clear()
+    statistics = PoolStatistics()
+    lock = threading.Lock()
+
+# MongoClient is not fork-safe, hence every forked worker process (e.g., of a prefork server) starts without clients
+os.register_at_fork(after_in_child=resetClients)
+
+def getPoolStatistics():
+    """Obtain the usage statistics of the connection pools of all shared clients (see PoolStatistics.snapshot).
+
+    returns:
+        statistics -- dict mapping each server address to its pool counters
+    """
+    return statistics.snapshot()
@@ -0,0 +1,143 @@
+import zlib
+
+from flask import request
+
+from src.util.config import getConfig
+
+# optional codecs, which are offered if their packages are installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# media types of the responses worth compressing
+COMPRESSIBLE = ('application/json', 'application/x-ndjson', 'text/')
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        # wbits 31 produces the gzip format (with a header without timestamp, such that the output is deterministic)
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+class BrotliCompressor:
+    def __init__(self, level: int):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+class ZstdCompressor:
+    def __init__(self, level: int):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressor.flush()
+
+# the codecs in the order of preference (the faster ones first) with their configuration key and default level
+CODECS = [
+    ('zstd', ZstdCompressor, 'COMPRESSION_ZSTD_LEVEL', 3),
+    ('br', BrotliCompressor, 'COMPRESSION_BROTLI_LEVEL', 4),
+    ('gzip', GzipCompressor, 'COMPRESSION_GZIP_LEVEL', 6)
+]
+
+def getCodecs():
+    """Obtain the codecs which are available in this installation (gzip always, zstd and brotli only if the zstandard and brotli packages are installed).
+
+    returns:
+        codecs -- list of (encoding, compressor class, configuration key of the level, default level) tuples in the order of preference
+    """
+    available = {'zstd': zstandard is not None, 'br': brotli is not None, 'gzip': True}
+    return [codec for codec in CODECS if available[codec[0]]]
+
+def negotiate(accept_encodings):
+    """Select the codec for a request: the available codec with the highest quality in the Accept-Encoding header of the request, where ties are broken by the order of preference.
+
+    parameters:
+        accept_encodings -- the parsed Accept-Encoding header (werkzeug.datastructures.Accept)
+
+    returns:
+        codec -- the selected codec tuple (see getCodecs)
+        None -- if the client accepts none of the codecs
+    """
+    codecs = [codec for codec in getCodecs() if accept_encodings.quality(codec[0]) > 0]
+    if not codecs:
+        return None
+    return max(codecs, key=lambda codec: accept_encodings.quality(codec[0]))
+
+def compress(response):
+    """Compress the body of a response with the codec negotiated via the Accept-Encoding header of the request (to be registered via app.after_request). Only successful responses of a compressible media type are compressed, and, unless they are streamed, only if their body exceeds the configured minimum size (COMPRESSION_MIN_SIZE bytes, default 1024). A streamed body is compressed chunk by chunk, where every chunk is flushed, such that the client receives every chunk (e.g., every line of NDJSON) right away. The levels of the codecs are configured via COMPRESSION_GZIP_LEVEL (1-9), COMPRESSION_BROTLI_LEVEL (0-11) and COMPRESSION_ZSTD_LEVEL (1-22), and compression can be disabled via COMPRESSION=false.
+
+    parameters:
+        response -- the flask Response
+
+    returns:
+        response -- the (compressed) response
+    """
+    config = getConfig()
+    if config.get('COMPRESSION', 'true').lower() != 'true':
+        return response
+    if response.status_code < 200 or response.status_code in (204, 206, 304) or request.method == 'HEAD':
+        return response
+    if 'Content-Encoding' in response.headers or response.direct_passthrough:
+        return response
+    if not (response.mimetype or '').startswith(COMPRESSIBLE):
+        return response
+
+    # the body depends on the Accept-Encoding header of the request, also for the responses which are not compressed
+    response.vary.add('Accept-Encoding')
+
+    codec = negotiate(request.accept_encodings)
+    if codec is None:
+        return response
+    encoding, compressor, key, level = codec
+    level = int(config.get(key, level))
+
+    if response.is_streamed:
+        response.response = stream(response.response, compressor(level))
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < int(config.get('COMPRESSION_MIN_SIZE', 1024)):
+            return response
+        codec = compressor(level)
+        response.set_data(codec.compress(data) + codec.finish())
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def stream(chunks, codec):
+    """Compress the chunks of a streamed body one by one, flushing the compressor after each chunk."""
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = codec.compress(chunk) + codec.flush()
+            if data:
+                yield data
+        yield codec.finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
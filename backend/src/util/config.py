@@ -0,0 +1,23 @@
+import os
+
+from dotenv import dotenv_values
+
+config = {}
+def getConfig():
+    """Obtain the configuration of the server. The purpose of the realization using the singleton pattern is to read the .env file only once per process: its values are loaded on the first call and overridden by the environment variables (which can be set, e.g., by the docker-compose file).
+
+    returns:
+        config -- dict mapping configuration keys (like MONGO_URL) to their string values
+    """
+    if not config:
+        config.update({key: value for key, value in dotenv_values('.env').items() if value is not None})
+        config.update(os.environ)
+    return config
+
+def updateConfig(values: dict):
+    """Override configuration values, e.g., when creating an app for testing purposes.
+
+    parameters:
+        values -- dict mapping configuration keys to their new values
+    """
+    getConfig().update(values)
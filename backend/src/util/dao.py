@@ -1,49 +1,123 @@
 # coding=utf-8
+import contextvars
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-import pymongo
-from dotenv import dotenv_values
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
 
 # create a data access object
-from src.util.validators import getValidator
+from src.util.validators import getValidator, ensureValidator
+from src.util.clients import getClient
+from src.util.memory import getMemoryDatabase
+from src.util.config import getConfig
+from src.util.bsonjson import to_json
+from src.util.cache import DocumentCache
+from src.util.indexes import getIndexes, ensureIndexes, reportIndexes
+from src.util.metrics import instrument
 
-import json
-from bson import json_util
 from bson.objectid import ObjectId
 
 
+# names of the collections which are known to exist (with their validator) in the database
+ensured = set()
+lock = threading.Lock()
+
+# executor running the chunks of large lookups by id concurrently (see DAO.find_by_ids)
+executor = None
+
+def getChunkExecutor():
+    """Obtain the executor of the chunked lookups, which is created on first use. Its number of threads is set by the configuration value DAO_CHUNK_THREADS (default 4). It is separate from the executor of the asynchronous data access objects, whose threads may themselves wait for chunks.
+
+    returns:
+        executor -- the shared concurrent.futures.ThreadPoolExecutor
+    """
+    global executor
+    with lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=int(getConfig().get('DAO_CHUNK_THREADS', 4)), thread_name_prefix='daochunks')
+        return executor
+
+def resetLock():
+    """Replace the lock in a forked child process, as it may have been held by another thread of the parent process, and forget the executor, whose threads only exist in the parent process."""
+    global lock, executor
+    lock = threading.Lock()
+    executor = None
+
+os.register_at_fork(after_in_child=resetLock)
+
 class DAO:
 
-    def __init__(self, collection_name: str):
-        """Establish a data access object to a collection of the given name in the MongoDB database as specified in the environment variables. When the collection is first creted, it will be associated to a validator (see https://www.mongodb.com/docs/manual/core/schema-validation/) to ensure some basic data compliance.
+    def __init__(self, collection_name: str, cache: DocumentCache = None, engine: str = 'mongo'):
+        """Establish a data access object to a collection of the given name in the MongoDB database as specified in the configuration (see src.util.config). The connection is only established on the first access to the collection, such that creating a data access object is cheap and does not block the startup of the server. When the collection is first creted, it will be associated to a validator (see https://www.mongodb.com/docs/manual/core/schema-validation/) to ensure some basic data compliance.
 
         parameters:
             collection_name -- the name of the collection (a collection validator of the same name must be available)
+            cache -- optional read-through cache of the documents found via findOne, which is invalidated by the writes of this data access object (see update, delete, delete_many, bulk_write and drop)
+            engine -- the storage engine, either 'mongo' (the MongoDB database) or 'memory' (an in-process database, see src.util.memory)
         """
+        self.collection_name = collection_name
+        self.cache = cache
+        self.engine = engine
+        self._collection = None
+        self._pid = None
+
+    @property
+    def collection(self):
+        """The pymongo collection associated to this data access object. It is (re-)connected lazily on first use in every process, since MongoDB clients must not be shared across forked worker processes.
+        """
+        if self._collection is None or self._pid != os.getpid():
+            with lock:
+                if self._collection is None or self._pid != os.getpid():
+                    self._collection = self.connect()
+                    self._pid = os.getpid()
+        return self._collection
 
-        # load the local mongo URL (something like mongodb://localhost:27017)
-        LOCAL_MONGO_URL = dotenv_values('.env').get('MONGO_URL')
-        # check out of the environment (which can be overridden by the docker-compose file) also specifies an URL, and use that instead if it exists
-        MONGO_URL = os.environ.get('MONGO_URL', LOCAL_MONGO_URL)
-
-        # connect to the MongoDB and select the appropriate database
-        print(
-            f'Connecting to collection {collection_name} on MongoDB at url {MONGO_URL}')
-        client = pymongo.MongoClient(MONGO_URL)
-        database = client.edutask
-
-        # create the collection if it does not yet exist
-        if collection_name not in database.list_collection_names():
-            validator = getValidator(collection_name)
-            database.create_collection(collection_name, validator=validator)
+    @collection.setter
+    def collection(self, collection):
+        self._collection = collection
+        self._pid = os.getpid()
 
-        self.collection = database[collection_name]
+    def connect(self):
+        """Connect to the collection of this data access object and create it if it does not yet exist.
 
-    def create(self, data: dict):
+        returns:
+            collection -- the pymongo collection (or MemoryCollection)
+        """
+        if self.engine == 'memory':
+            # the in-memory database is shared by all data access objects of the process
+            database = getMemoryDatabase('edutask')
+        else:
+            # load the mongo URL (something like mongodb://localhost:27017), which can be overridden by the environment
+            MONGO_URL = getConfig().get('MONGO_URL')
+
+            # connect to the MongoDB (sharing one pooled client among all data access objects) and select the appropriate database
+            print(
+                f'Connecting to collection {self.collection_name} on MongoDB at url {MONGO_URL}')
+            client = getClient(MONGO_URL)
+            database = client.edutask
+
+        # create the collection if it does not yet exist and reconcile its declared validator and indexes
+        if self.collection_name not in ensured:
+            validator = getValidator(self.collection_name)
+            if self.collection_name not in database.list_collection_names():
+                database.create_collection(self.collection_name, validator=validator)
+            else:
+                ensureValidator(database, self.collection_name, validator)
+            ensureIndexes(database[self.collection_name], getIndexes(self.collection_name))
+            ensured.add(self.collection_name)
+
+        return database[self.collection_name]
+
+    @instrument
+    def create(self, data: dict, read_back: bool = False, session=None):
         """Creates a new document in the collection associated to this data access object. The creation of a new document must comply to the corresponding validator, which defines the data structure of the collection. In particular, the validator has to make sure that: (1) the data for the new object contains all required properties, (2) every property complies to the bson data type constraint (see https://www.mongodb.com/docs/manual/reference/bson-types/, though we currently only consider Strings and Booleans), (3) and the values of a property flagged with 'uniqueItems' are unique among all documents of the collection.
 
         parameters:
             data -- a dict containing key-value pairs compliant to the validator
+            read_back -- if True, fetch the created object from the database instead of building it from the inserted data (costs an additional round trip)
+            session -- optional client session (see start_session) in which the operation is executed
 
         returns:
             object -- the newly created MongoDB document (parsed to a JSON object) containing the input data and an _id attribute
@@ -54,21 +128,67 @@ class DAO:
         localdata = dict(data)
 
         try:
-            # insert the object into the database
-            inserted_id = self.collection.insert_one(localdata).inserted_id
-
-            # fetch and return the created object
-            obj = self.collection.find_one({'_id': inserted_id})
-            return self.to_json(obj)
+            # insert the object into the database (this also assigns the _id to the local data)
+            inserted_id = self.collection.insert_one(localdata, session=session).inserted_id
+
+            if read_back:
+                # fetch and return the created object
+                obj = self.collection.find_one({'_id': inserted_id}, session=session)
+                return self.to_json(obj)
+            return self.to_json(localdata)
         except Exception as e:
             # forward any pymongo.errors.WriteError that occurs during insert_one
             raise
 
-    def findOne(self, id: str):
+    @instrument
+    def create_many(self, data: list, ordered: bool = False, chunk_size: int = 1000, session=None):
+        """Creates several new documents in the collection associated to this data access object, sending them in chunks of insert_many operations. Every document must comply to the validator of the collection (see create), but documents violating it do not abort the whole batch: their failures are reported per document instead.
+
+        parameters:
+            data -- a list of dicts containing key-value pairs compliant to the validator
+            ordered -- if True, documents are inserted in the given order and the insertion stops at the first failing document (all subsequent documents are neither inserted nor reported as failed), otherwise all valid documents are inserted
+            chunk_size -- maximum number of documents sent to the database in one insert_many operation
+            session -- optional client session (see start_session) in which the operation is executed
+
+        returns:
+            result -- dict containing the list of newly created documents (parsed to JSON objects) under the key 'inserted' and a list of failures under the key 'errors', where each failure contains the 'index' of the document in data, the error 'code' and the error message 'errmsg'
+
+        raises:
+            Exception -- in case any database operation fails for another reason than a write error
+        """
+        localdata = [dict(document) for document in data]
+        result = {'inserted': [], 'errors': []}
+
+        for start in range(0, len(localdata), chunk_size):
+            chunk = localdata[start:start + chunk_size]
+            failed = set()
+            try:
+                # insert_many assigns the _id to each document of the chunk before sending it
+                self.collection.insert_many(chunk, ordered=ordered, session=session)
+            except BulkWriteError as e:
+                if not e.details.get('writeErrors'):
+                    # e.g., write concern errors are not attributable to single documents
+                    raise
+                for error in e.details['writeErrors']:
+                    failed.add(error['index'])
+                    result['errors'].append({'index': start + error['index'], 'code': error['code'], 'errmsg': error['errmsg']})
+                if ordered:
+                    # the first failing document aborted the remainder of the chunk and all subsequent chunks
+                    result['inserted'] += [self.to_json(document) for document in chunk[:min(failed)]]
+                    return result
+
+            result['inserted'] += [self.to_json(document) for index, document in enumerate(chunk) if index not in failed]
+
+        return result
+
+    @instrument
+    def findOne(self, id: str, session=None, cached: bool = True):
         """Find one specific object in the collection with the _id property equal to the given id.
 
         parameters: 
             id -- id value of the requested object
+            session -- optional client session (see start_session) in which the operation is executed
+            cached -- if False, the object is read from the database even if it is cached (and the fresh object is cached)
 
         returns:
             object -- MongoDB document (parsed to json object)
@@ -76,23 +196,141 @@ class DAO:
         raises:
             Exception -- in case any database operation fails
         """
+        # reads within a session must observe the state of the session and hence bypass the cache
+        cache = self.cache if session is None else None
+        if cache is not None:
+            if cached:
+                hit = cache.get(str(id))
+                if hit is not None:
+                    return hit
+            generation = cache.generation
+
         try:
-            obj = self.collection.find_one({'_id': ObjectId(id)})
+            obj = self.collection.find_one({'_id': ObjectId(id)}, session=session)
+            result = self.to_json(obj)
+            if cache is not None and result is not None:
+                cache.put(str(id), result, generation=generation)
+            return result
+        except Exception as e:
+            raise
+
+    @instrument
+    def find_one_by(self, filter: dict, projection: dict = None, session=None):
+        """Find the first object in the collection which complies to the given filter. Filtering by indexed properties (see src/static/indexes) avoids scanning the whole collection.
+
+        parameters:
+            filter -- dict containing key value pairs of properties and applicable filters
+            projection -- optional dict specifying the properties to include (or exclude) in the returned object
+            session -- optional client session (see start_session) in which the operation is executed
+
+        returns:
+            object -- MongoDB document (parsed to json object)
+            None -- if no object complies to the filter
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        try:
+            obj = self.collection.find_one(filter, projection, session=session)
             return self.to_json(obj)
         except Exception as e:
             raise
 
+    @instrument
+    def find_by_ids(self, ids: list, projection: dict = None, pipeline: list = None, chunk_size: int = 500, session=None):
+        """Find the objects with the given ids. Instead of one unbounded $in list, the ids are looked up in chunks, which are sent concurrently (unless within a session, whose operations must not run concurrently). Objects found in the cache of this data access object are not looked up at all.
+
+        parameters:
+            ids -- list of id values (strings or ObjectIds) of the requested objects
+            projection -- optional dict specifying the properties to include (or exclude) in the returned objects
+            pipeline -- optional aggregation pipeline stages applied to the objects of every chunk (e.g., to populate them), which replaces the projection and bypasses the cache
+            chunk_size -- maximum number of ids per lookup
+            session -- optional client session (see start_session) in which the operations are executed
+
+        returns:
+            result -- dict containing the found objects (parsed to json objects) in the order of the given ids under the key 'found' and the ids without an object under the key 'missing'
+
+        raises:
+            bson.errors.InvalidId -- in case one of the ids is not a valid ObjectId
+            Exception -- in case any database operation fails
+        """
+        ids = [ObjectId(id) for id in ids]
+        objects = {}
+
+        cache = self.cache if session is None and projection is None and pipeline is None else None
+        generation = None
+        if cache is not None:
+            generation = cache.generation
+            for id in ids:
+                cached = cache.get(str(id))
+                if cached is not None:
+                    objects[id] = cached
+
+        def lookup(chunk):
+            if pipeline is not None:
+                return list(self.collection.aggregate([{'$match': {'_id': {'$in': chunk}}}] + pipeline, session=session))
+            return list(self.collection.find({'_id': {'$in': chunk}}, projection, session=session))
+
+        remaining = [id for id in dict.fromkeys(ids) if id not in objects]
+        chunks = [remaining[i:i + chunk_size] for i in range(0, len(remaining), chunk_size)]
+        try:
+            if len(chunks) > 1 and session is None:
+                # every chunk runs in its own copy of the context of the caller (see src.util.querytracker)
+                futures = [getChunkExecutor().submit(contextvars.copy_context().run, lookup, chunk) for chunk in chunks]
+                results = [future.result() for future in futures]
+            else:
+                results = [lookup(chunk) for chunk in chunks]
+
+            for dbobjs in results:
+                for obj in dbobjs:
+                    objects[obj['_id']] = result = self.to_json(obj)
+                    if cache is not None:
+                        cache.put(str(obj['_id']), result, generation=generation)
+        except Exception as e:
+            raise
+
+        return {
+            'found': [objects[id] for id in ids if id in objects],
+            'missing': [str(id) for id in dict.fromkeys(ids) if id not in objects]
+        }
+
     # find all objects that comply to the optional filter
-    def find(self, filter=None, toid: list = None):
+    @instrument
+    def find(self, filter=None, toid: list = None, projection: dict = None, session=None):
         """Find all objects contained in the collection which comply to the given filter. 
 
         parameters: 
             filter -- dict containing key value pairs of properties and applicable filters
             toid -- list of properties (contained in the filter) which are MongoDB ObjectIDs and hence need to be converted
+            projection -- optional dict specifying the properties to include (or exclude) in the returned objects
+            session -- optional client session (see start_session) in which the operation is executed
 
         returns:
             [object] -- list of objects compliant to the given filter
 
+        raises:
+            Exception -- in case any database operation fails
+        """
+        try:
+            return list(self.iter_find(filter=filter, toid=toid, projection=projection, session=session))
+        except Exception as e:
+            raise
+
+    @instrument
+    def iter_find(self, filter=None, toid: list = None, projection: dict = None, sort: list = None, limit: int = 0, session=None):
+        """Find all objects contained in the collection which comply to the given filter (see find), but yield them one by one as they arrive from the database cursor instead of collecting them in a list first. This keeps the memory consumption constant for large results.
+
+        parameters: 
+            filter -- dict containing key value pairs of properties and applicable filters
+            toid -- list of properties (contained in the filter) which are MongoDB ObjectIDs and hence need to be converted
+            projection -- optional dict specifying the properties to include (or exclude) in the returned objects
+            sort -- optional list of (key, direction) pairs specifying the order of the objects
+            limit -- maximum number of objects (0 means no limit)
+            session -- optional client session (see start_session) in which the operation is executed
+
+        returns:
+            generator -- yielding the objects compliant to the given filter (parsed to json objects)
+
         raises:
             Exception -- in case any database operation fails
         """
@@ -106,9 +344,30 @@ class DAO:
                     converted.append(conv)
                 filter[i] = {'$in': converted}
 
+        try:
+            dbobjs = self.collection.find(filter, projection, sort=sort, limit=limit, session=session)
+
+            for obj in dbobjs:
+                yield self.to_json(obj)
+        except Exception as e:
+            raise
+
+    @instrument
+    def aggregate(self, pipeline: list):
+        """Run an aggregation pipeline (see https://www.mongodb.com/docs/manual/core/aggregation-pipeline/) on the collection associated to this data access object. This allows to resolve references into other collections (via $lookup) within a single round trip to the database.
+
+        parameters:
+            pipeline -- list of aggregation pipeline stages
+
+        returns:
+            [object] -- list of resulting documents (parsed to json objects)
+
+        raises:
+            Exception -- in case any database operation fails
+        """
         objs = []
         try:
-            dbobjs = self.collection.find(filter)
+            dbobjs = self.collection.aggregate(pipeline)
 
             for obj in dbobjs:
                 objs.append(self.to_json(obj))
@@ -117,34 +376,89 @@ class DAO:
         except Exception as e:
             raise
 
-    def update(self, id: str, update_data: dict):
+    @instrument
+    def update(self, id: str, update_data: dict, session=None, return_document: bool = False, projection: dict = None):
         """Find one specific object in the collection with the _id property equal to the given id and update its data according to the update_data.
 
         parameters: 
             id -- id value of the requested object
             update_data -- dict containing the update operation (top-level key values must be valid MongoDB update operators, see https://www.mongodb.com/docs/manual/reference/operator/update/#std-label-update-operators)
+            session -- optional client session (see start_session) in which the operation is executed
+            return_document -- if True, return the updated object, which is obtained atomically with the update in the same round trip (via find_one_and_update)
+            projection -- optional dict specifying the properties of the returned object to include (or exclude), if return_document is True
 
         returns:
             True -- if the update was successful
             False -- otherwise
+            object -- the updated object (parsed to a json object) if return_document is True
+            None -- if return_document is True and no object is associated to the given id
 
         raises:
             Exception -- in case any database operation fails
         """
         try:
+            if return_document:
+                obj = self.collection.find_one_and_update(
+                    {'_id': ObjectId(id)},
+                    update_data,
+                    projection=projection,
+                    return_document=ReturnDocument.AFTER,
+                    session=session
+                )
+                self.invalidate([id])
+                return self.to_json(obj)
+
             update_result = self.collection.update_one(
                 {'_id': ObjectId(id)},
-                update_data
+                update_data,
+                session=session
             )
+            self.invalidate([id])
             return update_result.acknowledged
         except Exception as e:
             raise
 
-    def delete(self, id: str):
+    @instrument
+    def update_by(self, filter: dict, update_data: dict, session=None, return_document: bool = False, projection: dict = None):
+        """Update the first object in the collection which complies to the given filter, e.g., the object containing an embedded document with a given _id, which the positional operator $ in the update_data then refers to (see https://www.mongodb.com/docs/manual/reference/operator/update/positional/).
+
+        parameters:
+            filter -- dict containing key value pairs of properties and applicable filters
+            update_data -- dict containing the update operation (see update)
+            session -- optional client session (see start_session) in which the operation is executed
+            return_document -- if True, return the updated object, which is obtained atomically with the update in the same round trip (via find_one_and_update)
+            projection -- optional dict specifying the properties of the returned object to include (or exclude), if return_document is True
+
+        returns:
+            n -- the number of matched objects (0 or 1)
+            object -- the updated object (parsed to a json object) if return_document is True
+            None -- if return_document is True and no object complies to the filter
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        try:
+            if return_document:
+                obj = self.collection.find_one_and_update(filter, update_data, projection=projection, return_document=ReturnDocument.AFTER, session=session)
+                if obj is not None:
+                    self.invalidate([obj['_id']])
+                return self.to_json(obj)
+
+            update_result = self.collection.update_one(filter, update_data, session=session)
+            # the updated object is not known in general
+            if self.cache is not None:
+                self.cache.clear()
+            return update_result.matched_count
+        except Exception as e:
+            raise
+
+    @instrument
+    def delete(self, id: str, session=None):
         """Find one specific object in the collection with the _id property equal to the given id and remove it from the collection
 
         parameters: 
             id -- id value of the requested object
+            session -- optional client session (see start_session) in which the operation is executed
 
         returns:
             True -- if the deletion was successful
@@ -155,12 +469,73 @@ class DAO:
         """
         try:
             result = self.collection.delete_one(
-                {'_id': ObjectId(id)}
+                {'_id': ObjectId(id)},
+                session=session
             )
+            self.invalidate([id])
             return result.acknowledged
         except Exception as e:
             raise
 
+    @instrument
+    def delete_many(self, ids: list, session=None):
+        """Remove all objects with an _id property contained in the given list of ids from the collection in one single operation.
+
+        parameters:
+            ids -- list of id values (strings or ObjectIds) of the objects to remove
+            session -- optional client session (see start_session) in which the operation is executed
+
+        returns:
+            n -- the number of removed objects
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        if not ids:
+            return 0
+
+        try:
+            result = self.collection.delete_many(
+                {'_id': {'$in': [ObjectId(id) for id in ids]}},
+                session=session
+            )
+            self.invalidate(ids)
+            return result.deleted_count
+        except Exception as e:
+            raise
+
+    @instrument
+    def bulk_write(self, requests: list, ordered: bool = True, session=None):
+        """Send a list of write operations (see https://pymongo.readthedocs.io/en/stable/api/pymongo/collection.html#pymongo.collection.Collection.bulk_write, e.g., pymongo.UpdateOne) to the collection in one single round trip.
+
+        parameters:
+            requests -- list of pymongo write operations
+            ordered -- if True, the operations are executed in the given order and the execution stops at the first failing operation
+            session -- optional client session (see start_session) in which the operation is executed
+
+        returns:
+            result -- the pymongo.results.BulkWriteResult of the operations
+
+        raises:
+            BulkWriteError -- in case at least one of the write operations fails
+        """
+        try:
+            return self.collection.bulk_write(requests, ordered=ordered, session=session)
+        except Exception as e:
+            raise
+        finally:
+            # the affected documents are not known in general
+            if self.cache is not None:
+                self.cache.clear()
+
+    def start_session(self):
+        """Start a client session on the database of this data access object, e.g., to execute several operations on multiple collections in one transaction (see https://www.mongodb.com/docs/manual/core/transactions/). Note that transactions require a replica set or a sharded cluster.
+
+        returns:
+            session -- a pymongo.client_session.ClientSession, which should be used as a context manager
+        """
+        return self.collection.database.client.start_session()
+
     def drop(self):
         """Remove the entire collection
 
@@ -169,9 +544,38 @@ class DAO:
         """
         try:
             self.collection.drop()
+            ensured.discard(self.collection_name)
+            # reconnect on the next access, which recreates the collection with its validator and indexes
+            self._collection = None
+            if self.cache is not None:
+                self.cache.clear()
+        except Exception as e:
+            raise
+
+    def report_indexes(self):
+        """Compare the indexes of the collection to its index declarations and their usage (see src.util.indexes.reportIndexes).
+
+        returns:
+            report -- dict containing the 'missing', 'undeclared' and 'unused' indexes as well as the 'accesses' of every index
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        try:
+            return reportIndexes(self.collection, getIndexes(self.collection_name))
         except Exception as e:
             raise
 
+    def invalidate(self, ids: list):
+        """Remove the objects with the given ids from the cache of this data access object (if any).
+
+        parameters:
+            ids -- list of id values (strings or ObjectIds) of the modified objects
+        """
+        if self.cache is not None:
+            for id in ids:
+                self.cache.invalidate(str(id))
+
     def to_json(self, data):
         """Transform a MongoDB document into a json object.
 
@@ -181,4 +585,4 @@ class DAO:
         returns:
             dict -- the document converted to JSON
         """
-        return json.loads(json_util.dumps(data))
+        return to_json(data)
@@ -1,9 +1,13 @@
 from src.util.dao import DAO
+from src.util.asyncdao import AsyncDAO
+from src.util.cache import getCache
+from src.util.config import getConfig
 
 daos = {}
 def getDao(collection_name: str):
     """Obtain a data access object of a collection. The purpose of the realization using the singleton pattern is
-    to avoid multiple data access objects for the same collection
+    to avoid multiple data access objects for the same collection. The storage engine of all data access objects is
+    selected by the configuration value STORAGE_ENGINE, which is either mongo (default) or memory
 
     parameters:
         collection_name -- the name of the collection
@@ -12,5 +16,19 @@ def getDao(collection_name: str):
         validator -- DAO to the given collection
     """
     if collection_name not in daos:
-        daos[collection_name] = DAO(collection_name=collection_name)
-    return daos[collection_name]
\ No newline at end of file
+        daos[collection_name] = DAO(collection_name=collection_name, cache=getCache(collection_name), engine=getConfig().get('STORAGE_ENGINE', 'mongo'))
+    return daos[collection_name]
+asyncdaos = {}
+def getAsyncDao(collection_name: str):
+    """Obtain an asynchronous data access object of a collection (see src.util.asyncdao), which wraps the data access
+    object of the same collection (see getDao)
+
+    parameters:
+        collection_name -- the name of the collection
+
+    returns:
+        dao -- AsyncDAO to the given collection
+    """
+    if collection_name not in asyncdaos:
+        asyncdaos[collection_name] = AsyncDAO(getDao(collection_name))
+    return asyncdaos[collection_name]
@@ -0,0 +1,313 @@
+import argparse
+import copy
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, UpdateOne, ReplaceOne, DeleteOne, DeleteMany
+
+from src.util.bsonjson import to_json, from_json
+from src.util.dao import DAO
+from src.util.daos import getDao
+from src.util.versions import Versions, getVersions
+
+class Dashboards:
+    def __init__(self, dao: DAO, users_dao: DAO, tasks, versions: Versions):
+        """Materialized dashboards of the users: one document per user (with the id of the user) in the dashboard collection, which contains the user, its populated tasks and the number of done and total todos per task and overall. A dashboard is built on its first read and afterwards updated incrementally by the controllers which create tasks and todos, update users and todos, delete todos or delete the tasks of a user, such that reading it takes one query. Other modifications (e.g., of a task or of todos in a batch) remove the dashboard, which is then rebuilt on its next read. The stored document keys the tasks and todos by their ids, such that a todo can be modified via dotted paths (e.g., $inc of tasks.<taskid>.done):
+            user -- the user object (without the task ids)
+            tasks -- dict mapping the id of each task to the task object, where todos is a dict mapping the id of each todo to the todo object, and done and total count its todos
+            taskids, todoids -- the ids of the tasks and todos (indexed, to find the dashboard of a modified task or todo)
+            todos -- dict mapping the id of each todo to the id of its task
+            done, total -- the number of done and of all todos of the user
+            built -- a unique token of the build which stored the dashboard (see store)
+
+        parameters:
+            dao -- data access object of the dashboard collection
+            users_dao -- data access object of the user collection
+            tasks -- TaskController which reads the populated tasks of a user to build a dashboard
+            versions -- the version counters (see src.util.versions), which the controllers increment before they update the dashboards, to detect modifications during a build
+        """
+        self.dao = dao
+        self.users_dao = users_dao
+        self.tasks = tasks
+        self.versions = versions
+
+    def get(self, userid: str):
+        """Obtain the dashboard of a user, which is built and stored if it does not exist yet.
+
+        parameters:
+            userid -- the unique identifier of the user
+
+        returns:
+            dashboard -- dict containing the user, the list of its populated tasks (each with its done and total count of todos) and the overall done and total count
+            None -- if no user is associated to the given id
+
+        raises:
+            bson.errors.InvalidId -- in case the id is not valid
+            Exception -- in case any database operation fails
+        """
+        try:
+            view = self.dao.find_one_by({'_id': ObjectId(userid)})
+            if view is None:
+                keys = version_keys(userid)
+                before = self.versions.get(keys)
+                view = self.build(userid)
+                if view is None:
+                    return None
+                self.store(userid, view, keys, before, replace=False)
+            return serve(view)
+        except Exception as e:
+            raise
+
+    def build(self, userid: str):
+        """Build the dashboard document of a user from the user and task collections (without storing it).
+
+        returns:
+            view -- the dashboard document (as json)
+            None -- if no user is associated to the given id
+        """
+        user = self.users_dao.findOne(userid)
+        if user is None:
+            return None
+        user = {key: value for key, value in user.items() if key != 'tasks'}
+        view = {'_id': user['_id'], 'user': user, 'tasks': {}, 'taskids': [], 'todoids': [], 'todos': {}, 'done': 0, 'total': 0}
+        for task in self.tasks.get_tasks_of_user(userid):
+            entry = summarize(task)
+            view['tasks'][task['_id']['$oid']] = entry
+            view['taskids'].append(task['_id'])
+            for todoid in entry['todos']:
+                view['todoids'].append({'$oid': todoid})
+                view['todos'][todoid] = task['_id']['$oid']
+            view['done'] += entry['done']
+            view['total'] += entry['total']
+        return view
+
+    def add_tasks(self, tasks: list, session=None):
+        """Add new tasks to the dashboards of their users (in one round trip).
+
+        parameters:
+            tasks -- list of (userid, task) tuples, where each task is a populated task document (with the ids of the task, its video and its todos)
+            session -- optional client session (see DAO.start_session) in which the operation is executed
+        """
+        requests = {}
+        for userid, task in tasks:
+            entry = summarize(to_json(task))
+            taskid = str(task['_id'])
+            update = requests.setdefault(str(userid), {'$set': {}, '$addToSet': {'taskids': {'$each': []}, 'todoids': {'$each': []}}, '$inc': {'done': 0, 'total': 0}})
+            update['$set'][f'tasks.{taskid}'] = from_json(entry)
+            update['$addToSet']['taskids']['$each'].append(ObjectId(taskid))
+            for todoid in entry['todos']:
+                update['$set'][f'todos.{todoid}'] = taskid
+                update['$addToSet']['todoids']['$each'].append(ObjectId(todoid))
+            update['$inc']['done'] += entry['done']
+            update['$inc']['total'] += entry['total']
+        if requests:
+            # only existing dashboards which do not contain the tasks yet (see store) are updated, the others are built on their first read
+            self.dao.bulk_write([UpdateOne({'_id': ObjectId(userid), 'taskids': {'$nin': update['$addToSet']['taskids']['$each']}}, update)
+                for userid, update in requests.items()], ordered=False, session=session)
+
+    def update_user(self, userid: str, data: dict):
+        """Set the modified properties of a user in its dashboard.
+
+        parameters:
+            userid -- the unique identifier of the user
+            data -- dict of the new values of the modified properties
+        """
+        update = {f'user.{key}': value for key, value in data.items() if key not in ('_id', 'tasks')}
+        if update:
+            self.dao.update(userid, {'$set': update})
+
+    def add_todo(self, taskid: str, todo: dict):
+        """Add a new todo to the dashboard containing its task.
+
+        parameters:
+            taskid -- the unique identifier of the task
+            todo -- the new todo object (json)
+        """
+        todoid = todo['_id']['$oid']
+        done = 1 if todo.get('done') else 0
+        self.dao.update_by({'taskids': ObjectId(taskid), 'todoids': {'$ne': ObjectId(todoid)}}, {
+            '$set': {f'tasks.{taskid}.todos.{todoid}': from_json(entry(todo)), f'todos.{todoid}': str(taskid)},
+            '$addToSet': {'todoids': ObjectId(todoid)},
+            '$inc': {f'tasks.{taskid}.done': done, f'tasks.{taskid}.total': 1, 'done': done, 'total': 1}
+        })
+
+    def update_todo(self, todo: dict):
+        """Replace a modified todo in the dashboard containing it. The done counts are only changed by a conditional update which applies if the todo was not stored with the same done state, such that concurrent updates of the same todo keep the counts consistent.
+
+        parameters:
+            todo -- the updated todo object (json)
+        """
+        todoid = todo['_id']['$oid']
+        located = self._locate(todoid)
+        if located is None:
+            return
+        id, taskid = located
+        path = f'tasks.{taskid}.todos.{todoid}'
+        requests = []
+        if 'done' in todo:
+            done = bool(todo['done'])
+            change = 1 if done else -1
+            # a todo without a done flag counts as not done, hence only a todo stored as done is counted down
+            requests.append(UpdateOne({'_id': id, 'todoids': ObjectId(todoid), f'{path}.done': {'$ne': True} if done else True},
+                {'$set': {f'{path}.done': done}, '$inc': {f'tasks.{taskid}.done': change, 'done': change}}))
+        requests.append(UpdateOne({'_id': id, 'todoids': ObjectId(todoid)}, {'$set': {path: from_json(entry(todo))}}))
+        self.dao.bulk_write(requests)
+
+    def remove_todo(self, todoid: str):
+        """Remove a deleted todo from the dashboard containing it.
+
+        parameters:
+            todoid -- the unique identifier of the deleted todo
+        """
+        located = self._locate(todoid)
+        if located is None:
+            return
+        id, taskid = located
+        path = f'tasks.{taskid}.todos.{todoid}'
+        self.dao.bulk_write([
+            UpdateOne({'_id': id, f'{path}.done': True}, {'$inc': {f'tasks.{taskid}.done': -1, 'done': -1}, '$set': {f'{path}.done': False}}),
+            UpdateOne({'_id': id, 'todoids': ObjectId(todoid)}, {
+                '$unset': {path: '', f'todos.{todoid}': ''},
+                '$pull': {'todoids': ObjectId(todoid)},
+                '$inc': {f'tasks.{taskid}.total': -1, 'total': -1}
+            })
+        ])
+
+    def clear_tasks(self, userid: str, session=None):
+        """Remove all tasks from the dashboard of a user (after they have been deleted)."""
+        self.dao.update(userid, {'$set': {'tasks': {}, 'taskids': [], 'todoids': [], 'todos': {}, 'done': 0, 'total': 0}}, session=session)
+
+    def invalidate(self, userids: list = None, taskids: list = None, todoids: list = None, session=None):
+        """Remove the dashboards of the given users and of the users owning the given tasks or todos, which are rebuilt on their next read (e.g., after a modification which is not carried over incrementally).
+
+        parameters:
+            userids, taskids, todoids -- lists of id values (strings or ObjectIds)
+            session -- optional client session (see DAO.start_session) in which the operation is executed
+        """
+        conditions = [{field: {'$in': [ObjectId(id) for id in ids]}} for field, ids in [('_id', userids), ('taskids', taskids), ('todoids', todoids)] if ids]
+        if conditions:
+            self.dao.bulk_write([DeleteMany({'$or': conditions})], session=session)
+
+    def repair(self, userids: list = None, batch_size: int = 100, report=None):
+        """Compare stored dashboards with freshly built ones and rebuild those which have drifted (e.g., due to a modification between the build and the storage of a dashboard, or a modification the controllers do not carry over). Dashboards of users which do not exist anymore are removed.
+
+        parameters:
+            userids -- optional list of the ids of the users whose dashboards are checked (default: all dashboards)
+            batch_size -- number of dashboards read per query
+            report -- optional function which is called with the id of every repaired or removed dashboard
+
+        returns:
+            counts -- dict containing the number of 'checked', 'repaired' and 'removed' dashboards
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        counts = {'checked': 0, 'repaired': 0, 'removed': 0}
+        after = None
+        try:
+            while True:
+                filter = {'_id': {'$in': [ObjectId(id) for id in userids]}} if userids is not None else {}
+                if after is not None:
+                    filter = {'$and': [filter, {'_id': {'$gt': after}}]}
+                views = list(self.dao.iter_find(filter=filter, sort=[('_id', ASCENDING)], limit=batch_size))
+                if not views:
+                    return counts
+                for view in views:
+                    counts['checked'] += 1
+                    id = view['_id']['$oid']
+                    keys = version_keys(id)
+                    before = self.versions.get(keys)
+                    fresh = self.build(id)
+                    if fresh is None:
+                        self.dao.delete(id)
+                        counts['removed'] += 1
+                    elif serve(fresh) != serve(view):
+                        self.store(id, fresh, keys, before)
+                        counts['repaired'] += 1
+                    else:
+                        continue
+                    if report is not None:
+                        report(id)
+                after = ObjectId(views[-1]['_id']['$oid'])
+        except Exception as e:
+            raise
+
+    def store(self, userid: str, view: dict, keys: list, before: dict, replace: bool = True):
+        """Store a built dashboard, unless the user or its tasks have been modified since the build has started. A modification between the build and the storage could otherwise be missing from the stored dashboard (e.g., as its invalidation has found no dashboard to remove), and the incremental updates would then apply to wrong counts. As the database offers no atomic check across collections, the dashboard is stored first and its versions are read afterwards: if they have changed, the stored dashboard is removed again (only if it is still the one of this build), such that it is rebuilt on its next read. The modifications which reach a stored dashboard although the build already contains them do not change it twice, as the incremental updates are idempotent.
+
+        parameters:
+            userid -- the unique identifier of the user
+            view -- the built dashboard document (as json)
+            keys -- the version keys of the dashboard (see version_keys)
+            before -- the versions of the keys read before the build
+            replace -- if False, an existing dashboard (stored by a concurrent build) is kept
+        """
+        built = ObjectId()
+        document = dict(from_json(view), built=built)
+        if replace:
+            self.dao.bulk_write([ReplaceOne({'_id': ObjectId(userid)}, document, upsert=True)])
+        else:
+            self.dao.bulk_write([UpdateOne({'_id': ObjectId(userid)}, {'$setOnInsert': document}, upsert=True)])
+        if self.versions.get(keys) != before:
+            self.dao.bulk_write([DeleteOne({'_id': ObjectId(userid), 'built': built})])
+
+    def _locate(self, todoid: str):
+        """Find the dashboard containing a todo and the id of its task."""
+        view = self.dao.find_one_by({'todoids': ObjectId(todoid)}, projection={f'todos.{todoid}': 1})
+        if view is None or todoid not in view.get('todos', {}):
+            return None
+        return ObjectId(view['_id']['$oid']), view['todos'][todoid]
+
+def version_keys(userid: str):
+    """The keys of the versions which the modifications of a user or of its tasks increment (see src.util.versions)."""
+    return [f'user:{userid}', f'tasksof:{userid}']
+
+def entry(todo: dict):
+    """The stored form of a (json) todo in a dashboard, which is keyed by its id."""
+    return {key: value for key, value in todo.items() if key != '_id'}
+
+def summarize(task: dict):
+    """Build the stored form of a populated (json) task in a dashboard: the todos are keyed by their ids and counted."""
+    summary = {key: copy.deepcopy(value) for key, value in task.items() if key not in ('_id', 'todos')}
+    todos = task.get('todos') or []
+    summary['todos'] = {todo['_id']['$oid']: entry(todo) for todo in todos}
+    summary['done'] = sum(1 for todo in todos if todo.get('done'))
+    summary['total'] = len(todos)
+    return summary
+
+def serve(view: dict):
+    """Transform a (json) dashboard document into the served dashboard, whose tasks and todos are lists of objects (like the tasks of GET /tasks/ofuser/<id>)."""
+    tasks = []
+    for taskid, task in view.get('tasks', {}).items():
+        task = dict(task, _id={'$oid': taskid})
+        task['todos'] = [dict(todo, _id={'$oid': todoid}) for todoid, todo in task.get('todos', {}).items()]
+        tasks.append(task)
+    return {'user': view['user'], 'tasks': tasks, 'done': view['done'], 'total': view['total']}
+
+dashboards = None
+def getDashboards():
+    """Obtain the dashboards of the app (see Dashboards), which use the data access objects of the dashboard, user, task, video and todo collections (see src.util.daos.getDao).
+
+    returns:
+        dashboards -- Dashboards
+    """
+    global dashboards
+    if dashboards is None:
+        # imported here, as the controllers themselves update the dashboards
+        from src.controllers.taskcontroller import TaskController
+        from src.util.taskstorage import getTaskStorage
+        tasks = TaskController(tasks_dao=getDao(collection_name='task'), videos_dao=getDao(collection_name='video'), todos_dao=getDao(collection_name='todo'),
+            users_dao=getDao(collection_name='user'), embedded=(getTaskStorage() == 'embedded'))
+        dashboards = Dashboards(getDao(collection_name='dashboard'), users_dao=getDao(collection_name='user'), tasks=tasks, versions=getVersions())
+    return dashboards
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild the stored dashboards which differ from the user and task collections')
+    parser.add_argument('--user', action='append', dest='users', help='only check the dashboard of this user (can be repeated)')
+    parser.add_argument('--batch-size', type=int, default=100, help='number of dashboards read per query')
+    args = parser.parse_args()
+
+    counts = getDashboards().repair(userids=args.users, batch_size=args.batch_size, report=lambda id: print(f'repaired {id}'))
+    print(f'checked {counts["checked"]} dashboards: {counts["repaired"]} repaired, {counts["removed"]} removed')
+
+if __name__ == '__main__':
+    main()
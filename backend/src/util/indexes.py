@@ -0,0 +1,101 @@
+import json
+import os
+
+from pymongo.errors import OperationFailure
+
+# options of an index declaration which are passed on to create_index (see https://www.mongodb.com/docs/manual/reference/method/db.collection.createIndex/#options)
+OPTIONS = ['unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression']
+
+indexes = {}
+def getIndexes(collection_name: str):
+    """Obtain the index declarations of a collection, which are stored as a json file with the same name in src/static/indexes (next to the validators). Each declaration contains the name of the index, its keys as a list of [field, type] pairs (where the type is 1 or -1 for ascending or descending, or "text" for a text index) and optionally further options like unique or expireAfterSeconds (for TTL indexes).
+
+    parameters:
+        collection_name -- the name of the collection, which should also be the filename
+
+    returns:
+        declarations -- list of index declarations (empty if the collection declares no indexes)
+    """
+    if collection_name not in indexes:
+        filename = f'./src/static/indexes/{collection_name}.json'
+        if os.path.exists(filename):
+            with open(filename, 'r') as f:
+                indexes[collection_name] = json.load(f)
+        else:
+            indexes[collection_name] = []
+    return indexes[collection_name]
+
+def matches(declaration: dict, information: dict):
+    """Check whether an existing index (as described by index_information) complies to an index declaration.
+
+    parameters:
+        declaration -- the index declaration
+        information -- the description of the existing index of the same name
+
+    returns:
+        True -- if the keys and the options of the existing index are equal to the declared ones
+        False -- otherwise
+    """
+    textfields = [field for field, type in declaration['keys'] if type == 'text']
+    if textfields:
+        # the fields of a text index are only contained in its weights
+        if set(textfields) != set(information.get('weights', {}).keys()):
+            return False
+    elif [tuple(key) for key in declaration['keys']] != [tuple(key) for key in information['key']]:
+        return False
+
+    for option in OPTIONS:
+        if declaration.get(option, False) != information.get(option, False):
+            return False
+    return True
+
+def ensureIndexes(collection, declarations: list):
+    """Create the declared indexes of a collection and reconcile existing indexes of the same name, which differ from their declaration, by recreating them. Indexes which are not declared are never removed.
+
+    parameters:
+        collection -- the pymongo collection
+        declarations -- list of index declarations (see getIndexes)
+
+    returns:
+        result -- dict containing the names of the 'created' and 'recreated' indexes as well as the 'failed' ones (e.g., a unique index on a field with duplicate values) including the error message
+    """
+    result = {'created': [], 'recreated': [], 'failed': []}
+    existing = collection.index_information()
+
+    for declaration in declarations:
+        name = declaration['name']
+        if name in existing and matches(declaration, existing[name]):
+            continue
+
+        try:
+            if name in existing:
+                collection.drop_index(name)
+            options = {option: declaration[option] for option in OPTIONS if option in declaration}
+            collection.create_index([tuple(key) for key in declaration['keys']], name=name, **options)
+            result['recreated' if name in existing else 'created'].append(name)
+        except OperationFailure as e:
+            print(f'Warning: could not create index {name} on collection {collection.name}: {e}')
+            result['failed'].append({'name': name, 'error': str(e)})
+
+    return result
+
+def reportIndexes(collection, declarations: list):
+    """Compare the indexes of a collection to its index declarations and their usage (see https://www.mongodb.com/docs/manual/reference/operator/aggregation/indexStats/).
+
+    parameters:
+        collection -- the pymongo collection
+        declarations -- list of index declarations (see getIndexes)
+
+    returns:
+        report -- dict containing the names of the declared indexes which are 'missing' (or differ from their declaration), the existing indexes which are 'undeclared', and the existing indexes which are 'unused' (i.e., have not been accessed since the server started) together with the number of accesses of every index under 'accesses'
+    """
+    existing = collection.index_information()
+    declared = {declaration['name']: declaration for declaration in declarations}
+    accesses = {stats['name']: stats['accesses']['ops'] for stats in collection.aggregate([{'$indexStats': {}}])}
+
+    return {
+        'missing': [name for name, declaration in declared.items() if name not in existing or not matches(declaration, existing[name])],
+        'undeclared': [name for name in existing if name not in declared and name != '_id_'],
+        'unused': [name for name, ops in accesses.items() if ops == 0],
+        'accesses': accesses
+    }
@@ -0,0 +1,328 @@
+import atexit
+import os
+import queue
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from bson.objectid import ObjectId
+from flask import jsonify, request
+from werkzeug.exceptions import ServiceUnavailable, UnprocessableEntity
+from pymongo import UpdateMany
+from pymongo.errors import DuplicateKeyError
+
+from src.util.bsonjson import from_json
+from src.util.config import getConfig
+from src.util.dao import DAO
+from src.util.daos import getDao
+
+# the states of a job (a job is finished once it has succeeded or failed)
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+
+class JobQueue:
+    def __init__(self, dao: DAO, workers: int = 2, size: int = 100, drain_timeout: float = 30, lease: float = 60):
+        """Queue of background jobs, which run heavy write operations outside of the request thread on a bounded pool of worker threads of this process. Every job is stored in the job collection, such that its status and progress can be polled from any worker process (see GET /jobs/<id>). A job is a call of a registered handler with the parameters stored in its document: handler(progress, **params), where progress(done, total) records the progress of the job and the return value of the handler becomes the result of the job.
+
+        A queued or running job is leased by the process holding it: the process renews the lease of its jobs periodically, such that the jobs of a process which has ended without draining its queue (e.g., as it crashed or has been killed) are recognized by their expired lease and marked as failed (see reap).
+
+        parameters:
+            dao -- data access object of the job collection
+            workers -- number of worker threads
+            size -- maximum number of queued jobs, which have not been started yet (further submissions are rejected)
+            drain_timeout -- seconds to wait for the queued and running jobs when the process shuts down (see drain)
+            lease -- seconds after which a job whose lease has not been renewed is considered abandoned
+        """
+        self.dao = dao
+        self.workers = workers
+        self.size = size
+        self.drain_timeout = drain_timeout
+        self.lease = lease
+        self.handlers = {}
+        self._reset()
+
+    def _reset(self):
+        """Forget the worker threads and the queued jobs (e.g., in a forked child process, where the threads of the parent process do not exist)."""
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=self.size)
+        self.threads = []
+        self.running = set()
+        # the ids of the queued and running jobs of this process, whose leases are renewed
+        self.held = set()
+        self.stopped = threading.Event()
+        self.draining = False
+
+    def register(self, kind: str, handler):
+        """Register the handler of a kind of jobs.
+
+        parameters:
+            kind -- the name of the kind of jobs (e.g., deleteuser)
+            handler -- function called with a progress function and the parameters of a job
+        """
+        self.handlers[kind] = handler
+
+    def submit(self, kind: str, params: dict = None, key: str = None):
+        """Store a new job and queue it for one of the worker threads. If an idempotency key is given and a job with the same key exists already (e.g., as the client retries a request whose response got lost), no new job is created, but the existing one is returned, unless it has failed: then the key is released and a new job is created.
+
+        parameters:
+            kind -- the kind of the job (see register)
+            params -- dict of the parameters of the handler (must be storable in MongoDB)
+            key -- optional idempotency key chosen by the client
+
+        returns:
+            job -- the (new or existing) job object
+
+        raises:
+            ValueError -- in case the kind is unknown or the idempotency key has been used for another kind of job
+            queue.Full -- in case the maximum number of queued jobs is reached
+            RuntimeError -- in case the queue is draining, as the process shuts down
+            Exception -- in case any database operation fails
+        """
+        if kind not in self.handlers:
+            raise ValueError(f'Unknown kind of job {kind}')
+        try:
+            if key is not None:
+                existing = self.find(key)
+                if existing is not None:
+                    existing = self._same(existing, kind)
+                    if existing['status'] != FAILED:
+                        return existing
+                    # the retry of a failed job runs it again
+                    self.dao.update_by({'_id': ObjectId(existing['_id']['$oid']), 'status': FAILED}, {'$unset': {'key': ''}})
+            self._start()
+
+            job = {'kind': kind, 'params': params or {}, 'status': QUEUED, 'progress': {'done': 0, 'total': 1}, 'created': now(), 'leased': self._leased()}
+            if key is not None:
+                job['key'] = key
+            try:
+                job = self.dao.create(job)
+            except DuplicateKeyError:
+                # the same job has been submitted concurrently
+                return self._same(self.find(key), kind)
+
+            try:
+                self.held.add(job['_id']['$oid'])
+                self.queue.put_nowait(job['_id']['$oid'])
+            except queue.Full:
+                self.held.discard(job['_id']['$oid'])
+                # remove the job again, such that a retry with the same key is not answered by the rejected job
+                self.dao.delete(job['_id']['$oid'])
+                raise
+            return self._public(job)
+        except Exception as e:
+            raise
+
+    def get(self, id: str):
+        """Obtain the status of a job.
+
+        parameters:
+            id -- the unique identifier of the job
+
+        returns:
+            job -- the job object containing its kind, status, progress ({'done': ..., 'total': ...}), the creation, start and end times, and its result (once it has succeeded) or error message (once it has failed)
+            None -- if no job is associated to the given id
+
+        raises:
+            bson.errors.InvalidId -- in case the id is not valid
+            Exception -- in case the database operation fails
+        """
+        try:
+            return self._checked(self.dao.find_one_by({'_id': ObjectId(id)}, projection={'params': 0}))
+        except Exception as e:
+            raise
+
+    def find(self, key: str):
+        """Obtain the job with the given idempotency key (or None)."""
+        return self._checked(self.dao.find_one_by({'key': key}, projection={'params': 0}))
+
+    def reap(self, ids: list = None):
+        """Mark the queued and running jobs whose lease has expired as failed, as the process holding them has ended without finishing them.
+
+        parameters:
+            ids -- optional list of the ids of the jobs to check (default: all jobs)
+
+        returns:
+            n -- the number of jobs marked as failed
+        """
+        filter = {'status': {'$in': [QUEUED, RUNNING]}, 'leased': {'$lt': now()}}
+        if ids is not None:
+            filter['_id'] = {'$in': [ObjectId(id) for id in ids]}
+        result = self.dao.bulk_write([UpdateMany(filter, {'$set': {'status': FAILED, 'error': 'Abandoned, as the server running the job has stopped', 'finished': now()}})])
+        return result.modified_count
+
+    def drain(self, timeout: float = None):
+        """Stop accepting jobs and wait until the worker threads have finished the queued and running jobs (registered to run when the process exits). Jobs which have not finished within the timeout are marked as failed, since their threads end with the process.
+
+        parameters:
+            timeout -- seconds to wait (default: the drain timeout of the queue)
+        """
+        with self.lock:
+            if self.draining or not self.threads:
+                self.draining = True
+                return
+            self.draining = True
+            threads = list(self.threads)
+        self.stopped.set()
+        deadline = time.monotonic() + (self.drain_timeout if timeout is None else timeout)
+
+        # one stop signal per worker thread, behind the queued jobs
+        for _ in threads:
+            try:
+                self.queue.put(None, timeout=max(deadline - time.monotonic(), 0))
+            except queue.Full:
+                break
+        for thread in threads:
+            thread.join(timeout=max(deadline - time.monotonic(), 0))
+
+        interrupted = set(self.running)
+        while True:
+            try:
+                id = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if id is not None:
+                interrupted.add(id)
+        if interrupted:
+            self.dao.bulk_write([UpdateMany({'_id': {'$in': [ObjectId(id) for id in interrupted]}, 'status': {'$in': [QUEUED, RUNNING]}},
+                {'$set': {'status': FAILED, 'error': 'Interrupted by the shutdown of the server', 'finished': now()}})])
+
+    def _start(self):
+        """Start the worker threads on the first submission in this process."""
+        with self.lock:
+            if self.draining:
+                raise RuntimeError('The server is shutting down')
+            if self.threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'jobs-{i}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            threading.Thread(target=self._heartbeat, name='jobs-heartbeat', daemon=True).start()
+        atexit.register(self.drain)
+        # the jobs left behind by processes which have ended before (e.g., before a restart of the server)
+        self.reap()
+
+    def _heartbeat(self):
+        """Renew the leases of the queued and running jobs of this process, three times per lease."""
+        while not self.stopped.wait(self.lease / 3):
+            held = list(self.held)
+            if not held:
+                continue
+            try:
+                self.dao.bulk_write([UpdateMany({'_id': {'$in': [ObjectId(id) for id in held]}, 'status': {'$in': [QUEUED, RUNNING]}}, {'$set': {'leased': self._leased()}})])
+            except Exception as e:
+                print(f'{e.__class__.__name__}: {e}')
+
+    def _work(self):
+        while True:
+            id = self.queue.get()
+            if id is None:
+                return
+            self.running.add(id)
+            try:
+                self._run(id)
+            except Exception as e:
+                # the status of the job could not be recorded
+                print(f'{e.__class__.__name__}: {e}')
+            finally:
+                self.running.discard(id)
+                self.held.discard(id)
+
+    def _run(self, id: str):
+        job = self.dao.update_by({'_id': ObjectId(id), 'status': QUEUED},
+            {'$set': {'status': RUNNING, 'started': now(), 'leased': self._leased(), 'worker': f'{socket.gethostname()}:{os.getpid()}'}}, return_document=True)
+        if job is None:
+            return
+
+        # the latest total reported by the handler, such that a succeeded job is complete
+        totals = [job['progress']['total']]
+        def progress(done: int, total: int = None):
+            update = {'progress.done': int(done)}
+            if total is not None:
+                update['progress.total'] = int(total)
+                totals.append(int(total))
+            self.dao.update(id, {'$set': update})
+
+        try:
+            result = self.handlers[job['kind']](progress, **from_json(job['params']))
+        except Exception as e:
+            print(f'{e.__class__.__name__}: {e}')
+            self.dao.update(id, {'$set': {'status': FAILED, 'error': f'{e.__class__.__name__}: {e}', 'finished': now()}})
+            return
+        self.dao.update(id, {'$set': {'status': SUCCEEDED, 'result': from_json(result), 'finished': now(), 'progress.done': totals[-1]}})
+
+    def _leased(self):
+        return now() + timedelta(seconds=self.lease)
+
+    def _checked(self, job: dict):
+        """Reap the given job if its lease has expired, such that an abandoned job is not reported as queued or running."""
+        if job is not None and job['status'] in (QUEUED, RUNNING) and 'leased' in job and from_json(job['leased']) < now().replace(tzinfo=None):
+            if self.reap([job['_id']['$oid']]):
+                return self.dao.find_one_by({'_id': ObjectId(job['_id']['$oid'])}, projection={'params': 0})
+        return job
+
+    def _same(self, job: dict, kind: str):
+        if job['kind'] != kind:
+            raise ValueError('The idempotency key has already been used for another kind of job')
+        return job
+
+    def _public(self, job: dict):
+        return {key: value for key, value in job.items() if key != 'params'}
+
+def now():
+    return datetime.now(timezone.utc)
+
+def enqueue(kind: str, params: dict = None):
+    """Submit the work of the current request as a job (see JobQueue.submit), where the idempotency key is taken from the Idempotency-Key header of the request, and respond with 202 Accepted (see accepted). The errors of the submission are responded as well (instead of being raised), such that a route can return the response from within its try block.
+
+    parameters:
+        kind -- the kind of the job
+        params -- dict of the parameters of the handler
+
+    returns:
+        response -- a flask Response with status 202, or 422 if the idempotency key has been used for another kind of job, or 503 (with a Retry-After header) if the queue is full or draining
+    """
+    try:
+        job = getJobQueue().submit(kind, params, key=request.headers.get('Idempotency-Key'))
+    except ValueError as e:
+        return UnprocessableEntity(str(e)).get_response()
+    except (queue.Full, RuntimeError) as e:
+        response = ServiceUnavailable(str(e) or 'Too many pending jobs, retry later').get_response()
+        response.headers['Retry-After'] = '5'
+        return response
+    return accepted(job)
+
+def accepted(job: dict):
+    """Respond to a request whose work has been submitted as a job with 202 Accepted, the job object and the URL to poll its status.
+
+    parameters:
+        job -- the job object (see JobQueue.submit)
+
+    returns:
+        response -- a flask Response with status 202
+    """
+    response = jsonify(job)
+    response.status_code = 202
+    response.headers['Location'] = f'/jobs/{job["_id"]["$oid"]}'
+    return response
+
+jobqueue = None
+def getJobQueue():
+    """Obtain the job queue of the process (see JobQueue), which stores the jobs via the data access object of the job collection (see src.util.daos.getDao). The number of worker threads, the maximum number of queued jobs, the drain timeout and the lease of a job in seconds are configured via JOB_WORKERS (default 2), JOB_QUEUE_SIZE (default 100), JOB_DRAIN_TIMEOUT (default 30) and JOB_LEASE (default 60).
+
+    returns:
+        jobqueue -- JobQueue
+    """
+    global jobqueue
+    if jobqueue is None:
+        config = getConfig()
+        jobqueue = JobQueue(getDao(collection_name='job'), workers=int(config.get('JOB_WORKERS', 2)),
+            size=int(config.get('JOB_QUEUE_SIZE', 100)), drain_timeout=float(config.get('JOB_DRAIN_TIMEOUT', 30)), lease=float(config.get('JOB_LEASE', 60)))
+    return jobqueue
+
+def resetJobQueue():
+    """Forget the worker threads and queued jobs of the parent process in a forked child process."""
+    if jobqueue is not None:
+        jobqueue._reset()
+
+os.register_at_fork(after_in_child=resetJobQueue)
@@ -0,0 +1,1001 @@
+import datetime
+import re
+import threading
+from functools import cmp_to_key
+
+from bson.objectid import ObjectId
+from pymongo import InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany
+from pymongo.errors import WriteError, DuplicateKeyError, BulkWriteError, OperationFailure, CollectionInvalid
+from pymongo.results import InsertOneResult, InsertManyResult, UpdateResult, DeleteResult, BulkWriteResult
+
+from src.util import querytracker
+
+# in-memory storage engine, which implements the subset of the pymongo database and collection interface used by
+# the data access objects (see src.util.dao), such that the controllers and blueprints can be run (e.g., for tests
+# and profiling) without a MongoDB server
+
+# marker for a property which does not exist in a document
+MISSING = object()
+
+def clone(value):
+    """Copy the (mutable) structure of a document. All other BSON values (ObjectId, datetime, str, ...) are immutable and hence shared."""
+    if isinstance(value, dict):
+        return {key: clone(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [clone(item) for item in value]
+    return value
+
+def resolve(document, path: str):
+    """Obtain the value at the given (dotted) path of a document. Like in MongoDB, a path traversing an array yields the values of all elements of the array.
+
+    returns:
+        value -- the value at the path (a list of values in case the path traverses an array)
+        MISSING -- if the document does not contain the path
+    """
+    value = document
+    for key in path.split('.'):
+        if isinstance(value, dict):
+            value = value.get(key, MISSING)
+        elif isinstance(value, list):
+            if key.isdigit():
+                value = value[int(key)] if int(key) < len(value) else MISSING
+            else:
+                values = [resolve(element, key) for element in value if isinstance(element, dict)]
+                value = [item for item in values if item is not MISSING]
+        else:
+            return MISSING
+        if value is MISSING:
+            return MISSING
+    return value
+
+def assign(document: dict, path: str, value):
+    """Set the value at the given (dotted) path of a document, creating embedded documents where necessary."""
+    keys = path.split('.')
+    for key in keys[:-1]:
+        if isinstance(document, list):
+            document = document[int(key)]
+        else:
+            document = document.setdefault(key, {})
+    if isinstance(document, list):
+        document[int(keys[-1])] = value
+    else:
+        document[keys[-1]] = value
+
+def unassign(document: dict, path: str):
+    """Remove the value at the given (dotted) path of a document (if it exists)."""
+    keys = path.split('.')
+    for key in keys[:-1]:
+        document = document.get(key) if isinstance(document, dict) else None
+        if document is None:
+            return
+    if isinstance(document, dict):
+        document.pop(keys[-1], None)
+
+def rank(value):
+    """Obtain the rank of the type of a value in the BSON comparison order (see https://www.mongodb.com/docs/manual/reference/bson-type-comparison-order/)."""
+    if value is None or value is MISSING:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime.datetime):
+        return 9
+    return 10
+
+def compare(a, b):
+    """Compare two BSON values according to the BSON comparison order.
+
+    returns:
+        n -- a negative number if a < b, 0 if a == b and a positive number if a > b
+    """
+    ranka, rankb = rank(a), rank(b)
+    if ranka != rankb:
+        return ranka - rankb
+    if ranka == 1:
+        return 0
+    if ranka == 4:
+        return compare(list(a.items()), list(b.items()))
+    if ranka == 5 or isinstance(a, tuple):
+        for x, y in zip(a, b):
+            result = compare(x, y)
+            if result != 0:
+                return result
+        return len(a) - len(b)
+    return (a > b) - (a < b)
+
+def equals(value, target):
+    """Check whether a value matches a target value in a query: a missing value matches None and an array matches if it equals the target or contains it."""
+    if value is MISSING:
+        return target is None
+    if isinstance(value, list) and not isinstance(target, list):
+        return any(equals(element, target) for element in value)
+    return compare(value, target) == 0 or (isinstance(value, list) and any(compare(element, target) == 0 for element in value))
+
+def freeze(value):
+    """Transform a BSON value into a hashable key (for the hash indexes)."""
+    if value is MISSING:
+        return None
+    if isinstance(value, dict):
+        return tuple((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+BSON_TYPES = {
+    'object': lambda value: isinstance(value, dict),
+    'array': lambda value: isinstance(value, list),
+    'string': lambda value: isinstance(value, str),
+    'bool': lambda value: isinstance(value, bool),
+    'date': lambda value: isinstance(value, datetime.datetime),
+    'objectId': lambda value: isinstance(value, ObjectId),
+    'int': lambda value: isinstance(value, int) and not isinstance(value, bool),
+    'long': lambda value: isinstance(value, int) and not isinstance(value, bool),
+    'double': lambda value: isinstance(value, float),
+    'number': lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    'null': lambda value: value is None
+}
+
+def hasType(value, bsontype):
+    """Check whether a value is of the given BSON type alias (or one of a list of aliases)."""
+    types = bsontype if isinstance(bsontype, list) else [bsontype]
+    return any(BSON_TYPES[type](value) for type in types)
+
+def matches(document: dict, filter: dict):
+    """Check whether a document complies to a query filter (see https://www.mongodb.com/docs/manual/reference/operator/query/). The comparison, element, array and logical query operators are supported.
+
+    parameters:
+        document -- the document
+        filter -- the query filter
+
+    returns:
+        True -- if the document complies to the filter
+        False -- otherwise
+    """
+    for key, condition in (filter or {}).items():
+        if key == '$and':
+            if not all(matches(document, subfilter) for subfilter in condition):
+                return False
+        elif key == '$or':
+            if not any(matches(document, subfilter) for subfilter in condition):
+                return False
+        elif key == '$nor':
+            if any(matches(document, subfilter) for subfilter in condition):
+                return False
+        elif key.startswith('$'):
+            raise OperationFailure(f'unknown top level operator: {key}', code=2)
+        elif not matchesCondition(resolve(document, key), condition):
+            return False
+    return True
+
+def matchesCondition(value, condition):
+    """Check whether a value complies to the condition of a query filter (either a value or a dict of query operators)."""
+    if isinstance(condition, dict) and condition and all(key.startswith('$') for key in condition):
+        return all(matchesOperator(value, operator, argument, condition) for operator, argument in condition.items())
+    if isinstance(condition, re.Pattern):
+        return isinstance(value, str) and condition.search(value) is not None
+    return equals(value, condition)
+
+def matchesOperator(value, operator: str, argument, condition: dict):
+    values = value if isinstance(value, list) else [value]
+    if operator == '$eq':
+        return equals(value, argument)
+    if operator == '$ne':
+        return not equals(value, argument)
+    if operator in ['$gt', '$gte', '$lt', '$lte']:
+        tests = {'$gt': lambda n: n > 0, '$gte': lambda n: n >= 0, '$lt': lambda n: n < 0, '$lte': lambda n: n <= 0}
+        return any(element is not MISSING and rank(element) == rank(argument) and tests[operator](compare(element, argument)) for element in values)
+    if operator == '$in':
+        return any(equals(value, item) for item in argument)
+    if operator == '$nin':
+        return not any(equals(value, item) for item in argument)
+    if operator == '$exists':
+        return (value is not MISSING) == bool(argument)
+    if operator == '$type':
+        return value is not MISSING and (hasType(value, argument) or any(hasType(element, argument) for element in values if element is not value))
+    if operator == '$size':
+        return isinstance(value, list) and len(value) == argument
+    if operator == '$all':
+        return all(equals(value, item) for item in argument)
+    if operator == '$elemMatch':
+        return isinstance(value, list) and any(
+            matches(element, argument) if isinstance(element, dict) and not all(key.startswith('$') for key in argument) else matchesCondition(element, argument)
+            for element in value)
+    if operator == '$regex':
+        flags = re.IGNORECASE if 'i' in condition.get('$options', '') else 0
+        return any(isinstance(element, str) and re.search(argument, element, flags) is not None for element in values)
+    if operator == '$options':
+        return True
+    if operator == '$not':
+        return not matchesCondition(value, argument)
+    raise OperationFailure(f'unknown operator: {operator}', code=2)
+
+def project(document: dict, projection: dict):
+    """Apply an inclusion or exclusion projection (on top-level and dotted properties) to a document."""
+    if not projection:
+        return document
+    inclusion = any(value for key, value in projection.items() if key != '_id')
+    if inclusion:
+        result = {}
+        if projection.get('_id', 1) and '_id' in document:
+            result['_id'] = document['_id']
+        for key, value in projection.items():
+            if value and key != '_id':
+                item = resolve(document, key)
+                if item is not MISSING:
+                    assign(result, key, item)
+        return result
+
+    result = dict(document)
+    for key, value in projection.items():
+        if not value:
+            unassign(result, key)
+    return result
+
+def positional(document: dict, path: str, filter: dict = None):
+    """Replace the positional operator $ in an update path (e.g., todos.$.done) by the index of the first element of the array which complies to the conditions of the query filter on that array (e.g., {'todos._id': ...} or {'todos': {'$elemMatch': ...}})."""
+    keys = path.split('.')
+    if '$' not in keys:
+        return path
+    position = keys.index('$')
+    prefix = '.'.join(keys[:position])
+    filter = filter if isinstance(filter, dict) else {}
+    conditions = {key[len(prefix) + 1:]: condition for key, condition in filter.items() if key.startswith(prefix + '.')}
+    if isinstance(filter.get(prefix), dict) and '$elemMatch' in filter[prefix]:
+        conditions.update(filter[prefix]['$elemMatch'])
+    array = resolve(document, prefix)
+    if conditions and isinstance(array, list):
+        for index, element in enumerate(array):
+            if isinstance(element, dict) and matches(element, conditions):
+                keys[position] = str(index)
+                return '.'.join(keys)
+    raise WriteError('The positional operator did not find the match needed from the query.', code=2)
+
+def update(document: dict, operations: dict, filter: dict = None, inserting: bool = False):
+    """Apply the update operators (see https://www.mongodb.com/docs/manual/reference/operator/update/) to a document, or replace it if the operations contain no operators.
+
+    parameters:
+        document -- the document, which is modified in place
+        operations -- dict where the top level keys are update operators ($set, $setOnInsert, $unset, $inc, $push, $addToSet, $pull, $pullAll, $min, $max)
+        filter -- the query filter which selected the document, to resolve the positional operator $ in the paths of the operations
+        inserting -- True if the document is inserted by an upsert (only then $setOnInsert applies)
+
+    returns:
+        document -- the updated document
+    """
+    if not any(key.startswith('$') for key in operations):
+        id = document['_id']
+        document.clear()
+        document.update(clone(operations))
+        document['_id'] = id
+        return document
+
+    for operator, fields in operations.items():
+        for path, value in fields.items():
+            path = positional(document, path, filter)
+            current = resolve(document, path)
+            if operator == '$set':
+                assign(document, path, clone(value))
+            elif operator == '$setOnInsert':
+                if inserting:
+                    assign(document, path, clone(value))
+            elif operator == '$unset':
+                unassign(document, path)
+            elif operator == '$inc':
+                assign(document, path, (0 if current is MISSING else current) + value)
+            elif operator in ['$min', '$max']:
+                better = (lambda n: n < 0) if operator == '$min' else (lambda n: n > 0)
+                if current is MISSING or better(compare(value, current)):
+                    assign(document, path, clone(value))
+            elif operator in ['$push', '$addToSet']:
+                if current is MISSING:
+                    current = []
+                    assign(document, path, current)
+                elif not isinstance(current, list):
+                    raise WriteError(f'The field \'{path}\' must be an array', code=2)
+                items = value['$each'] if isinstance(value, dict) and '$each' in value else [value]
+                for item in items:
+                    if operator == '$push' or not any(compare(element, item) == 0 for element in current):
+                        current.append(clone(item))
+            elif operator in ['$pull', '$pullAll']:
+                if isinstance(current, list):
+                    if operator == '$pullAll':
+                        keep = [element for element in current if not any(compare(element, item) == 0 for item in value)]
+                    elif isinstance(value, dict) and not all(key.startswith('$') for key in value):
+                        keep = [element for element in current if not (isinstance(element, dict) and matches(element, value))]
+                    else:
+                        keep = [element for element in current if not matchesCondition(element, value)]
+                    current[:] = keep
+            else:
+                raise WriteError(f'Unknown modifier: {operator}', code=9)
+    return document
+
+def conforms(value, schema: dict):
+    """Check whether a value conforms to a $jsonSchema (see https://www.mongodb.com/docs/manual/reference/operator/query/jsonSchema/). The keywords bsonType, required, properties, additionalProperties, items, minItems, maxItems and enum are supported."""
+    if 'bsonType' in schema and not hasType(value, schema['bsonType']):
+        return False
+    if 'enum' in schema and not any(compare(value, item) == 0 for item in schema['enum']):
+        return False
+    if isinstance(value, dict):
+        if any(key not in value for key in schema.get('required', [])):
+            return False
+        properties = schema.get('properties', {})
+        for key, subschema in properties.items():
+            if key in value and not conforms(value[key], subschema):
+                return False
+        if schema.get('additionalProperties') is False and any(key not in properties and key != '_id' for key in value):
+            return False
+    if isinstance(value, list):
+        if 'items' in schema and not all(conforms(item, schema['items']) for item in value):
+            return False
+        if len(value) < schema.get('minItems', 0) or len(value) > schema.get('maxItems', len(value)):
+            return False
+    return True
+
+def evaluate(expression, document: dict, variables: dict = None):
+    """Evaluate an aggregation expression (see https://www.mongodb.com/docs/manual/meta/aggregation-quick-reference/#expressions) in the context of a document.
+
+    returns:
+        value -- the value of the expression (or MISSING)
+    """
+    variables = variables or {}
+    if isinstance(expression, str) and expression.startswith('$$'):
+        name, _, path = expression[2:].partition('.')
+        value = document if name in ['ROOT', 'CURRENT'] else variables.get(name, MISSING)
+        return resolve(value, path) if path and value is not MISSING else value
+    if isinstance(expression, str) and expression.startswith('$'):
+        return resolve(document, expression[1:])
+    if isinstance(expression, list):
+        return [evaluate(item, document, variables) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    if len(expression) != 1 or not next(iter(expression)).startswith('$'):
+        result = {}
+        for key, item in expression.items():
+            value = evaluate(item, document, variables)
+            if value is not MISSING:
+                result[key] = value
+        return result
+
+    operator, argument = next(iter(expression.items()))
+    if operator == '$literal':
+        return argument
+    if operator == '$filter':
+        name = argument.get('as', 'this')
+        items = evaluate(argument['input'], document, variables)
+        return [item for item in items if evaluate(argument['cond'], document, dict(variables, **{name: item})) is True]
+    if operator == '$map':
+        name = argument.get('as', 'this')
+        items = evaluate(argument['input'], document, variables)
+        return [evaluate(argument['in'], document, dict(variables, **{name: item})) for item in items]
+    if operator == '$cond':
+        if isinstance(argument, dict):
+            argument = [argument['if'], argument['then'], argument['else']]
+        condition = evaluate(argument[0], document, variables)
+        return evaluate(argument[1] if truthy(condition) else argument[2], document, variables)
+
+    arguments = evaluate(argument, document, variables)
+    if not isinstance(argument, list):
+        arguments = [arguments]
+    return EXPRESSIONS[operator](*arguments) if operator in EXPRESSIONS else unknownExpression(operator)
+
+def truthy(value):
+    return value is not MISSING and value is not None and value is not False and value != 0
+
+def unknownExpression(operator: str):
+    raise OperationFailure(f'Unrecognized expression \'{operator}\'', code=168)
+
+def numbers(values):
+    return [value for value in values if rank(value) == 2 and not isinstance(value, bool)]
+
+def summation(*values):
+    if len(values) == 1 and isinstance(values[0], list):
+        values = values[0]
+    return sum(numbers(values))
+
+EXPRESSIONS = {
+    '$ifNull': lambda *values: next((value for value in values if value is not None and value is not MISSING), None),
+    '$arrayElemAt': lambda array, index: array[index] if -len(array) <= index < len(array) else MISSING,
+    '$first': lambda array: array[0] if array else MISSING,
+    '$last': lambda array: array[-1] if array else MISSING,
+    '$size': lambda array: len(array),
+    '$concatArrays': lambda *arrays: [item for array in arrays for item in array],
+    '$in': lambda value, array: any(compare(value, item) == 0 for item in array),
+    '$sum': summation,
+    '$add': lambda *values: sum(values),
+    '$subtract': lambda a, b: a - b,
+    '$multiply': lambda a, b: a * b,
+    '$divide': lambda a, b: a / b,
+    '$eq': lambda a, b: compare(a, b) == 0,
+    '$ne': lambda a, b: compare(a, b) != 0,
+    '$gt': lambda a, b: compare(a, b) > 0,
+    '$gte': lambda a, b: compare(a, b) >= 0,
+    '$lt': lambda a, b: compare(a, b) < 0,
+    '$lte': lambda a, b: compare(a, b) <= 0,
+    '$and': lambda *values: all(truthy(value) for value in values),
+    '$or': lambda *values: any(truthy(value) for value in values),
+    '$not': lambda value: not truthy(value),
+    '$toString': lambda value: str(value),
+    '$isArray': lambda value: isinstance(value, list),
+    '$type': lambda value: 'missing' if value is MISSING else next(name for name in ['null', 'bool', 'objectId', 'date', 'string', 'object', 'array', 'int', 'double'] if BSON_TYPES[name](value))
+}
+
+def sortDocuments(documents: list, specification):
+    """Sort documents according to a list of (key, direction) pairs (or a dict of key: direction)."""
+    keys = list(specification.items()) if isinstance(specification, dict) else list(specification)
+    def comparator(a, b):
+        for key, direction in keys:
+            result = compare(resolve(a, key), resolve(b, key))
+            if result != 0:
+                return result * direction
+        return 0
+    return sorted(documents, key=cmp_to_key(comparator))
+
+ACCUMULATORS = {
+    '$sum': lambda values: summation(values),
+    '$avg': lambda values: sum(numbers(values)) / len(numbers(values)) if numbers(values) else None,
+    '$min': lambda values: min(values, key=cmp_to_key(compare), default=None),
+    '$max': lambda values: max(values, key=cmp_to_key(compare), default=None),
+    '$push': lambda values: list(values),
+    '$addToSet': lambda values: [value for index, value in enumerate(values) if not any(compare(value, other) == 0 for other in values[:index])],
+    '$first': lambda values: values[0] if values else None,
+    '$last': lambda values: values[-1] if values else None
+}
+
+def aggregate(documents: list, pipeline: list, database):
+    """Run an aggregation pipeline on a list of documents. The stages $match, $lookup (with localField and foreignField and an optional pipeline), $set/$addFields, $unset, $project, $unwind, $group, $sort, $skip, $limit and $count are supported.
+
+    parameters:
+        documents -- the input documents (which may be modified)
+        pipeline -- list of aggregation pipeline stages
+        database -- the MemoryDatabase, which contains the collections referenced by $lookup
+
+    returns:
+        documents -- list of the resulting documents
+    """
+    for stage in pipeline:
+        (name, specification), = stage.items()
+        if name == '$match':
+            documents = [document for document in documents if matches(document, specification)]
+        elif name == '$lookup':
+            if 'localField' not in specification:
+                raise OperationFailure('$lookup is only supported with localField and foreignField', code=9)
+            collection = database[specification['from']]
+            foreign = list(collection.documents.values())
+            for document in documents:
+                local = resolve(document, specification['localField'])
+                if specification['foreignField'] == '_id':
+                    # join via the hash index on _id instead of scanning the foreign collection
+                    ids = local if isinstance(local, list) else [local]
+                    joined = [clone(collection.documents[id]) for id in dict.fromkeys(id for id in ids if isinstance(id, ObjectId)) if id in collection.documents]
+                else:
+                    joined = [clone(other) for other in foreign if joins(local, resolve(other, specification['foreignField']))]
+                if specification.get('pipeline'):
+                    joined = aggregate(joined, specification['pipeline'], database)
+                assign(document, specification['as'], joined)
+        elif name in ['$set', '$addFields']:
+            for document in documents:
+                values = {field: evaluate(expression, document) for field, expression in specification.items()}
+                for field, value in values.items():
+                    if value is MISSING:
+                        unassign(document, field)
+                    else:
+                        assign(document, field, value)
+        elif name == '$unset':
+            for document in documents:
+                for field in ([specification] if isinstance(specification, str) else specification):
+                    unassign(document, field)
+        elif name == '$project':
+            documents = [projectExpression(document, specification) for document in documents]
+        elif name == '$unwind':
+            path = specification if isinstance(specification, str) else specification['path']
+            preserve = isinstance(specification, dict) and specification.get('preserveNullAndEmptyArrays', False)
+            unwound = []
+            for document in documents:
+                values = resolve(document, path[1:])
+                if isinstance(values, list) and values:
+                    for value in values:
+                        element = dict(document)
+                        assign(element, path[1:], value)
+                        unwound.append(element)
+                elif isinstance(values, list) or values is MISSING or values is None:
+                    if preserve:
+                        element = dict(document)
+                        unassign(element, path[1:])
+                        unwound.append(element)
+                else:
+                    unwound.append(document)
+            documents = unwound
+        elif name == '$group':
+            groups = {}
+            for document in documents:
+                key = evaluate(specification['_id'], document)
+                groups.setdefault(freeze(key), (key, []))[1].append(document)
+            grouped = []
+            for key, members in groups.values():
+                result = {'_id': None if key is MISSING else key}
+                for field, accumulator in specification.items():
+                    if field != '_id':
+                        (operator, expression), = accumulator.items()
+                        values = [evaluate(expression, member) for member in members]
+                        result[field] = ACCUMULATORS[operator]([value for value in values if value is not MISSING])
+                grouped.append(result)
+            documents = grouped
+        elif name == '$sort':
+            documents = sortDocuments(documents, specification)
+        elif name == '$skip':
+            documents = documents[specification:]
+        elif name == '$limit':
+            documents = documents[:specification]
+        elif name == '$count':
+            documents = [{specification: len(documents)}] if documents else []
+        else:
+            raise OperationFailure(f'Unrecognized pipeline stage name: \'{name}\'', code=40324)
+    return documents
+
+def joins(local, foreign):
+    """Check whether a foreign value joins a local value in a $lookup (local arrays join each of their elements)."""
+    if local is MISSING or local is None:
+        return foreign is MISSING or foreign is None
+    if isinstance(local, list):
+        return any(equals(foreign, element) for element in local)
+    return equals(foreign, local)
+
+def projectExpression(document: dict, specification: dict):
+    """Apply a $project stage, which can also compute new properties from expressions."""
+    if all(value in [0, False] for value in specification.values()):
+        return project(document, specification)
+    result = {}
+    if specification.get('_id', 1) not in [0, False] and '_id' in document:
+        result['_id'] = document['_id']
+    for key, expression in specification.items():
+        if key == '_id' and expression in [0, 1, True, False]:
+            continue
+        value = resolve(document, key) if expression in [1, True] else evaluate(expression, document)
+        if value is not MISSING:
+            assign(result, key, value)
+    return result
+
+class MemoryCollection:
+    def __init__(self, database, name: str, validator: dict = None):
+        """Create an in-memory collection, which keeps its documents in a dict (i.e., a hash index) mapping the _id to the document. Declared unique indexes are maintained as hash indexes as well, all other indexes are only recorded.
+
+        parameters:
+            database -- the MemoryDatabase containing the collection
+            name -- the name of the collection
+            validator -- optional collection validator (containing a $jsonSchema and/or a query filter)
+        """
+        self.database = database
+        self.name = name
+        self.validator = validator
+        self.documents = {}
+        self.indexes = {'_id_': {'key': [('_id', 1)]}}
+        # hash index per unique index mapping the (frozen) key of a document to its _id
+        self.unique = {}
+        self.accesses = {'_id_': 0}
+
+    def _key(self, name: str, document: dict):
+        return tuple(freeze(resolve(document, field)) for field, _ in self.indexes[name]['key'])
+
+    def _validate(self, document: dict):
+        if self.validator is None:
+            return
+        schema = self.validator.get('$jsonSchema')
+        filter = {key: value for key, value in self.validator.items() if key != '$jsonSchema'}
+        if (schema is not None and not conforms(document, schema)) or not matches(document, filter):
+            raise WriteError('Document failed validation', code=121, details={'failingDocumentId': document.get('_id')})
+
+    def _check(self, document: dict, previous: dict = None):
+        """Validate a new version of a document and check it against the unique indexes (excluding its previous version)."""
+        self._validate(document)
+        if previous is None and document['_id'] in self.documents:
+            raise DuplicateKeyError(f'E11000 duplicate key error collection: {self.database.name}.{self.name} index: _id_ dup key: {{ _id: {document["_id"]} }}', code=11000)
+        for name, index in self.unique.items():
+            if self.indexes[name].get('sparse') and all(resolve(document, field) is MISSING for field, _ in self.indexes[name]['key']):
+                continue
+            owner = index.get(self._key(name, document))
+            if owner is not None and owner != document['_id']:
+                raise DuplicateKeyError(f'E11000 duplicate key error collection: {self.database.name}.{self.name} index: {name} dup key: {self._key(name, document)}', code=11000)
+
+    def _store(self, document: dict):
+        previous = self.documents.get(document['_id'])
+        if previous is not None:
+            self._unstore(previous)
+        self.documents[document['_id']] = document
+        for name, index in self.unique.items():
+            if not (self.indexes[name].get('sparse') and all(resolve(document, field) is MISSING for field, _ in self.indexes[name]['key'])):
+                index[self._key(name, document)] = document['_id']
+
+    def _unstore(self, document: dict):
+        del self.documents[document['_id']]
+        for name, index in self.unique.items():
+            key = self._key(name, document)
+            if index.get(key) == document['_id']:
+                del index[key]
+
+    def _select(self, filter, limit: int = 0):
+        """Obtain the stored documents complying to the filter, using the hash indexes for equality (and $in) conditions on _id or a unique property."""
+        if filter is not None and not isinstance(filter, dict):
+            filter = {'_id': filter}
+        filter = filter or {}
+
+        candidates = None
+        indexed = []
+        if '_id' in filter:
+            condition = filter['_id']
+            if isinstance(condition, dict) and list(condition.keys()) == ['$in'] and all(isinstance(id, (ObjectId, str, int)) for id in condition['$in']):
+                candidates = [self.documents[id] for id in dict.fromkeys(condition['$in']) if id in self.documents]
+            elif isinstance(condition, (ObjectId, str, int)):
+                candidates = [self.documents[condition]] if condition in self.documents else []
+            if candidates is not None:
+                indexed = ['_id']
+                self.accesses['_id_'] += 1
+        if candidates is None:
+            for name, index in self.unique.items():
+                fields = [field for field, _ in self.indexes[name]['key']]
+                if all(field in filter and not isinstance(filter[field], (dict, list)) for field in fields):
+                    owner = index.get(tuple(freeze(filter[field]) for field in fields))
+                    candidates = [self.documents[owner]] if owner is not None else []
+                    indexed = fields
+                    self.accesses[name] += 1
+                    break
+        if candidates is None:
+            candidates = self.documents.values()
+
+        # the conditions answered by a hash index need not be checked again
+        filter = {key: condition for key, condition in filter.items() if key not in indexed}
+        selected = []
+        for document in candidates:
+            if matches(document, filter):
+                selected.append(document)
+                if limit and len(selected) >= limit:
+                    break
+        return selected
+
+    def _insert(self, document: dict):
+        with self.database.lock:
+            if '_id' not in document:
+                document['_id'] = ObjectId()
+            stored = clone(document)
+            self._check(stored)
+            self._store(stored)
+
+    # every public operation records the database command (and hence round trip) it stands for (see src.util.querytracker)
+    def insert_one(self, document: dict, session=None, **kwargs):
+        querytracker.record('insert', self.name)
+        self._insert(document)
+        return InsertOneResult(document['_id'], True)
+
+    def insert_many(self, documents: list, ordered: bool = True, session=None, **kwargs):
+        querytracker.record('insert', self.name)
+        with self.database.lock:
+            for document in documents:
+                if '_id' not in document:
+                    document['_id'] = ObjectId()
+
+            inserted, errors = [], []
+            for index, document in enumerate(documents):
+                try:
+                    stored = clone(document)
+                    self._check(stored)
+                    self._store(stored)
+                    inserted.append(document['_id'])
+                except WriteError as e:
+                    errors.append({'index': index, 'code': e.code, 'errmsg': str(e), 'op': document})
+                    if ordered:
+                        break
+            if errors:
+                raise BulkWriteError({'writeErrors': errors, 'writeConcernErrors': [], 'nInserted': len(inserted), 'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []})
+            return InsertManyResult(inserted, True)
+
+    def find(self, filter=None, projection=None, skip: int = 0, limit: int = 0, sort=None, session=None, **kwargs):
+        querytracker.record('find', self.name, filter)
+        with self.database.lock:
+            documents = self._select(filter, limit=0 if sort or skip else limit)
+            if sort:
+                documents = sortDocuments(documents, sort)
+            documents = documents[skip:skip + limit] if limit else documents[skip:]
+            return iter([project(clone(document), projection) for document in documents])
+
+    def find_one(self, filter=None, projection=None, session=None, **kwargs):
+        return next(self.find(filter, projection, limit=1, **kwargs), None)
+
+    def count_documents(self, filter: dict, session=None, **kwargs):
+        querytracker.record('aggregate', self.name, filter)
+        with self.database.lock:
+            return len(self._select(filter))
+
+    def estimated_document_count(self, **kwargs):
+        return len(self.documents)
+
+    def _update(self, filter: dict, operations, multi: bool, upsert: bool = False, sort=None):
+        """Update the documents complying to the filter and return the number of matched and modified documents, the _id of an upserted document as well as the documents before and after the (first) update."""
+        with self.database.lock:
+            documents = self._select(filter, limit=0 if multi or sort else 1)
+            if sort:
+                documents = sortDocuments(documents, sort)
+            if not multi:
+                documents = documents[:1]
+
+            result = {'n': len(documents), 'nModified': 0, 'before': None, 'after': None}
+            if not documents and upsert:
+                document = {key: clone(value) for key, value in (filter or {}).items() if not key.startswith('$') and not isinstance(value, dict)}
+                if '_id' not in document:
+                    document['_id'] = ObjectId()
+                document = update(document, operations, inserting=True)
+                self._check(document)
+                self._store(document)
+                result.update({'n': 1, 'upserted': document['_id'], 'after': document})
+                return result
+
+            for previous in documents:
+                document = update(clone(previous), operations, filter=filter)
+                if document['_id'] != previous['_id']:
+                    raise WriteError('Performing an update on the path \'_id\' would modify the immutable field \'_id\'', code=66)
+                self._check(document, previous=previous)
+                if compare(document, previous) != 0:
+                    result['nModified'] += 1
+                self._store(document)
+                if result['before'] is None:
+                    result['before'], result['after'] = previous, document
+            return result
+
+    def update_one(self, filter: dict, update: dict, upsert: bool = False, session=None, **kwargs):
+        querytracker.record('update', self.name, filter)
+        result = self._update(filter, update, multi=False, upsert=upsert)
+        return UpdateResult({key: result[key] for key in ['n', 'nModified', 'upserted'] if key in result}, True)
+
+    def update_many(self, filter: dict, update: dict, upsert: bool = False, session=None, **kwargs):
+        querytracker.record('update', self.name, filter)
+        result = self._update(filter, update, multi=True, upsert=upsert)
+        return UpdateResult({key: result[key] for key in ['n', 'nModified', 'upserted'] if key in result}, True)
+
+    def replace_one(self, filter: dict, replacement: dict, upsert: bool = False, session=None, **kwargs):
+        querytracker.record('update', self.name, filter)
+        result = self._update(filter, replacement, multi=False, upsert=upsert)
+        return UpdateResult({key: result[key] for key in ['n', 'nModified', 'upserted'] if key in result}, True)
+
+    def find_one_and_update(self, filter: dict, update: dict, projection=None, sort=None, upsert: bool = False, return_document: bool = False, session=None, **kwargs):
+        querytracker.record('findAndModify', self.name, filter)
+        result = self._update(filter, update, multi=False, upsert=upsert, sort=sort)
+        document = result['after'] if return_document else result['before']
+        return project(clone(document), projection) if document is not None else None
+
+    def _delete(self, filter: dict, multi: bool):
+        with self.database.lock:
+            documents = self._select(filter, limit=0 if multi else 1)
+            for document in documents:
+                self._unstore(document)
+            return len(documents)
+
+    def delete_one(self, filter: dict, session=None, **kwargs):
+        querytracker.record('delete', self.name, filter)
+        return DeleteResult({'n': self._delete(filter, multi=False)}, True)
+
+    def delete_many(self, filter: dict, session=None, **kwargs):
+        querytracker.record('delete', self.name, filter)
+        return DeleteResult({'n': self._delete(filter, multi=True)}, True)
+
+    def bulk_write(self, requests: list, ordered: bool = True, session=None, **kwargs):
+        result = {'writeErrors': [], 'writeConcernErrors': [], 'nInserted': 0, 'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []}
+        # like pymongo, send one command per run of consecutive requests of the same kind
+        kind = None
+        for request in requests:
+            command = 'insert' if isinstance(request, InsertOne) else 'delete' if isinstance(request, (DeleteOne, DeleteMany)) else 'update'
+            if command != kind:
+                querytracker.record(command, self.name)
+                kind = command
+        with self.database.lock:
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        self._insert(request._doc)
+                        result['nInserted'] += 1
+                    elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                        updated = self._update(request._filter, request._doc, multi=isinstance(request, UpdateMany), upsert=bool(request._upsert))
+                        if 'upserted' in updated:
+                            result['nUpserted'] += 1
+                            result['upserted'].append({'index': index, '_id': updated['upserted']})
+                        else:
+                            result['nMatched'] += updated['n']
+                            result['nModified'] += updated['nModified']
+                    elif isinstance(request, (DeleteOne, DeleteMany)):
+                        result['nRemoved'] += self._delete(request._filter, multi=isinstance(request, DeleteMany))
+                    else:
+                        raise TypeError(f'{request!r} is not a valid request')
+                except WriteError as e:
+                    result['writeErrors'].append({'index': index, 'code': e.code, 'errmsg': str(e), 'op': request})
+                    if ordered:
+                        break
+        if result['writeErrors']:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    def aggregate(self, pipeline: list, session=None, **kwargs):
+        querytracker.record('aggregate', self.name, pipeline)
+        with self.database.lock:
+            if pipeline and '$indexStats' in pipeline[0]:
+                documents = [{'name': name, 'key': dict(index['key']), 'accesses': {'ops': self.accesses.get(name, 0)}} for name, index in self.indexes.items()]
+                return iter(aggregate(documents, pipeline[1:], self.database))
+            if pipeline and '$match' in pipeline[0]:
+                # select the documents of a leading $match via the hash indexes (like MongoDB uses its indexes)
+                documents, pipeline = self._select(pipeline[0]['$match']), pipeline[1:]
+            else:
+                documents = self.documents.values()
+            return iter(aggregate([clone(document) for document in documents], pipeline, self.database))
+
+    def index_information(self):
+        return {name: clone(index) for name, index in self.indexes.items()}
+
+    def create_index(self, keys, name: str = None, unique: bool = False, **options):
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        keys = [tuple(key) for key in keys]
+        name = name or '_'.join(f'{field}_{direction}' for field, direction in keys)
+
+        information = {'key': keys}
+        textfields = [field for field, direction in keys if direction == 'text']
+        if textfields:
+            information = {'key': [('_fts', 'text'), ('_ftsx', 1)], 'weights': {field: 1 for field in textfields}}
+        if unique:
+            information['unique'] = True
+        information.update(options)
+
+        with self.database.lock:
+            if name in self.indexes:
+                if self.indexes[name] != information:
+                    raise OperationFailure(f'An existing index has the same name as the requested index: {name}', code=86)
+                return name
+
+            self.indexes[name] = information
+            self.accesses[name] = 0
+            if unique:
+                index = {}
+                for document in self.documents.values():
+                    if options.get('sparse') and all(resolve(document, field) is MISSING for field, _ in keys):
+                        continue
+                    key = self._key(name, document)
+                    if key in index:
+                        del self.indexes[name]
+                        raise OperationFailure(f'Index build failed: E11000 duplicate key error collection: {self.database.name}.{self.name} index: {name} dup key: {key}', code=11000)
+                    index[key] = document['_id']
+                self.unique[name] = index
+            return name
+
+    def drop_index(self, name: str):
+        with self.database.lock:
+            if name not in self.indexes or name == '_id_':
+                raise OperationFailure(f'index not found with name [{name}]', code=27)
+            del self.indexes[name]
+            self.unique.pop(name, None)
+
+    def drop(self, session=None):
+        self.database.drop_collection(self.name)
+
+class MemorySession:
+    def __init__(self, database):
+        """Client session on a MemoryDatabase. Transactions are not isolated from concurrent operations, but are rolled back (by restoring a snapshot of the database) if they fail.
+        """
+        self.database = database
+        self.snapshot = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.end_session()
+
+    def end_session(self):
+        pass
+
+    def start_transaction(self, **kwargs):
+        return MemoryTransaction(self)
+
+    def with_transaction(self, callback, **kwargs):
+        with self.start_transaction():
+            return callback(self)
+
+class MemoryTransaction:
+    def __init__(self, session: MemorySession):
+        self.session = session
+
+    def __enter__(self):
+        self.snapshot = self.session.database.snapshot()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if type is not None:
+            self.session.database.restore(self.snapshot)
+        return False
+
+class MemoryClient:
+    def __init__(self, database):
+        self.database = database
+
+    def start_session(self, **kwargs):
+        return MemorySession(self.database)
+
+class MemoryDatabase:
+    def __init__(self, name: str):
+        """Create an in-memory database, which implements the subset of the interface of a pymongo database used by the data access objects.
+
+        parameters:
+            name -- the name of the database
+        """
+        self.name = name
+        self.lock = threading.RLock()
+        self.collections = {}
+        self.client = MemoryClient(self)
+
+    def list_collection_names(self, **kwargs):
+        return list(self.collections.keys())
+
+    def create_collection(self, name: str, validator: dict = None, **kwargs):
+        with self.lock:
+            if name in self.collections:
+                raise CollectionInvalid(f'collection {name} already exists')
+            self.collections[name] = MemoryCollection(self, name, validator=validator)
+            return self.collections[name]
+
+    def drop_collection(self, name: str, **kwargs):
+        with self.lock:
+            self.collections.pop(name, None)
+
+    def list_collections(self, filter: dict = None, **kwargs):
+        with self.lock:
+            return [{'name': name, 'type': 'collection', 'options': {'validator': collection.validator} if collection.validator is not None else {}}
+                for name, collection in self.collections.items() if matches({'name': name}, filter or {})]
+
+    def command(self, command: str, value=None, **kwargs):
+        """Run a database command, of which only collMod (replacing the validator of a collection) is supported."""
+        if command != 'collMod':
+            raise OperationFailure(f'no such command: {command}', code=59)
+        with self.lock:
+            if value not in self.collections:
+                raise OperationFailure(f'ns does not exist: {self.name}.{value}', code=26)
+            if 'validator' in kwargs:
+                self.collections[value].validator = kwargs['validator']
+            return {'ok': 1.0}
+
+    def __getitem__(self, name: str):
+        with self.lock:
+            if name not in self.collections:
+                # like MongoDB, collections are created implicitly on first use
+                self.collections[name] = MemoryCollection(self, name)
+            return self.collections[name]
+
+    def snapshot(self):
+        """Capture the state of all collections (stored documents are never modified in place, hence copying the dicts is sufficient)."""
+        with self.lock:
+            return {name: (collection, dict(collection.documents), {index: dict(keys) for index, keys in collection.unique.items()}, dict(collection.indexes))
+                for name, collection in self.collections.items()}
+
+    def restore(self, snapshot: dict):
+        """Restore the state of all collections captured by snapshot."""
+        with self.lock:
+            self.collections = {}
+            for name, (collection, documents, unique, indexes) in snapshot.items():
+                collection.documents, collection.unique, collection.indexes = documents, unique, indexes
+                self.collections[name] = collection
+
+databases = {}
+def getMemoryDatabase(name: str):
+    """Obtain the in-memory database of the given name, which is shared by all data access objects of the process.
+
+    parameters:
+        name -- the name of the database
+
+    returns:
+        database -- the MemoryDatabase
+    """
+    if name not in databases:
+        databases[name] = MemoryDatabase(name)
+    return databases[name]
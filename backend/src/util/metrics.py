@@ -0,0 +1,254 @@
+import functools
+import inspect
+import os
+import threading
+import time
+
+# upper bounds (in seconds) of the buckets of all latency histograms (the default buckets of the Prometheus clients)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# descriptions of the metrics (see https://prometheus.io/docs/instrumenting/exposition_formats/)
+METRICS = {
+    'edutask_http_requests_total': ('counter', 'Number of handled HTTP requests'),
+    'edutask_http_request_duration_seconds': ('histogram', 'Latency of the HTTP requests'),
+    'edutask_http_requests_in_flight': ('gauge', 'Number of HTTP requests currently being handled'),
+    'edutask_dao_operations_total': ('counter', 'Number of data access object operations'),
+    'edutask_dao_operation_errors_total': ('counter', 'Number of data access object operations which raised an exception'),
+    'edutask_dao_operation_duration_seconds': ('histogram', 'Latency of the data access object operations'),
+    'edutask_mongo_pool_connections': ('gauge', 'Number of open connections of the connection pool'),
+    'edutask_mongo_pool_connections_in_use': ('gauge', 'Number of connections of the connection pool which are checked out'),
+    'edutask_mongo_pool_max_connections_in_use': ('gauge', 'Maximum number of connections of the connection pool checked out at once'),
+    'edutask_mongo_pool_checkouts_total': ('counter', 'Number of connection checkouts'),
+    'edutask_mongo_pool_failed_checkouts_total': ('counter', 'Number of failed connection checkouts'),
+    'edutask_mongo_pool_timeouts_total': ('counter', 'Number of connection checkouts which timed out in the wait queue')
+}
+
+class Shard:
+    def __init__(self):
+        """Metrics recorded by one thread. Every shard is only written by its own thread, hence recording needs no lock: the shards are only summed up when the metrics are collected."""
+        self.counters = {}
+        self.histograms = {}
+        # nesting depth of the data access object operations of the thread (only the outermost one is recorded)
+        self.depth = 0
+
+    def count(self, name: str, labels: tuple, value: float = 1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: tuple, value: float):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            # counts per bucket (the last one is unbounded), the sum and the count of the observations
+            histogram = self.histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0, 0]
+        index = 0
+        while index < len(BUCKETS) and value > BUCKETS[index]:
+            index += 1
+        histogram[index] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+    def merge(self, other):
+        """Add the metrics of another shard to this one."""
+        for key, value in other.counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, histogram in other.histograms.items():
+            if key in self.histograms:
+                self.histograms[key] = [a + b for a, b in zip(self.histograms[key], histogram)]
+            else:
+                self.histograms[key] = list(histogram)
+
+# shards of the running threads (with their thread) and the merged metrics of the threads which have ended, such that
+# servers starting a thread per request do not accumulate shards
+shards = []
+retired = Shard()
+local = threading.local()
+lock = threading.Lock()
+limit = 64
+
+def getShard():
+    """Obtain the shard of the current thread, which is created (and registered under a lock) on first use only."""
+    global limit
+    shard = getattr(local, 'shard', None)
+    if shard is None:
+        shard = local.shard = Shard()
+        with lock:
+            shards.append((threading.current_thread(), shard))
+            if len(shards) > limit:
+                retire()
+                limit = max(64, 2 * len(shards))
+    return shard
+
+def retire():
+    """Merge the shards of the threads which have ended into the retired shard (must be called holding the lock)."""
+    for thread, shard in list(shards):
+        if not thread.is_alive():
+            retired.merge(shard)
+            shards.remove((thread, shard))
+
+def resetMetrics():
+    """Forget all shards, e.g., in a forked child process, which must not report the metrics of its parent."""
+    global local, lock, retired, limit
+    shards.clear()
+    retired = Shard()
+    local = threading.local()
+    lock = threading.Lock()
+    limit = 64
+
+os.register_at_fork(after_in_child=resetMetrics)
+
+def request_started():
+    """Record the start of an HTTP request.
+
+    returns:
+        start -- the start time, to be passed to request_finished
+    """
+    getShard().count('edutask_http_requests_in_flight', ())
+    return time.perf_counter()
+
+def request_finished(start: float, route: str, method: str, status: int):
+    """Record a finished HTTP request.
+
+    parameters:
+        start -- the start time returned by request_started
+        route -- the rule of the route (e.g., /users/<id>), such that all requests of a route share their labels
+        method -- the HTTP method
+        status -- the HTTP status code of the response
+    """
+    shard = getShard()
+    shard.count('edutask_http_requests_in_flight', (), -1)
+    shard.count('edutask_http_requests_total', (('route', route), ('method', method), ('status', str(status))))
+    shard.observe('edutask_http_request_duration_seconds', (('route', route), ('method', method)), time.perf_counter() - start)
+
+def instrument(operation):
+    """Decorator of the methods of the data access object, which records the number of calls, the errors and the latency of every operation per collection. Operations called by other operations (e.g., iter_find by find) are only recorded as part of the outermost one. The latency of a generator (like iter_find) is the time spent producing its items, and it is recorded once the generator is exhausted or closed.
+    """
+    name = operation.__name__
+
+    if inspect.isgeneratorfunction(operation):
+        @functools.wraps(operation)
+        def generator(self, *args, **kwargs):
+            shard = getShard()
+            if shard.depth > 0:
+                yield from operation(self, *args, **kwargs)
+                return
+            elapsed = 0.0
+            failed = False
+            try:
+                iterator = operation(self, *args, **kwargs)
+                while True:
+                    # only the production of the items is timed, not the work of the consumer in between
+                    start = time.perf_counter()
+                    shard.depth += 1
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        break
+                    finally:
+                        shard.depth -= 1
+                        elapsed += time.perf_counter() - start
+                    yield item
+            except Exception as e:
+                failed = True
+                raise
+            finally:
+                record(shard, self.collection_name, name, elapsed, failed)
+        return generator
+
+    @functools.wraps(operation)
+    def wrapper(self, *args, **kwargs):
+        shard = getShard()
+        if shard.depth > 0:
+            return operation(self, *args, **kwargs)
+        start = time.perf_counter()
+        failed = False
+        shard.depth += 1
+        try:
+            return operation(self, *args, **kwargs)
+        except Exception as e:
+            failed = True
+            raise
+        finally:
+            shard.depth -= 1
+            record(shard, self.collection_name, name, time.perf_counter() - start, failed)
+    return wrapper
+
+def record(shard: Shard, collection: str, operation: str, duration: float, failed: bool):
+    labels = (('collection', collection), ('operation', operation))
+    shard.count('edutask_dao_operations_total', labels)
+    if failed:
+        shard.count('edutask_dao_operation_errors_total', labels)
+    shard.observe('edutask_dao_operation_duration_seconds', labels, duration)
+
+def collect():
+    """Sum up the metrics of all shards.
+
+    returns:
+        counters -- dict mapping (name, labels) to the summed up value
+        histograms -- dict mapping (name, labels) to the summed up bucket counts, sum and count
+    """
+    total = Shard()
+    with lock:
+        retire()
+        total.merge(retired)
+        current = [shard for _, shard in shards]
+    for shard in current:
+        # copying a dict is atomic, hence the owning thread can continue to record in the meantime
+        copy = Shard()
+        copy.counters, copy.histograms = dict(shard.counters), {key: list(histogram) for key, histogram in dict(shard.histograms).items()}
+        total.merge(copy)
+    return total.counters, total.histograms
+
+def format_labels(labels: tuple):
+    if not labels:
+        return ''
+    escaped = [(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for key, value in labels]
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+def format_value(value: float):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def exposition(pools: dict = None):
+    """Render all metrics in the Prometheus text exposition format (version 0.0.4).
+
+    parameters:
+        pools -- optional statistics of the connection pools (see src.util.clients.getPoolStatistics)
+
+    returns:
+        text -- the metrics
+    """
+    counters, histograms = collect()
+    if pools:
+        for address, pool in pools.items():
+            labels = (('address', address),)
+            counters[('edutask_mongo_pool_connections', labels)] = pool['open']
+            counters[('edutask_mongo_pool_connections_in_use', labels)] = pool['in_use']
+            counters[('edutask_mongo_pool_max_connections_in_use', labels)] = pool['max_in_use']
+            counters[('edutask_mongo_pool_checkouts_total', labels)] = pool['checkouts']
+            counters[('edutask_mongo_pool_failed_checkouts_total', labels)] = pool['failed_checkouts']
+            counters[('edutask_mongo_pool_timeouts_total', labels)] = pool['timeouts']
+    counters.setdefault(('edutask_http_requests_in_flight', ()), 0)
+
+    lines = []
+    for name, (type, description) in METRICS.items():
+        if type == 'histogram':
+            series = sorted((labels, histogram) for (metric, labels), histogram in histograms.items() if metric == name)
+        else:
+            series = sorted((labels, value) for (metric, labels), value in counters.items() if metric == name)
+        if not series:
+            continue
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {type}')
+        for labels, value in series:
+            if type == 'histogram':
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float('inf'),), value[:-2]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{format_labels(labels + (("le", format_value(float(bound))),))} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {format_value(value[-2])}')
+                lines.append(f'{name}_count{format_labels(labels)} {value[-1]}')
+            else:
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+    return '\n'.join(lines) + '\n'
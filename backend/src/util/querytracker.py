@@ -0,0 +1,128 @@
+import contextlib
+import contextvars
+import json
+import threading
+
+from bson.objectid import ObjectId
+
+class QueryTracker:
+    def __init__(self):
+        """Request-scoped record of the queries (i.e., database commands and hence round trips) issued while handling one request. Queries of the same shape, which only differ in their values, are grouped, such that repeated per-item queries (N+1 queries) can be detected.
+        """
+        self.lock = threading.Lock()
+        self.queries = []
+
+    def record(self, command: str, collection: str, specification=None):
+        """Record one query.
+
+        parameters:
+            command -- the name of the database command (e.g., find, aggregate, insert, update, delete)
+            collection -- the name of the collection
+            specification -- the filter (or pipeline) of the query, whose shape is recorded
+        """
+        query = (command, collection, shape(specification))
+        with self.lock:
+            self.queries.append(query)
+
+    @property
+    def count(self):
+        """The number of recorded queries."""
+        return len(self.queries)
+
+    def repeated(self, threshold: int = 2, start: int = 0):
+        """Obtain the groups of queries of the same shape which have been issued at least threshold times.
+
+        parameters:
+            threshold -- minimum number of queries of the same shape
+            start -- optionally, the number of earlier queries which are not considered
+
+        returns:
+            groups -- list of dicts containing the command, collection, shape and count of each group (most frequent first)
+        """
+        groups = {}
+        with self.lock:
+            for query in self.queries[start:]:
+                groups[query] = groups.get(query, 0) + 1
+        return sorted(({'command': command, 'collection': collection, 'shape': specification, 'count': count}
+            for (command, collection, specification), count in groups.items() if count >= threshold), key=lambda group: -group['count'])
+
+    def summary(self, start: int = 0):
+        """Obtain a readable summary of the recorded queries (grouped by their shape), optionally without the given number of earlier queries."""
+        return '\n'.join(f'{group["count"]} x {group["command"]} {group["collection"]} {group["shape"]}' for group in self.repeated(threshold=1, start=start))
+
+def shape(specification):
+    """Obtain the shape of a query, i.e., its structure where every value is replaced by its type (lists by the distinct shapes of their elements), as a canonical string.
+
+    parameters:
+        specification -- the filter (or pipeline) of the query
+
+    returns:
+        shape -- string representing the shape (or None if there is no specification)
+    """
+    def strip(value):
+        if isinstance(value, dict):
+            return {key: strip(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            # the elements of distinct shapes in the order of their first occurrence (e.g., the stages of a pipeline)
+            items = {}
+            for item in value:
+                item = strip(item)
+                items.setdefault(json.dumps(item, sort_keys=True), item)
+            return list(items.values())
+        if isinstance(value, ObjectId):
+            return '<ObjectId>'
+        return f'<{type(value).__name__}>'
+    if specification is None:
+        return None
+    return json.dumps(strip(specification), sort_keys=True)
+
+# the tracker of the current request (or test), which is also propagated to the threads of the async data access objects
+current = contextvars.ContextVar('querytracker', default=None)
+
+def record(command: str, collection: str, specification=None):
+    """Record a query in the tracker of the current context (if any), see QueryTracker.record."""
+    tracker = current.get()
+    if tracker is not None:
+        tracker.record(command, collection, specification)
+
+@contextlib.contextmanager
+def track():
+    """Track the queries issued within the context (unless an enclosing context already tracks them, which then also receives these queries).
+
+    returns:
+        tracker -- the QueryTracker of the context
+    """
+    tracker = current.get()
+    if tracker is not None:
+        yield tracker
+        return
+    tracker = QueryTracker()
+    token = current.set(tracker)
+    try:
+        yield tracker
+    finally:
+        current.reset(token)
+
+@contextlib.contextmanager
+def querybudget(maximum: int, repeated: int = None):
+    """Assert that the code within the context issues at most the given number of queries (e.g., in a test of an endpoint, such that N+1 regressions fail). Within an enclosing tracked context, only the queries issued within this context count against the budget.
+
+    parameters:
+        maximum -- the maximum number of queries
+        repeated -- optionally, the maximum number of queries of the same shape
+
+    returns:
+        tracker -- the QueryTracker of the context
+
+    raises:
+        AssertionError -- in case the budget is exceeded
+    """
+    with track() as tracker:
+        # the queries recorded before by an enclosing context
+        start = tracker.count
+        yield tracker
+    count = tracker.count - start
+    if count > maximum:
+        raise AssertionError(f'Query budget exceeded: {count} queries instead of at most {maximum}:\n{tracker.summary(start=start)}')
+    if repeated is not None and tracker.repeated(threshold=repeated + 1, start=start):
+        raise AssertionError(f'More than {repeated} queries of the same shape:\n{tracker.summary(start=start)}')
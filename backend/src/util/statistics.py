@@ -0,0 +1,223 @@
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+
+from bson.objectid import ObjectId
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from src.util.config import getConfig
+from src.util.dao import DAO
+from src.util.daos import getDao
+
+class Statistics:
+    def __init__(self, dao: DAO, users_dao: DAO, tasks_dao: DAO, todos_dao: DAO, ttl: float = 300, categories: int = 10):
+        """Figures about the users, tasks and todos, which are computed by aggregation pipelines on the database instead of reading all users and tasks. The figures of one user are computed on every request, as they only cover the tasks of that user. The global figures cover whole collections: they are stored in the statistic collection and served from there, while they are recomputed in the background at most once per time to live (see overview).
+
+        parameters:
+            dao -- data access object of the statistic collection, which stores the global figures
+            users_dao, tasks_dao, todos_dao -- data access objects of the user, task and todo collections
+            ttl -- number of seconds after which the global figures are recomputed
+            categories -- number of the most used categories which are reported
+        """
+        self.dao = dao
+        self.users_dao = users_dao
+        self.tasks_dao = tasks_dao
+        self.todos_dao = todos_dao
+        self.ttl = ttl
+        self.categories = categories
+
+    def of_user(self, userid: str):
+        """Compute the figures of a user: the number of its tasks, of its overdue tasks (see task_stages) and of its (done) todos, and its most used categories.
+
+        parameters:
+            userid -- the unique identifier of the user
+
+        returns:
+            figures -- dict containing the 'tasks' ({'total': ..., 'overdue': ...}), the 'todos' ({'total': ..., 'done': ..., 'completion': ...}) and the 'categories' ([{'category': ..., 'tasks': ...}])
+            None -- if no user is associated to the given id
+
+        raises:
+            bson.errors.InvalidId -- in case the id is not valid
+            Exception -- in case any database operation fails
+        """
+        try:
+            now = utcnow()
+            match = {'$match': {'_id': ObjectId(userid)}}
+            totals = self.users_dao.aggregate([
+                match,
+                {'$lookup': {'from': self.tasks_dao.collection_name, 'localField': 'tasks', 'foreignField': '_id', 'as': 'tasks', 'pipeline': self.task_stages(now)}},
+                {'$unwind': {'path': '$tasks', 'preserveNullAndEmptyArrays': True}},
+                {'$group': {
+                    '_id': '$_id',
+                    'tasks': {'$sum': {'$cond': [{'$ifNull': ['$tasks', False]}, 1, 0]}},
+                    'overdue': {'$sum': {'$cond': ['$tasks.overdue', 1, 0]}},
+                    'todos': {'$sum': '$tasks.todos'},
+                    'done': {'$sum': '$tasks.done'}
+                }}
+            ])
+            if not totals:
+                return None
+            categories = self.users_dao.aggregate([
+                match,
+                {'$lookup': {'from': self.tasks_dao.collection_name, 'localField': 'tasks', 'foreignField': '_id', 'as': 'tasks', 'pipeline': [{'$project': {'categories': 1}}]}},
+                {'$unwind': '$tasks'},
+                {'$project': {'category': '$tasks.categories'}}
+            ] + self.category_stages('$category'))
+            return figures(totals[0], categories)
+        except Exception as e:
+            raise
+
+    def overview(self):
+        """Obtain the global figures: the number of users and tasks, the tasks per user, the number of overdue tasks and of (done) todos, and the most used categories. The stored figures are served as they are; if they are older than the time to live, one process claims their recomputation (via a conditional update of the stored figures) and recomputes them in a background thread, such that no request waits for an aggregation over whole collections. Only if no figures are stored yet (e.g., before the first refresh via python -m src.util.statistics), they are computed within the request.
+
+        returns:
+            overview -- dict containing the figures (see compute) and the time they have been 'computed' at
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        try:
+            stored = self.dao.find_one_by({'name': 'overview'})
+            if stored is None:
+                return self.refresh()
+            now = utcnow()
+            # only one of the concurrent requests (of any process) claims the expired figures
+            if self.dao.update_by({'name': 'overview', 'claimed': {'$lte': now - timedelta(seconds=self.ttl)}}, {'$set': {'claimed': now}}):
+                threading.Thread(target=self._refresh, name='statistics', daemon=True).start()
+            return dict(stored['figures'], computed=stored['computed'])
+        except Exception as e:
+            raise
+
+    def refresh(self):
+        """Compute the global figures and store them (see overview).
+
+        returns:
+            overview -- dict containing the figures (see compute) and the time they have been 'computed' at
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        try:
+            now = utcnow()
+            result = self.compute(now)
+            try:
+                self.dao.bulk_write([ReplaceOne({'name': 'overview'}, {'name': 'overview', 'figures': result, 'computed': now, 'claimed': now}, upsert=True)])
+            except (BulkWriteError, DuplicateKeyError):
+                # the figures have been stored concurrently by another process
+                pass
+            return self.dao.to_json(dict(result, computed=now))
+        except Exception as e:
+            raise
+
+    def compute(self, now: datetime):
+        """Compute the global figures by aggregation pipelines over the user, task and todo collections.
+
+        parameters:
+            now -- the current time (naive UTC), before which the due date of an overdue task lies
+
+        returns:
+            figures -- dict containing the number of 'users', the 'tasks' ({'total': ..., 'perUser': ..., 'max': ..., 'overdue': ...}), the 'todos' ({'total': ..., 'done': ..., 'completion': ...}) and the 'categories' ([{'category': ..., 'tasks': ...}])
+        """
+        # the ids of deleted tasks may remain in the tasks of their user, hence only the existing tasks are counted
+        users = self.users_dao.aggregate([
+            {'$lookup': {'from': self.tasks_dao.collection_name, 'localField': 'tasks', 'foreignField': '_id', 'as': 'tasks', 'pipeline': [{'$project': {'_id': 1}}]}},
+            {'$project': {'tasks': {'$size': '$tasks'}}},
+            {'$group': {'_id': None, 'users': {'$sum': 1}, 'tasks': {'$sum': '$tasks'}, 'max': {'$max': '$tasks'}}}
+        ])
+        users = users[0] if users else {'users': 0, 'tasks': 0, 'max': 0}
+        count = {'$group': {'_id': None, 'todos': {'$sum': 1}, 'done': {'$sum': {'$cond': [{'$eq': ['$done', True]}, 1, 0]}}}}
+        # the todos are stored in the todo collection or embedded in their tasks (see src.util.taskstorage)
+        referenced = self.todos_dao.aggregate([count])
+        embedded = self.tasks_dao.aggregate([
+            {'$match': {'todos': {'$elemMatch': {'_id': {'$exists': True}}}}},
+            {'$unwind': '$todos'},
+            {'$match': {'todos._id': {'$exists': True}}},
+            {'$project': {'done': '$todos.done'}},
+            count
+        ])
+        todos = {key: sum(result[key] for result in referenced + embedded) for key in ['todos', 'done']}
+        # only the tasks which are due already are populated (via the duedate index)
+        overdue = self.tasks_dao.aggregate([{'$match': {'duedate': {'$lt': now}}}] + self.task_stages(now) + [{'$match': {'overdue': True}}, {'$count': 'overdue'}])
+        categories = self.tasks_dao.aggregate([{'$project': {'categories': 1}}] + self.category_stages('$categories'))
+
+        result = figures({'tasks': users['tasks'], 'overdue': overdue[0]['overdue'] if overdue else 0, **todos}, categories)
+        result['users'] = users['users']
+        result['tasks']['perUser'] = users['tasks'] / users['users'] if users['users'] else None
+        result['tasks']['max'] = users['max'] or 0
+        return result
+
+    def task_stages(self, now: datetime):
+        """Obtain the aggregation pipeline stages which reduce a task to the number of its todos, the number of its done todos and whether it is overdue, i.e., its due date has passed while some of its todos are not done. Referenced as well as embedded todos are counted, such that the figures are complete in both storage modes and while the tasks are migrated (see src.util.taskstorage).
+
+        parameters:
+            now -- the current time (naive UTC)
+
+        returns:
+            stages -- list of aggregation pipeline stages
+        """
+        return [
+            {'$lookup': {'from': self.todos_dao.collection_name, 'localField': 'todos', 'foreignField': '_id', 'as': 'referencedTodos', 'pipeline': [{'$project': {'done': 1}}]}},
+            {'$project': {'duedate': 1, 'todos': {'$concatArrays': [
+                {'$filter': {'input': {'$ifNull': ['$todos', []]}, 'cond': {'$eq': [{'$type': '$$this'}, 'object']}}},
+                '$referencedTodos'
+            ]}}},
+            {'$project': {'duedate': 1, 'todos': {'$size': '$todos'}, 'done': {'$size': {'$filter': {'input': '$todos', 'cond': {'$eq': ['$$this.done', True]}}}}}},
+            {'$project': {'todos': 1, 'done': 1, 'overdue': {'$cond': [
+                {'$eq': [{'$type': '$duedate'}, 'date']},
+                {'$and': [{'$lt': ['$duedate', now]}, {'$lt': ['$done', '$todos']}]},
+                False
+            ]}}}
+        ]
+
+    def category_stages(self, path: str):
+        """Obtain the aggregation pipeline stages which count the tasks per category (given by the path to the categories of a task) and keep the most used categories."""
+        return [
+            {'$unwind': path},
+            {'$group': {'_id': path, 'tasks': {'$sum': 1}}},
+            {'$sort': {'tasks': -1, '_id': 1}},
+            {'$limit': self.categories}
+        ]
+
+    def _refresh(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            # the figures are claimed again once the time to live has passed
+            print(f'{e.__class__.__name__}: {e}')
+
+def utcnow():
+    """The current time as a naive UTC datetime, like the dates read from MongoDB."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def figures(totals: dict, categories: list):
+    """Shape the counts of the tasks and todos and the counted categories into the reported figures."""
+    return {
+        'tasks': {'total': totals['tasks'], 'overdue': totals['overdue']},
+        'todos': {'total': totals['todos'], 'done': totals['done'], 'completion': totals['done'] / totals['todos'] if totals['todos'] else None},
+        'categories': [{'category': category['_id'], 'tasks': category['tasks']} for category in categories]
+    }
+
+statistics = None
+def getStatistics():
+    """Obtain the statistics of the app (see Statistics), which use the data access objects of the statistic, user, task and todo collections (see src.util.daos.getDao). The time to live of the global figures in seconds and the number of reported categories are configured via STATISTICS_TTL (default 300) and STATISTICS_CATEGORIES (default 10).
+
+    returns:
+        statistics -- Statistics
+    """
+    global statistics
+    if statistics is None:
+        config = getConfig()
+        statistics = Statistics(getDao(collection_name='statistic'), users_dao=getDao(collection_name='user'), tasks_dao=getDao(collection_name='task'),
+            todos_dao=getDao(collection_name='todo'), ttl=float(config.get('STATISTICS_TTL', 300)), categories=int(config.get('STATISTICS_CATEGORIES', 10)))
+    return statistics
+
+def main():
+    parser = argparse.ArgumentParser(description='Recompute and store the global statistics (e.g., periodically or after a deployment)')
+    parser.parse_args()
+
+    overview = getStatistics().refresh()
+    print(f'computed the statistics of {overview["users"]} users and {overview["tasks"]["total"]} tasks')
+
+if __name__ == '__main__':
+    main()
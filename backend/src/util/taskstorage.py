@@ -0,0 +1,358 @@
+# coding=utf-8
+"""Storage modes of tasks and a migration between them. In the reference mode (default), the video and the todos of
+a task are stored in the video and todo collections and the task contains their ids. In the embedded mode, the task
+contains the video and todo objects themselves (with the same _id properties), such that a task is read and written
+as one single document. The JSON representation of a populated task is the same in both modes.
+
+The mode is selected by the configuration value TASK_STORAGE (reference or embedded) and determines where new tasks
+and todos are stored. Reads and writes handle both layouts (even within one task), such that the server keeps
+running while the existing tasks are converted in batches by the migration:
+
+    python -m src.util.taskstorage --to embedded|reference [--batch-size 500] [--pause 0.1] [--max-batches N]
+
+The migration must run towards the configured mode: the controllers modify a todo where the configured mode stores
+it first, such that the copies left behind by the migration are not modified anymore and can be reconciled. Its
+progress is stored in the migration collection, and an interrupted migration resumes after the last completed
+batch.
+"""
+import argparse
+import copy
+import time
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, UpdateOne, ReplaceOne, DeleteOne
+
+from src.util.bsonjson import from_json
+from src.util.config import getConfig
+from src.util.dao import DAO
+from src.util.daos import getDao
+
+STORAGES = ['reference', 'embedded']
+
+def getTaskStorage():
+    """Obtain the configured storage mode of tasks (configuration value TASK_STORAGE, default reference).
+
+    returns:
+        storage -- either 'reference' or 'embedded'
+
+    raises:
+        ValueError -- in case the configured value is not a storage mode
+    """
+    storage = getConfig().get('TASK_STORAGE', 'reference').lower()
+    if storage not in STORAGES:
+        raise ValueError(f'Unknown task storage {storage} (expected one of {", ".join(STORAGES)})')
+    return storage
+
+def is_reference(value):
+    """Check whether the (json) value of a video or todo is a reference (an id) rather than an embedded object."""
+    return isinstance(value, dict) and '$oid' in value
+
+def references(tasks: list):
+    """Collect the ids of the videos and todos which the given (json) tasks reference rather than embed.
+
+    returns:
+        videoids -- list of the referenced video ids
+        todoids -- list of the referenced todo ids
+    """
+    videoids = [task['video']['$oid'] for task in tasks if is_reference(task.get('video'))]
+    todoids = [todo['$oid'] for task in tasks for todo in task.get('todos') or [] if is_reference(todo)]
+    return videoids, todoids
+
+def refers(task: dict):
+    """Check whether a (json) task references its video or any of its todos."""
+    videoids, todoids = references([task])
+    return bool(videoids or todoids)
+
+def embeds(task: dict):
+    """Check whether a (json) task embeds its video or any of its todos."""
+    video = task.get('video')
+    return (isinstance(video, dict) and not is_reference(video)) or any(not is_reference(todo) for todo in task.get('todos') or [])
+
+def substitute(tasks: list, videos: dict, todos: dict):
+    """Replace the references of the given (json) tasks by the referenced objects, keeping the order of the todos. References to objects which do not exist (anymore) are dropped, like $lookup does.
+
+    parameters:
+        tasks -- list of json tasks, which are modified in place
+        videos -- dict mapping video ids to the video objects
+        todos -- dict mapping todo ids to the todo objects
+
+    returns:
+        tasks -- the given tasks
+    """
+    for task in tasks:
+        if is_reference(task.get('video')):
+            task['video'] = videos.get(task['video']['$oid'])
+        if task.get('todos'):
+            task['todos'] = [todos[todo['$oid']] if is_reference(todo) else todo for todo in task['todos']
+                if not is_reference(todo) or todo['$oid'] in todos]
+    return tasks
+
+def embedded_todo(task: dict, id: str):
+    """Obtain the todo with the given id embedded in a (json) task.
+
+    returns:
+        todo -- the embedded todo object
+        None -- if the task is None or does not embed the todo
+    """
+    if task is None:
+        return None
+    return next((todo for todo in task.get('todos') or [] if not is_reference(todo) and todo['_id']['$oid'] == str(id)), None)
+
+def positional(data: dict):
+    """Translate the update data of a todo (see Controller.update) into the update of the task embedding it, where the positional operator $ refers to the todo matched by the filter {'todos._id': ...}.
+
+    parameters:
+        data -- dict of update operators (e.g., {'$set': {'done': True}}) or the new properties of the todo
+
+    returns:
+        update_data -- dict of update operators on the task
+    """
+    if not any(key.startswith('$') for key in data):
+        return {'$set': {f'todos.$.{key}': value for key, value in data.items() if key != '_id'}}
+    return {operator: {f'todos.$.{key}': value for key, value in fields.items()} for operator, fields in data.items()}
+
+def unchanged(task: dict):
+    """Obtain the filter matching a task only while its video and todos are still those of the given (json) task."""
+    filter = {'_id': ObjectId(task['_id']['$oid'])}
+    for key in ['video', 'todos']:
+        filter[key] = from_json(task[key]) if key in task else {'$exists': False}
+    return filter
+
+class Migration:
+    # key of the progress document in the migration collection
+    KEY = 'taskstorage'
+    # number of attempts to convert a batch whose tasks are modified concurrently
+    ATTEMPTS = 10
+
+    def __init__(self, tasks_dao: DAO, videos_dao: DAO, todos_dao: DAO, migrations_dao: DAO):
+        """Online migration of the stored tasks between the reference and the embedded storage mode. The tasks are processed in batches in the order of their ids. Every task is converted by a conditional update, which only applies if the video and todos of the task have not changed since they were read, and is retried otherwise, such that no concurrent modification of a task is lost.
+
+        parameters:
+            tasks_dao -- data access object of the task collection
+            videos_dao -- data access object of the video collection
+            todos_dao -- data access object of the todo collection
+            migrations_dao -- data access object of the migration collection, which stores the progress
+        """
+        self.tasks_dao = tasks_dao
+        self.videos_dao = videos_dao
+        self.todos_dao = todos_dao
+        self.migrations_dao = migrations_dao
+
+    def status(self):
+        """Obtain the progress of the last (or current) migration.
+
+        returns:
+            state -- dict containing the target storage mode, the id of the last processed task (after), the number of converted tasks and whether the migration is complete
+            None -- if no migration has been started yet
+        """
+        try:
+            return self.migrations_dao.find_one_by({'_id': self.KEY})
+        except Exception as e:
+            raise
+
+    def run(self, target: str, batch_size: int = 500, pause: float = 0, max_batches: int = None, report=None):
+        """Convert the stored tasks to the target storage mode, resuming after the last completed batch of an interrupted migration towards the same mode.
+
+        parameters:
+            target -- the target storage mode (reference or embedded)
+            batch_size -- number of tasks per batch
+            pause -- seconds to wait between two batches, to limit the load on the database
+            max_batches -- optional maximum number of batches processed by this call (the migration can be resumed later)
+            report -- optional function which is called with the state after every batch
+
+        returns:
+            state -- dict containing the target, the id of the last processed task, the number of converted tasks and whether the migration is complete
+
+        raises:
+            ValueError -- in case the target is not a storage mode
+            RuntimeError -- in case the tasks of a batch keep changing
+            Exception -- in case any database operation fails
+        """
+        if target not in STORAGES:
+            raise ValueError(f'Unknown task storage {target} (expected one of {", ".join(STORAGES)})')
+        convert = self._embed if target == 'embedded' else self._reference
+
+        state = self.status()
+        if state is None or state['target'] != target or state['complete']:
+            state = {'target': target, 'after': None, 'converted': 0, 'complete': False}
+        after = ObjectId(state['after']['$oid']) if state['after'] else None
+
+        batches = 0
+        try:
+            while max_batches is None or batches < max_batches:
+                if batches and pause:
+                    time.sleep(pause)
+                tasks = list(self.tasks_dao.iter_find(filter={'_id': {'$gt': after}} if after else {},
+                    projection={'video': 1, 'todos': 1}, sort=[('_id', ASCENDING)], limit=batch_size))
+                if not tasks:
+                    state['complete'] = True
+                    self._save(state)
+                    break
+
+                pending = [task for task in tasks if (embeds(task) if target == 'reference' else refers(task))]
+                for _ in range(self.ATTEMPTS):
+                    if not pending:
+                        break
+                    converted, pending = convert(pending)
+                    state['converted'] += converted
+                else:
+                    raise RuntimeError(f'{len(pending)} tasks kept changing during the migration, retry later')
+
+                after = ObjectId(tasks[-1]['_id']['$oid'])
+                state['after'] = {'$oid': str(after)}
+                self._save(state)
+                batches += 1
+                if report is not None:
+                    report(state)
+            return state
+        except Exception as e:
+            raise
+
+    def _save(self, state: dict):
+        document = from_json({key: value for key, value in state.items() if key != '_id'})
+        self.migrations_dao.bulk_write([ReplaceOne({'_id': self.KEY}, document, upsert=True)])
+
+    def _converted(self, tasks: list, requests: list, convertible):
+        """Execute the conditional updates of the given tasks (one per task) and determine which tasks have been converted.
+
+        returns:
+            converted -- list of the given tasks which have been converted
+            pending -- list of the current versions of the tasks which still need to be converted
+        """
+        result = self.tasks_dao.bulk_write(requests, ordered=False)
+        if result.matched_count == len(requests):
+            return tasks, []
+        # some tasks have been modified (or deleted) concurrently
+        current = {task['_id']['$oid']: task for task in self.tasks_dao.find_by_ids([task['_id']['$oid'] for task in tasks], projection={'video': 1, 'todos': 1})['found']}
+        converted = [task for task in tasks if task['_id']['$oid'] in current and not convertible(current[task['_id']['$oid']])]
+        pending = [task for task in current.values() if convertible(task)]
+        return converted, pending
+
+    def _embed(self, tasks: list):
+        """Embed the referenced videos and todos into the given tasks. After a task has been converted, the controllers only modify its embedded todos (in the embedded mode), hence modifications of the referenced todos which happened in between are carried over to the embedded copies before the referenced objects are removed.
+
+        returns:
+            n -- number of converted tasks
+            pending -- list of the tasks which still need to be converted (as they have been modified concurrently)
+        """
+        videoids, todoids = references(tasks)
+        videos = {video['_id']['$oid']: video for video in self.videos_dao.find_by_ids(videoids)['found']} if videoids else {}
+        todos = {todo['_id']['$oid']: todo for todo in self.todos_dao.find_by_ids(todoids)['found']} if todoids else {}
+
+        requests = []
+        for task in tasks:
+            embedded = substitute([copy.deepcopy(task)], videos, todos)[0]
+            update = {}
+            if 'todos' in task:
+                update['$set'] = {'todos': from_json(embedded['todos'])}
+            if 'video' in task:
+                if embedded['video'] is None:
+                    update['$unset'] = {'video': ''}
+                else:
+                    update.setdefault('$set', {})['video'] = from_json(embedded['video'])
+            requests.append(UpdateOne(unchanged(task), update))
+        converted, pending = self._converted(tasks, requests, refers)
+
+        # the referenced todos of the converted tasks are not modified anymore: carry over their last modifications
+        videoids, todoids = references(converted)
+        current = {todo['_id']['$oid']: todo for todo in self.todos_dao.find_by_ids(todoids)['found']} if todoids else {}
+        patches = []
+        for task in converted:
+            for todo in task.get('todos') or []:
+                if not is_reference(todo) or todo['$oid'] not in todos or current.get(todo['$oid']) == todos[todo['$oid']]:
+                    continue
+                filter = {'_id': ObjectId(task['_id']['$oid']), 'todos': {'$elemMatch': from_json(todos[todo['$oid']])}}
+                if todo['$oid'] in current:
+                    patches.append(UpdateOne(filter, {'$set': {'todos.$': from_json(current[todo['$oid']])}}))
+                else:
+                    patches.append(UpdateOne(filter, {'$pull': {'todos': {'_id': ObjectId(todo['$oid'])}}}))
+        if patches:
+            self.tasks_dao.bulk_write(patches, ordered=False)
+
+        self.videos_dao.delete_many(videoids)
+        self.todos_dao.delete_many(todoids)
+        return len(converted), pending
+
+    def _reference(self, tasks: list):
+        """Move the embedded videos and todos of the given tasks into their collections (keeping their ids) and replace them by references. Once a referenced copy exists, the controllers only modify the copy (in the reference mode), hence modifications of the embedded todos which happened before are carried over to the copies before the tasks are converted.
+
+        returns:
+            n -- number of converted tasks
+            pending -- list of the tasks which still need to be converted (as they have been modified concurrently)
+        """
+        videos = {task['video']['_id']['$oid']: task['video'] for task in tasks if isinstance(task.get('video'), dict) and not is_reference(task['video'])}
+        todos = {todo['_id']['$oid']: todo for task in tasks for todo in task.get('todos') or [] if not is_reference(todo)}
+
+        # create the copies, unless they already exist (e.g., from an interrupted attempt), as they may have been modified since
+        for dao, objects in [(self.videos_dao, list(videos.values())), (self.todos_dao, list(todos.values()))]:
+            if objects:
+                dao.bulk_write([UpdateOne({'_id': ObjectId(obj['_id']['$oid'])},
+                    {'$setOnInsert': from_json({key: value for key, value in obj.items() if key != '_id'})}, upsert=True) for obj in objects], ordered=False)
+
+        # the embedded todos are not modified anymore: carry over their modifications since they were read
+        current = {task['_id']['$oid']: task for task in self.tasks_dao.find_by_ids([task['_id']['$oid'] for task in tasks], projection={'video': 1, 'todos': 1})['found']}
+        embedded = {todo['_id']['$oid']: todo for task in current.values() for todo in task.get('todos') or [] if not is_reference(todo)}
+        # the copies of the videos of tasks which have been deleted in the meantime are removed again
+        self.videos_dao.delete_many([id for id in videos if not any((task.get('video') or {}).get('_id', {}).get('$oid') == id for task in current.values())])
+        patches = []
+        for id, todo in todos.items():
+            if embedded.get(id) == todo:
+                continue
+            filter = from_json(todo)
+            if id in embedded:
+                patches.append(ReplaceOne(filter, from_json(embedded[id])))
+            else:
+                patches.append(DeleteOne(filter))
+        if patches:
+            self.todos_dao.bulk_write(patches, ordered=False)
+
+        requests = []
+        current = [task for task in current.values() if embeds(task)]
+        for task in current:
+            update = {}
+            if isinstance(task.get('video'), dict) and not is_reference(task['video']):
+                update['video'] = ObjectId(task['video']['_id']['$oid'])
+            if task.get('todos'):
+                update['todos'] = [ObjectId(todo['$oid'] if is_reference(todo) else todo['_id']['$oid']) for todo in task['todos']]
+            requests.append(UpdateOne(unchanged(task), {'$set': update}))
+        if not requests:
+            return 0, []
+        converted, pending = self._converted(current, requests, embeds)
+        return len(converted), pending
+
+migration = None
+def getMigration():
+    """Obtain the migration of the stored tasks (see Migration), which uses the data access objects of the task, video, todo and migration collections (see src.util.daos.getDao).
+
+    returns:
+        migration -- Migration
+    """
+    global migration
+    if migration is None:
+        migration = Migration(getDao(collection_name='task'), getDao(collection_name='video'), getDao(collection_name='todo'), getDao(collection_name='migration'))
+    return migration
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the stored tasks between the reference and the embedded storage mode')
+    parser.add_argument('--to', choices=STORAGES, help='target storage mode (must be the configured TASK_STORAGE)')
+    parser.add_argument('--batch-size', type=int, default=500, help='number of tasks per batch')
+    parser.add_argument('--pause', type=float, default=0, help='seconds to wait between two batches')
+    parser.add_argument('--max-batches', type=int, default=None, help='stop after this number of batches (the migration can be resumed later)')
+    parser.add_argument('--status', action='store_true', help='only print the progress of the last migration')
+    args = parser.parse_args()
+
+    migration = getMigration()
+    if args.status:
+        print(migration.status())
+        return
+    if args.to is None:
+        parser.error('the target storage mode (--to) is required')
+    if getTaskStorage() != args.to:
+        parser.error(f'the server must store new tasks in the target mode first: set TASK_STORAGE={args.to} (currently {getTaskStorage()})')
+
+    state = migration.run(args.to, batch_size=args.batch_size, pause=args.pause, max_batches=args.max_batches,
+        report=lambda state: print(f'converted {state["converted"]} tasks up to {state["after"]["$oid"]}'))
+    print(f'{"complete" if state["complete"] else "paused"}: converted {state["converted"]} tasks to the {args.to} storage')
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
 import json
 
+from pymongo.errors import OperationFailure
+
 validators = {}
 def getValidator(collection_name: str):
     """Obtain a validator object of a collection which is stored as a json file with the same name. The validator must comply to a schema validation format (see https://www.mongodb.com/docs/manual/core/schema-validation/)
@@ -13,4 +15,26 @@ def getValidator(collection_name: str):
     if collection_name not in validators:
         with open(f'./src/static/validators/{collection_name}.json', 'r') as f:
             validators[collection_name] = json.load(f)
-    return validators[collection_name]
\ No newline at end of file
+    return validators[collection_name]
+
+def ensureValidator(database, collection_name: str, validator: dict):
+    """Reconcile the validator of an existing collection with its declaration via collMod (see https://www.mongodb.com/docs/manual/reference/command/collMod/), such that a changed validator (e.g., the one of the task collection which accepts embedded videos and todos) also applies to a collection which has been created before the change. The documents stored already are not revalidated.
+
+    parameters:
+        database -- the pymongo database
+        collection_name -- the name of the existing collection
+        validator -- the declared validator (see getValidator)
+
+    returns:
+        True -- if the validator of the collection has been replaced
+        False -- if it complies to the declaration already (or could not be replaced, e.g., for lack of privileges)
+    """
+    information = next(iter(database.list_collections(filter={'name': collection_name})), None)
+    if information is not None and information.get('options', {}).get('validator') == validator:
+        return False
+    try:
+        database.command('collMod', collection_name, validator=validator)
+        return True
+    except OperationFailure as e:
+        print(f'Warning: could not update the validator of collection {collection_name}: {e}')
+        return False
@@ -0,0 +1,146 @@
+from bson.objectid import ObjectId
+from flask import Response, jsonify, request
+from pymongo import UpdateOne
+
+from src.util.dao import DAO
+from src.util.daos import getDao
+
+class Versions:
+    def __init__(self, dao: DAO, users_dao: DAO, tasks_dao: DAO):
+        """Version counters of the representations served by the polled routes, which allow to answer a conditional GET request (If-None-Match) without building the representation. The counters are stored in the version collection (shared by all worker processes) under the following keys:
+            user:<id> -- the user object (GET /users/<id>)
+            task:<id> -- the populated task object, including its video and todos (GET /tasks/byid/<id>)
+            tasksof:<id> -- the populated tasks of a user (GET /tasks/ofuser/<id>)
+        Every counter carries a random nonce, which is chosen when the counter is created, such that a counter which restarts at 0 (e.g., as the version collection has been dropped or the database has been restored) yields other ETags than before (see tags). The counters are only created by modifications (including the creation of users and tasks), never by reads.
+
+        parameters:
+            dao -- data access object of the version collection
+            users_dao -- data access object of the user collection, to find the owners of modified tasks
+            tasks_dao -- data access object of the task collection, to find the tasks of modified videos and todos
+        """
+        self.dao = dao
+        self.users_dao = users_dao
+        self.tasks_dao = tasks_dao
+
+    def get(self, keys: list):
+        """Obtain the current versions of the given keys in one round trip.
+
+        parameters:
+            keys -- list of version keys (e.g., user:<id>)
+
+        returns:
+            versions -- dict mapping each key to its version (0 if it has never been modified)
+
+        raises:
+            Exception -- in case the database operation fails
+        """
+        try:
+            versions = {key: 0 for key in keys}
+            for obj in self.dao.find(filter={'_id': {'$in': list(keys)}}):
+                versions[obj['_id']] = obj['version']
+            return versions
+        except Exception as e:
+            raise
+
+    def tags(self, keys: list):
+        """Obtain the tags of the current versions of the given keys in one round trip, which combine the nonce and the version of each counter (<nonce>-<version>). A key without a counter (e.g., of an object which does not exist, or whose counter has been lost) has no tag, as no tag could tell its versions apart.
+
+        parameters:
+            keys -- list of version keys (e.g., user:<id>)
+
+        returns:
+            tags -- dict mapping each key to the tag of its version (None if the key has no counter)
+
+        raises:
+            Exception -- in case the database operation fails
+        """
+        try:
+            tags = {key: None for key in keys}
+            for obj in self.dao.find(filter={'_id': {'$in': list(keys)}}):
+                if 'nonce' in obj:
+                    tags[obj['_id']] = f'{obj["nonce"]}-{obj["version"]}'
+            return tags
+        except Exception as e:
+            raise
+
+    def bump(self, keys: list, session=None):
+        """Increment the versions of the given keys in one round trip (creating the counters which do not exist yet).
+
+        parameters:
+            keys -- list of version keys
+            session -- optional client session (see DAO.start_session) in which the operation is executed
+
+        raises:
+            Exception -- in case the database operation fails
+        """
+        if not keys:
+            return
+        try:
+            self.dao.bulk_write([UpdateOne({'_id': key}, {'$inc': {'version': 1}, '$setOnInsert': {'nonce': str(ObjectId())}}, upsert=True) for key in sorted(set(keys))], ordered=False, session=session)
+        except Exception as e:
+            raise
+
+    def touch(self, collection_name: str, ids: list, session=None):
+        """Increment the versions of all representations which include the modified objects with the given ids: a user itself, a task and the tasks of its owner, or the task (and hence the tasks of its owner) a video or todo belongs to.
+
+        parameters:
+            collection_name -- the name of the collection of the modified objects (user, task, video or todo)
+            ids -- list of id values (strings or ObjectIds) of the modified objects
+            session -- optional client session (see DAO.start_session) in which the operations are executed
+
+        raises:
+            Exception -- in case any database operation fails
+        """
+        if not ids:
+            return
+        try:
+            ids = [ObjectId(id) for id in ids]
+            if collection_name == 'user':
+                keys = [f'user:{id}' for id in ids]
+            else:
+                if collection_name in ('video', 'todo'):
+                    field = 'video' if collection_name == 'video' else 'todos'
+                    # the tasks referencing or embedding the objects (see src.util.taskstorage)
+                    tasks = self.tasks_dao.find(filter={'$or': [{field: {'$in': ids}}, {f'{field}._id': {'$in': ids}}]}, projection={'_id': 1}, session=session)
+                    ids = [ObjectId(task['_id']['$oid']) for task in tasks]
+                    if not ids:
+                        return
+                owners = self.users_dao.find(filter={'tasks': {'$in': ids}}, projection={'_id': 1}, session=session)
+                keys = [f'task:{id}' for id in ids] + [f'tasksof:{owner["_id"]["$oid"]}' for owner in owners]
+            self.bump(keys, session=session)
+        except Exception as e:
+            raise
+
+def conditional(versions: Versions, key: str, build):
+    """Respond to a GET request with an ETag derived from the version of the representation (see Versions.tags). If the request carries a matching If-None-Match header, respond with 304 Not Modified without building the representation. The version is read before the representation is built, such that a concurrent modification can only make the ETag older than the representation (which causes a refetch), but never newer. Hence, the representation must be built from the database rather than from a process-local cache (see src.util.cache), which may be older than the version. A representation without a version counter is served without an ETag.
+
+    parameters:
+        versions -- the Versions of the app
+        key -- the version key of the representation (e.g., user:<id>)
+        build -- function building the representation (a jsonifiable object)
+
+    returns:
+        response -- a flask Response (with status 200 or 304)
+    """
+    etag = versions.tags([key])[key]
+    if etag is not None and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    # the representation may be stored, but must be revalidated by every poll
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+versions = None
+def getVersions():
+    """Obtain the version counters of the app (see Versions), which share the data access objects of the version, user and task collections (see src.util.daos.getDao).
+
+    returns:
+        versions -- Versions
+    """
+    global versions
+    if versions is None:
+        versions = Versions(getDao(collection_name='version'), users_dao=getDao(collection_name='user'), tasks_dao=getDao(collection_name='task'))
+    return versions
@@ -0,0 +1,59 @@
+import pytest
+from unittest.mock import patch
+
+from main import create_app
+from src.util import daos
+from src.util.dao import ensured
+from src.util.dao import DAO
+from src.util.memory import MemoryDatabase
+from src.util.versions import Versions
+from src.util.dashboards import Dashboards
+from src.controllers.taskcontroller import TaskController
+from src.controllers.todocontroller import TodoController
+from src.controllers.usercontroller import UserController
+
+collections = ['user', 'task', 'video', 'todo', 'version', 'job', 'dashboard', 'statistic', 'migration']
+
+
+@pytest.fixture
+def memorydaos():
+    """Data access objects of all collections (by name) on a fresh in-memory database without caches."""
+    database = MemoryDatabase('edutask')
+    with patch('src.util.dao.getMemoryDatabase', return_value=database):
+        ensured.clear()
+        yield {name: DAO(collection_name=name, engine='memory') for name in collections}
+    ensured.clear()
+
+@pytest.fixture
+def user(memorydaos):
+    """The id of a user without tasks."""
+    return memorydaos['user'].create({'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'})['_id']['$oid']
+
+@pytest.fixture
+def controllers(memorydaos):
+    """Factory of the controllers on the in-memory data access objects, which share their versions and dashboards like the ones of the app: controllers(embedded) returns (dashboards, tasks, todos, users)."""
+    def create(embedded: bool):
+        versions = Versions(memorydaos['version'], users_dao=memorydaos['user'], tasks_dao=memorydaos['task'])
+        builder = TaskController(tasks_dao=memorydaos['task'], videos_dao=memorydaos['video'], todos_dao=memorydaos['todo'], users_dao=memorydaos['user'], embedded=embedded)
+        dashboards = Dashboards(memorydaos['dashboard'], users_dao=memorydaos['user'], tasks=builder, versions=versions)
+        tasks = TaskController(tasks_dao=memorydaos['task'], videos_dao=memorydaos['video'], todos_dao=memorydaos['todo'], users_dao=memorydaos['user'], versions=versions, embedded=embedded, dashboards=dashboards)
+        todos = TodoController(todo_dao=memorydaos['todo'], tasks_dao=memorydaos['task'], versions=versions, embedded=embedded, dashboards=dashboards)
+        users = UserController(memorydaos['user'], versions=versions, dashboards=dashboards)
+        return dashboards, tasks, todos, users
+    return create
+
+@pytest.fixture
+def memoryclient():
+    """Test client of the app, whose shared data access objects are switched to a fresh in-memory database without caches."""
+    database = MemoryDatabase('edutask')
+    patches = [patch('src.util.dao.getMemoryDatabase', return_value=database)]
+    for name in collections:
+        dao = daos.getDao(collection_name=name)
+        patches += [patch.object(dao, 'engine', 'memory'), patch.object(dao, '_collection', None), patch.object(dao, 'cache', None)]
+    for p in patches:
+        p.start()
+    ensured.clear()
+    yield create_app().test_client()
+    for p in patches:
+        p.stop()
+    ensured.clear()
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import Mock, AsyncMock
+from bson.objectid import ObjectId
+from src.controllers.asynctaskcontroller import AsyncTaskController
+
+
+class TestAsyncTaskController:
+    @pytest.fixture
+    def daos(self):
+        daos = {}
+        for name in ['task', 'video', 'todo', 'user']:
+            daos[name] = AsyncMock()
+            daos[name].collection_name = name
+            daos[name].collection = Mock()
+            daos[name].collection.name = name
+        return daos
+
+    @pytest.fixture
+    def sut(self, daos):
+        return AsyncTaskController(tasks_dao=daos['task'], videos_dao=daos['video'], todos_dao=daos['todo'], users_dao=daos['user'])
+
+    def test_populate_concurrently(self, sut, daos):
+        # both lookups must be in flight at the same time for the gathered result to complete
+        started = []
+        async def lookup(result):
+            started.append(result)
+            while len(started) < 2:
+                await asyncio.sleep(0)
+            return result
+        async def findOne(id):
+            return await lookup({'url': 'abc'})
+        async def find_by_ids(ids):
+            return await lookup({'found': [{'description': 'a'}], 'missing': []})
+        daos['video'].findOne.side_effect = findOne
+        daos['todo'].find_by_ids.side_effect = find_by_ids
+        task = {'_id': {'$oid': str(ObjectId())}, 'video': {'$oid': str(ObjectId())}, 'todos': [{'$oid': str(ObjectId())}]}
+
+        populated = asyncio.run(asyncio.wait_for(sut.populate_task(task), timeout=1))
+
+        assert populated['video'] == {'url': 'abc'}
+        assert populated['todos'] == [{'description': 'a'}]
+
+    def test_create_many(self, sut, daos):
+        async def create_many(documents, **kwargs):
+            return {'inserted': [dict(document, _id={'$oid': str(ObjectId())}) for document in documents], 'errors': []}
+        for dao in daos.values():
+            dao.create_many.side_effect = create_many
+        userid = str(ObjectId())
+
+        ids = asyncio.run(sut.create_many([{'userid': userid, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b']}]))
+
+        assert len(ids) == 1
+        task = daos['task'].create_many.call_args.args[0][0]
+        assert len(task['todos']) == 2 and 'userid' not in task
+        assert daos['user'].bulk_write.call_args.args[0][0]._filter == {'_id': ObjectId(userid)}
+
+    def test_create_many_compensates(self, sut, daos):
+        async def create_many(documents, **kwargs):
+            return {'inserted': [dict(document, _id={'$oid': str(ObjectId())}) for document in documents], 'errors': []}
+        daos['video'].create_many.side_effect = create_many
+        daos['todo'].create_many.side_effect = create_many
+        daos['task'].create_many.return_value = {'inserted': [], 'errors': [{'index': 0, 'code': 121, 'errmsg': 'Document failed validation'}]}
+
+        with pytest.raises(Exception):
+            asyncio.run(sut.create_many([{'userid': str(ObjectId()), 'title': 'Task', 'url': 'abc', 'todos': ['a']}]))
+
+        assert len(daos['video'].delete_many.call_args.args[0]) == 1
+        assert len(daos['todo'].delete_many.call_args.args[0]) == 1
+        daos['user'].bulk_write.assert_not_called()
+
+    def test_delete_user(self, sut, daos):
+        userid = str(ObjectId())
+        taskid = {'$oid': str(ObjectId())}
+        daos['user'].findOne.return_value = {'_id': {'$oid': userid}, 'tasks': [taskid]}
+        daos['task'].find_by_ids.return_value = {'found': [{'_id': taskid, 'video': {'$oid': str(ObjectId())}, 'todos': [{'$oid': str(ObjectId())}]}], 'missing': []}
+        for name in ['task', 'video', 'todo', 'user']:
+            daos[name].delete_many.return_value = 1
+
+        counts = asyncio.run(sut.delete_user(userid))
+
+        assert counts == {'task': 1, 'video': 1, 'todo': 1, 'user': 1}
+        daos['user'].delete_many.assert_awaited_once_with([userid])
+
+    def test_delete_missing_user(self, sut, daos):
+        daos['user'].findOne.return_value = None
+
+        assert asyncio.run(sut.delete_user(str(ObjectId()))) == {'task': 0, 'video': 0, 'todo': 0, 'user': 0}
+        daos['task'].delete_many.assert_not_called()
+
+
+class TestAsyncEndpoints:
+    @pytest.fixture
+    def user(self, memoryclient):
+        return memoryclient.post('/users/create', data={'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'}).json['_id']['$oid']
+
+    @pytest.fixture
+    def task(self, memoryclient, user):
+        return memoryclient.post('/tasks/async/create', data={'userid': user, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b']}).json
+
+    def test_update_and_delete_todos(self, memoryclient, user, task):
+        first, second = [todo['_id']['$oid'] for todo in task['todos']]
+        memoryclient.get(f'/users/{user}/dashboard')
+
+        todo = memoryclient.put(f'/todos/async/byid/{first}', data={'data': json.dumps({'$set': {'done': True}})}).json
+        assert memoryclient.delete(f'/todos/async/byid/{second}').json == {'id': second}
+
+        assert todo['done'] is True
+        assert [(todo['description'], todo['done']) for todo in memoryclient.get(f'/tasks/byid/{task["_id"]["$oid"]}').json['todos']] == [('a', True)]
+        # the dashboard is kept current by the asynchronous routes as well
+        dashboard = memoryclient.get(f'/users/{user}/dashboard').json
+        assert (dashboard['done'], dashboard['total']) == (1, 1)
+
+    def test_update_and_delete_task(self, memoryclient, task):
+        taskid = task['_id']['$oid']
+
+        updated = memoryclient.put(f'/tasks/async/byid/{taskid}', data={'data': json.dumps({'$set': {'title': 'Renamed'}})}).json
+        assert updated['title'] == 'Renamed'
+        assert memoryclient.get(f'/tasks/async/byid/{taskid}').json['title'] == 'Renamed'
+
+        assert memoryclient.delete(f'/tasks/async/byid/{taskid}').json == {'success': True}
+        assert memoryclient.get(f'/tasks/byid/{taskid}').json is None
@@ -0,0 +1,131 @@
+import pytest
+from bson.objectid import ObjectId
+
+from src.util.querytracker import querybudget
+
+
+class TestBatchEndpoints:
+    @pytest.fixture
+    def client(self, memoryclient):
+        return memoryclient
+
+    @pytest.fixture
+    def user(self, client):
+        response = client.post('/users/create', data={'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'})
+        userid = response.json['_id']['$oid']
+        for i in range(3):
+            client.post('/tasks/create', data={'userid': userid, 'title': f'Task {i}', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b']})
+        return userid
+
+    @pytest.fixture
+    def tasks(self, client, user):
+        return client.get(f'/tasks/ofuser/{user}').json
+
+    def test_tasks(self, client, tasks):
+        ids = [task['_id']['$oid'] for task in reversed(tasks)]
+        missing = str(ObjectId())
+
+        with querybudget(1):
+            response = client.post('/tasks/byids', json={'ids': ids + [missing]})
+
+        assert response.status_code == 200
+        assert [task['_id']['$oid'] for task in response.json['found']] == ids
+        assert [todo['description'] for todo in response.json['found'][0]['todos']] == ['a', 'b']
+        assert response.json['missing'] == [missing]
+
+    def test_tasks_async(self, client, tasks):
+        ids = [task['_id']['$oid'] for task in reversed(tasks)]
+
+        response = client.post('/tasks/async/byids', json={'ids': ids})
+
+        assert response.status_code == 200
+        assert [task['_id']['$oid'] for task in response.json['found']] == ids
+
+    def test_todos_via_form(self, client, tasks):
+        ids = [todo['_id']['$oid'] for todo in tasks[0]['todos']]
+
+        response = client.post('/todos/byids', data={'ids': ','.join(ids)})
+
+        assert response.status_code == 200
+        assert [todo['_id']['$oid'] for todo in response.json['found']] == ids
+
+    def test_users(self, client, user):
+        response = client.post('/users/byids', data={'ids': [user]})
+
+        assert response.status_code == 200
+        assert response.json['found'][0]['email'] == 'jane@doe.com'
+
+    def test_invalid_ids(self, client):
+        assert client.post('/users/byids', json={'ids': ['invalid']}).status_code == 400
+        assert client.post('/users/byids', json={'ids': 'invalid'}).status_code == 400
+
+    @pytest.mark.parametrize('url', ['/users/byids', '/tasks/async/byids'])
+    def test_too_many_ids(self, client, url):
+        assert client.post(url, json={'ids': [str(ObjectId()) for _ in range(1001)]}).status_code == 400
+
+
+class TestTodoBatch:
+    @pytest.fixture
+    def client(self, memoryclient):
+        return memoryclient
+
+    @pytest.fixture
+    def user(self, client):
+        response = client.post('/users/create', data={'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'})
+        userid = response.json['_id']['$oid']
+        client.post('/tasks/create', data={'userid': userid, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b', 'c']})
+        return userid
+
+    @pytest.fixture
+    def task(self, client, user):
+        return client.get(f'/tasks/ofuser/{user}').json[0]
+
+    def test_mark_all_done(self, client, task):
+        # the lookup of the task, the update of its todos, the lookup of its owner, the increment of the versions and the invalidation of the dashboards
+        with querybudget(5):
+            response = client.post('/todos/batch', json={'operations': [{'op': 'done', 'taskid': task['_id']['$oid']}]})
+
+        assert response.json['results'] == [{'ok': True, 'taskid': task['_id']['$oid']}]
+        todos = client.get(f'/tasks/byid/{task["_id"]["$oid"]}').json['todos']
+        assert [todo['done'] for todo in todos] == [True, True, True]
+
+    def test_mixed_operations(self, client, task):
+        todos = task['todos']
+        operations = [
+            {'op': 'create', 'taskid': task['_id']['$oid'], 'description': 'd'},
+            {'op': 'update', 'id': todos[0]['_id']['$oid'], 'data': {'done': True}},
+            {'op': 'update', 'id': todos[1]['_id']['$oid'], 'data': {'$set': {'done': 'not a bool'}}},
+            {'op': 'delete', 'id': todos[2]['_id']['$oid']},
+            {'op': 'update', 'id': 'invalid', 'data': {'done': True}},
+            {'op': 'unknown'}
+        ]
+
+        results = client.post('/todos/batch', json={'operations': operations}).json['results']
+
+        assert [result['ok'] for result in results] == [True, True, False, True, False, False]
+        populated = client.get(f'/tasks/byid/{task["_id"]["$oid"]}').json
+        assert [(todo['description'], todo['done']) for todo in populated['todos']] == [('a', True), ('b', False), ('d', False)]
+        assert populated['todos'][2]['_id']['$oid'] == results[0]['id']
+
+    def test_missing_todos(self, client, task):
+        todoid = task['todos'][0]['_id']['$oid']
+        missing = str(ObjectId())
+        operations = [
+            {'op': 'update', 'id': missing, 'data': {'done': True}},
+            {'op': 'delete', 'id': missing},
+            {'op': 'delete', 'id': todoid},
+            {'op': 'update', 'id': todoid, 'data': {'done': True}}
+        ]
+
+        results = client.post('/todos/batch', json={'operations': operations}).json['results']
+
+        assert [result['ok'] for result in results] == [False, False, True, False]
+        assert results[0]['error'] == f'Todo {missing} does not exist'
+
+    def test_create_for_missing_task(self, client):
+        results = client.post('/todos/batch', json={'operations': [{'op': 'create', 'taskid': str(ObjectId()), 'description': 'd'}]}).json['results']
+
+        assert results[0]['ok'] is False
+
+    def test_invalid_body(self, client):
+        assert client.post('/todos/batch', data={'operations': 'none'}).status_code == 400
@@ -0,0 +1,29 @@
+import pytest
+import json
+import datetime
+from bson import json_util, Int64, Decimal128
+from bson.objectid import ObjectId
+from flask import Flask
+
+from src.util.bsonjson import to_json, BSONJSONProvider
+
+
+@pytest.mark.parametrize('document', [
+    {'_id': ObjectId(), 'title': 'Task', 'done': False, 'count': 3, 'ratio': 0.5, 'none': None},
+    {'_id': ObjectId(), 'todos': [ObjectId(), ObjectId()], 'video': {'_id': ObjectId(), 'url': 'abc'}},
+    {'startdate': datetime.datetime(2023, 4, 1, 12, 30, 15, 123456)},
+    {'startdate': datetime.datetime(2023, 4, 1, 12, 30, 15)},
+    {'startdate': datetime.datetime(2023, 4, 1, 12, 30, tzinfo=datetime.timezone(datetime.timedelta(hours=2)))},
+    {'startdate': datetime.datetime(1960, 1, 1)},
+    {'big': Int64(2**40), 'decimal': Decimal128('1.5'), 'nan': float('nan'), 'tuple': (1, 2)},
+    [{'_id': ObjectId()}, {'_id': ObjectId()}],
+    None
+])
+def test_to_json_identical_to_json_util(document):
+    assert to_json(document) == json.loads(json_util.dumps(document))
+
+def test_provider_serializes_bson_values():
+    app = Flask('test')
+    provider = BSONJSONProvider(app)
+    document = {'_id': ObjectId(), 'startdate': datetime.datetime(2023, 4, 1)}
+    assert json.loads(provider.dumps(document)) == to_json(document)
@@ -0,0 +1,79 @@
+import pytest
+from unittest.mock import Mock, patch
+from bson.objectid import ObjectId
+
+from src.util.cache import DocumentCache
+from src.util.dao import DAO
+
+
+class TestDocumentCache:
+    def test_hit_returns_copy(self):
+        cache = DocumentCache(ttl=60, max_entries=10, max_bytes=1000)
+        cache.put('a', {'name': 'Jane'})
+
+        document = cache.get('a')
+        document['name'] = 'John'
+
+        assert cache.get('a') == {'name': 'Jane'}
+        assert cache.statistics()['hits'] == 2
+
+    def test_lru_eviction(self):
+        cache = DocumentCache(ttl=60, max_entries=2, max_bytes=1000)
+        cache.put('a', {'id': 'a'})
+        cache.put('b', {'id': 'b'})
+        cache.get('a')
+        cache.put('c', {'id': 'c'})
+
+        assert cache.get('b') is None
+        assert cache.get('a') is not None
+        assert cache.statistics()['evictions'] == 1
+
+    def test_size_bound(self):
+        cache = DocumentCache(ttl=60, max_entries=10, max_bytes=40)
+        cache.put('a', {'text': 'x' * 20})
+        cache.put('b', {'text': 'y' * 20})
+
+        assert cache.get('a') is None
+        assert cache.statistics()['bytes'] <= 40
+
+    def test_expiration(self):
+        cache = DocumentCache(ttl=60, max_entries=10, max_bytes=1000)
+        with patch('src.util.cache.time.monotonic', return_value=0):
+            cache.put('a', {'id': 'a'})
+        with patch('src.util.cache.time.monotonic', return_value=61):
+            assert cache.get('a') is None
+        assert cache.statistics()['expirations'] == 1
+
+    def test_outdated_generation_not_cached(self):
+        cache = DocumentCache(ttl=60, max_entries=10, max_bytes=1000)
+        generation = cache.generation
+        cache.invalidate('a')
+        cache.put('a', {'id': 'a'}, generation=generation)
+
+        assert cache.get('a') is None
+
+
+class TestDAOCache:
+    @pytest.fixture
+    def sut(self):
+        dao = DAO(collection_name='test', cache=DocumentCache(ttl=60, max_entries=10, max_bytes=1000))
+        dao.collection = Mock()
+        return dao
+
+    def test_findOne_read_through(self, sut):
+        id = ObjectId()
+        sut.collection.find_one.return_value = {'_id': id, 'name': 'Jane'}
+
+        assert sut.findOne(str(id)) == sut.findOne(str(id))
+        assert sut.collection.find_one.call_count == 1
+
+    def test_update_invalidates(self, sut):
+        id = ObjectId()
+        sut.collection.find_one.return_value = {'_id': id, 'name': 'Jane'}
+        sut.findOne(str(id))
+
+        sut.update(str(id), {'$set': {'name': 'John'}})
+        sut.collection.find_one.return_value = {'_id': id, 'name': 'John'}
+
+        assert sut.findOne(str(id))['name'] == 'John'
+        assert sut.collection.find_one.call_count == 2
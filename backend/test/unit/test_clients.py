@@ -0,0 +1,39 @@
+import pytest
+from unittest.mock import patch, Mock
+from pymongo import monitoring
+
+from src.util import clients
+from src.util.clients import getClient, PoolStatistics
+from src.util.config import getConfig
+
+
+class TestClients:
+    def test_getClient_shared(self):
+        with patch('src.util.clients.pymongo.MongoClient') as mockedclient, patch.dict(clients.clients, clear=True):
+            mockedclient.side_effect = lambda *args, **kwargs: Mock()
+            assert getClient('mongodb://test:1') is getClient('mongodb://test:1')
+            assert getClient('mongodb://test:1') is not getClient('mongodb://test:2')
+            assert mockedclient.call_count == 2
+
+    def test_getClient_pool_options(self):
+        with patch('src.util.clients.pymongo.MongoClient') as mockedclient, patch.dict(clients.clients, clear=True), \
+                patch.dict(getConfig(), {'MONGO_MAX_POOL_SIZE': '8', 'MONGO_WAIT_QUEUE_TIMEOUT_MS': '250'}):
+            getClient('mongodb://test:1')
+            kwargs = mockedclient.call_args.kwargs
+            assert kwargs['maxPoolSize'] == 8
+            assert kwargs['waitQueueTimeoutMS'] == 250
+
+    def test_pool_statistics(self):
+        statistics = PoolStatistics()
+        address = ('localhost', 27017)
+        for id in range(3):
+            statistics.connection_created(monitoring.ConnectionCreatedEvent(address, id))
+            statistics.connection_checked_out(monitoring.ConnectionCheckedOutEvent(address, id))
+        statistics.connection_checked_in(monitoring.ConnectionCheckedInEvent(address, 0))
+        statistics.connection_check_out_failed(monitoring.ConnectionCheckOutFailedEvent(address, monitoring.ConnectionCheckOutFailedReason.TIMEOUT))
+
+        pool = statistics.snapshot()['localhost:27017']
+        assert pool['open'] == 3
+        assert pool['in_use'] == 2
+        assert pool['max_in_use'] == 3
+        assert pool['timeouts'] == 1
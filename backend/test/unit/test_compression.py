@@ -0,0 +1,86 @@
+import pytest
+import gzip
+import zlib
+from unittest.mock import patch
+from bson.objectid import ObjectId
+
+from main import create_app
+from src.util.compression import negotiate
+from werkzeug.datastructures import Accept
+from werkzeug.http import parse_accept_header
+
+
+class TestCompression:
+    @pytest.fixture
+    def users(self):
+        return [{'_id': {'$oid': str(ObjectId())}, 'firstName': f'User {i}', 'lastName': 'Doe'} for i in range(100)]
+
+    @pytest.fixture
+    def client(self):
+        return create_app().test_client()
+
+    def test_large_response_is_compressed(self, client, users):
+        with patch('src.blueprints.userblueprint.controller') as mockedcontroller:
+            mockedcontroller.get_all.return_value = users
+            response = client.get('/users/all', headers={'Accept-Encoding': 'gzip'})
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert int(response.headers['Content-Length']) == len(response.data)
+        assert len(response.data) < len(create_app().json.dumps(users))
+        assert create_app().json.loads(gzip.decompress(response.data)) == users
+
+    def test_small_response_is_not_compressed(self, client, users):
+        with patch('src.blueprints.userblueprint.controller') as mockedcontroller:
+            mockedcontroller.get_all.return_value = users[:1]
+            response = client.get('/users/all', headers={'Accept-Encoding': 'gzip'})
+
+        assert 'Content-Encoding' not in response.headers
+        assert response.json == users[:1]
+
+    def test_without_accept_encoding(self, client, users):
+        with patch('src.blueprints.userblueprint.controller') as mockedcontroller:
+            mockedcontroller.get_all.return_value = users
+            response = client.get('/users/all')
+
+        assert 'Content-Encoding' not in response.headers
+        assert response.json == users
+
+    def test_streamed_response(self, client, users):
+        with patch('src.blueprints.userblueprint.controller') as mockedcontroller:
+            mockedcontroller.get_page.return_value = iter(users)
+            response = client.get('/users/all?stream=true', headers={'Accept-Encoding': 'gzip'})
+
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert 'Content-Length' not in response.headers
+            lines = gzip.decompress(response.data).decode().splitlines()
+
+        assert len(lines) == 100
+
+    def test_stream_chunks_are_flushed(self, client, users):
+        with patch('src.blueprints.userblueprint.controller') as mockedcontroller:
+            mockedcontroller.get_page.return_value = iter(users)
+            response = client.get('/users/all?stream=true', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+
+            # every chunk can be decompressed as soon as it arrives
+            decompressor = zlib.decompressobj(31)
+            first = decompressor.decompress(next(response.response))
+            response.close()
+
+        assert first.decode().splitlines()[0] == create_app().json.dumps(users[0])
+
+    def test_compression_level(self, client, users):
+        with patch('src.blueprints.userblueprint.controller') as mockedcontroller:
+            mockedcontroller.get_all.return_value = users
+            with patch.dict('src.util.config.config', {'COMPRESSION_GZIP_LEVEL': '1'}):
+                fast = client.get('/users/all', headers={'Accept-Encoding': 'gzip'}).data
+            with patch.dict('src.util.config.config', {'COMPRESSION_GZIP_LEVEL': '9'}):
+                small = client.get('/users/all', headers={'Accept-Encoding': 'gzip'}).data
+
+        assert gzip.decompress(fast) == gzip.decompress(small)
+        assert len(small) <= len(fast)
+
+    def test_negotiate(self):
+        assert negotiate(parse_accept_header('gzip, deflate', Accept))[0] == 'gzip'
+        assert negotiate(parse_accept_header('identity', Accept)) is None
+        assert negotiate(parse_accept_header('gzip;q=0', Accept)) is None
@@ -0,0 +1,81 @@
+import pytest
+from unittest.mock import Mock, patch
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+from src.util.dao import DAO
+
+
+def insert_many_failing_at(indices: list, ordered: bool):
+    """Simulate insert_many, which assigns an _id to every document and fails for the documents at the given indices."""
+    def insert_many(documents, ordered=ordered, session=None):
+        for document in documents:
+            document['_id'] = ObjectId()
+        errors = [{'index': i, 'code': 121, 'errmsg': 'Document failed validation'} for i in indices if i < len(documents)]
+        if errors:
+            raise BulkWriteError({'writeErrors': errors})
+    return insert_many
+
+
+class TestDAO:
+    @pytest.fixture
+    def sut(self):
+        dao = DAO(collection_name='test')
+        dao.collection = Mock()
+        return dao
+
+    def test_connect_lazily(self):
+        with patch('src.util.dao.getClient') as mockedclient:
+            dao = DAO(collection_name='user')
+            mockedclient.assert_not_called()
+
+            dao.collection
+            dao.collection
+            assert mockedclient.call_count == 1
+
+    def test_create_without_read_back(self, sut):
+        id = ObjectId()
+        def insert_one(document, session=None):
+            document['_id'] = id
+            return Mock(inserted_id=id)
+        sut.collection.insert_one.side_effect = insert_one
+
+        result = sut.create({'url': 'abc'})
+
+        assert result == {'_id': {'$oid': str(id)}, 'url': 'abc'}
+        sut.collection.find_one.assert_not_called()
+
+    def test_create_with_read_back(self, sut):
+        id = ObjectId()
+        sut.collection.insert_one.return_value = Mock(inserted_id=id)
+        sut.collection.find_one.return_value = {'_id': id, 'url': 'abc'}
+
+        result = sut.create({'url': 'abc'}, read_back=True)
+
+        assert result == {'_id': {'$oid': str(id)}, 'url': 'abc'}
+        sut.collection.find_one.assert_called_once_with({'_id': id}, session=None)
+
+    def test_create_many_in_chunks(self, sut):
+        sut.collection.insert_many.side_effect = insert_many_failing_at([], ordered=False)
+
+        result = sut.create_many([{'url': str(i)} for i in range(5)], chunk_size=2)
+
+        assert sut.collection.insert_many.call_count == 3
+        assert [doc['url'] for doc in result['inserted']] == ['0', '1', '2', '3', '4']
+        assert result['errors'] == []
+
+    def test_create_many_unordered_reports_failures(self, sut):
+        sut.collection.insert_many.side_effect = insert_many_failing_at([1], ordered=False)
+
+        result = sut.create_many([{'url': str(i)} for i in range(4)], chunk_size=2)
+
+        assert [doc['url'] for doc in result['inserted']] == ['0', '2']
+        assert [error['index'] for error in result['errors']] == [1, 3]
+
+    def test_create_many_ordered_stops_at_failure(self, sut):
+        sut.collection.insert_many.side_effect = insert_many_failing_at([1], ordered=True)
+
+        result = sut.create_many([{'url': str(i)} for i in range(4)], ordered=True, chunk_size=2)
+
+        assert sut.collection.insert_many.call_count == 1
+        assert [doc['url'] for doc in result['inserted']] == ['0']
+        assert [error['index'] for error in result['errors']] == [1]
@@ -0,0 +1,145 @@
+import pytest
+from unittest.mock import patch
+from bson.objectid import ObjectId
+
+from src.util.bsonjson import from_json
+from src.util.dashboards import serve
+
+
+def counts(dashboard):
+    return [(task['title'], task['done'], task['total']) for task in dashboard['tasks']], dashboard['done'], dashboard['total']
+
+
+class TestDashboards:
+    @pytest.mark.parametrize('embedded', [False, True])
+    def test_incremental_updates_match_a_rebuild(self, user, embedded, controllers):
+        dashboards, tasks, todos, users = controllers(embedded)
+        tasks.create({'userid': user, 'title': 'First', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b']})
+        # the dashboard is built on its first read
+        assert counts(dashboards.get(user)) == ([('First', 0, 2)], 0, 2)
+
+        taskid = tasks.create({'userid': user, 'title': 'Second', 'description': 'Do it', 'url': 'abc', 'todos': ['c']})
+        created = todos.create({'taskid': taskid, 'description': 'd'})
+        first = tasks.get(taskid)['todos'][0]['_id']['$oid']
+        todos.update(first, {'$set': {'done': True}})
+        # a repeated update does not count the todo twice
+        todos.update(first, {'$set': {'done': True}})
+        todos.update(created['_id']['$oid'], {'$set': {'done': True}})
+        todos.delete(created['_id']['$oid'])
+        users.update(user, {'firstName': 'John'})
+
+        dashboard = dashboards.get(user)
+        assert counts(dashboard) == ([('First', 0, 2), ('Second', 1, 1)], 1, 3)
+        assert dashboard['user']['firstName'] == 'John'
+        assert dashboard == serve(dashboards.build(user))
+
+    def test_todo_without_done_flag(self, user, controllers):
+        dashboards, tasks, todos, _ = controllers(False)
+        taskid = tasks.create({'userid': user, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a']})
+        dashboards.get(user)
+        todo = todos.create({'taskid': taskid, 'description': 'b'})
+
+        todos.update(todo['_id']['$oid'], {'$set': {'done': False}})
+
+        assert counts(dashboards.get(user)) == ([('Task', 0, 2)], 0, 2)
+        assert dashboards.get(user) == serve(dashboards.build(user))
+
+    def test_delete_of_user(self, user, controllers):
+        dashboards, tasks, _, _ = controllers(False)
+        tasks.create({'userid': user, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a']})
+        dashboards.get(user)
+
+        tasks.delete_of_user(user)
+
+        assert counts(dashboards.get(user)) == ([], 0, 0)
+
+    def test_delete_user(self, memorydaos, user, controllers):
+        dashboards, tasks, _, _ = controllers(False)
+        dashboards.get(user)
+
+        tasks.delete_user(user)
+
+        assert memorydaos['dashboard'].find() == []
+        assert dashboards.get(user) is None
+
+    def test_invalidation(self, memorydaos, user, controllers):
+        dashboards, tasks, todos, _ = controllers(False)
+        taskid = tasks.create({'userid': user, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b']})
+        dashboards.get(user)
+
+        # batches and modifications of tasks remove the dashboard, which is rebuilt on the next read
+        todos.batch([{'op': 'done', 'taskid': taskid}])
+        assert memorydaos['dashboard'].find() == []
+        assert counts(dashboards.get(user)) == ([('Task', 2, 2)], 2, 2)
+
+        tasks.update(taskid, {'$set': {'title': 'Renamed'}})
+        assert memorydaos['dashboard'].find() == []
+        assert counts(dashboards.get(user)) == ([('Renamed', 2, 2)], 2, 2)
+
+    def test_modification_during_build(self, memorydaos, user, controllers):
+        dashboards, tasks, _, _ = controllers(False)
+        taskid = tasks.create({'userid': user, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a']})
+        build = dashboards.build
+
+        def interleaved(userid):
+            # the task is renamed after it has been read by the build, but before the dashboard is stored
+            view = build(userid)
+            tasks.update(taskid, {'$set': {'title': 'Renamed'}})
+            return view
+
+        with patch.object(dashboards, 'build', interleaved):
+            dashboards.get(user)
+
+        assert memorydaos['dashboard'].find() == []
+        assert counts(dashboards.get(user)) == ([('Renamed', 0, 1)], 0, 1)
+
+    def test_modification_contained_in_build(self, memorydaos, user, controllers):
+        dashboards, tasks, todos, _ = controllers(False)
+        taskid = tasks.create({'userid': user, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a']})
+        dashboards.get(user)
+        todo = todos.create({'taskid': taskid, 'description': 'b'})
+        tasks.create({'userid': user, 'title': 'Other', 'description': 'Do it', 'url': 'abc', 'todos': ['c']})
+        other = memorydaos['task'].find_one_by({'title': 'Other'})
+
+        # the incremental updates of modifications which a rebuilt dashboard contains already do not count them twice
+        dashboards.add_todo(taskid, todo)
+        dashboards.add_tasks([(user, from_json(tasks.get(other['_id']['$oid'])))])
+
+        assert counts(dashboards.get(user)) == ([('Task', 0, 2), ('Other', 0, 1)], 0, 3)
+
+    def test_repair(self, memorydaos, user, controllers):
+        dashboards, tasks, _, _ = controllers(False)
+        tasks.create({'userid': user, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a']})
+        dashboards.get(user)
+        other = memorydaos['user'].create({'firstName': 'John', 'lastName': 'Doe', 'email': 'john@doe.com'})['_id']['$oid']
+        dashboards.get(other)
+        # a drifted dashboard and the dashboard of a user which has been removed behind the back of the controllers
+        memorydaos['dashboard'].update(user, {'$set': {'done': 5}})
+        memorydaos['user'].delete(other)
+        repaired = []
+
+        result = dashboards.repair(batch_size=1, report=repaired.append)
+
+        assert result == {'checked': 2, 'repaired': 1, 'removed': 1}
+        assert sorted(repaired) == sorted([user, other])
+        assert dashboards.get(user)['done'] == 0
+        assert dashboards.repair() == {'checked': 1, 'repaired': 0, 'removed': 0}
+
+
+class TestDashboardEndpoint:
+    def test_dashboard(self, memoryclient):
+        response = memoryclient.post('/users/create', data={'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'})
+        userid = response.json['_id']['$oid']
+        memoryclient.post('/tasks/create', data={'userid': userid, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b']})
+
+        dashboard = memoryclient.get(f'/users/{userid}/dashboard').json
+        todoid = dashboard['tasks'][0]['todos'][0]['_id']['$oid']
+        memoryclient.put(f'/todos/byid/{todoid}', data={'data': '{"$set": {"done": true}}'})
+
+        dashboard = memoryclient.get(f'/users/{userid}/dashboard').json
+        assert dashboard['tasks'][0]['video']['url'] == 'abc'
+        assert (dashboard['done'], dashboard['total']) == (1, 2)
+
+    def test_errors(self, memoryclient):
+        assert memoryclient.get(f'/users/{ObjectId()}/dashboard').status_code == 404
+        assert memoryclient.get('/users/abc/dashboard').status_code == 400
@@ -0,0 +1,62 @@
+import pytest
+from unittest.mock import Mock
+from pymongo.errors import OperationFailure
+
+from src.util.indexes import getIndexes, ensureIndexes, reportIndexes
+
+
+class TestIndexes:
+    @pytest.fixture
+    def collection(self):
+        collection = Mock()
+        collection.index_information.return_value = {
+            '_id_': {'key': [('_id', 1)]},
+            'email_unique': {'key': [('email', 1)], 'unique': True},
+            'title': {'key': [('title', -1)]},
+            'legacy': {'key': [('legacy', 1)]}
+        }
+        return collection
+
+    def test_getIndexes_of_user(self):
+        assert getIndexes('user') == [{'name': 'email_unique', 'keys': [['email', 1]], 'unique': True}, {'name': 'tasks', 'keys': [['tasks', 1]]}]
+
+    def test_getIndexes_of_todo(self):
+        # the descriptions are not unique (e.g., 'Watch video'), hence they get a plain and a text index
+        assert [declaration['keys'] for declaration in getIndexes('todo')] == [[['description', 1]], [['description', 'text']]]
+
+    def test_getIndexes_undeclared_collection(self):
+        assert getIndexes('nonexistent') == []
+
+    def test_ensureIndexes(self, collection):
+        declarations = [
+            {'name': 'email_unique', 'keys': [['email', 1]], 'unique': True},
+            {'name': 'title', 'keys': [['title', 1]]},
+            {'name': 'expires_ttl', 'keys': [['expires', 1]], 'expireAfterSeconds': 3600}
+        ]
+
+        result = ensureIndexes(collection, declarations)
+
+        assert result == {'created': ['expires_ttl'], 'recreated': ['title'], 'failed': []}
+        collection.drop_index.assert_called_once_with('title')
+        collection.create_index.assert_any_call([('expires', 1)], name='expires_ttl', expireAfterSeconds=3600)
+
+    def test_ensureIndexes_failure(self, collection):
+        collection.create_index.side_effect = OperationFailure('E11000 duplicate key error')
+
+        result = ensureIndexes(collection, [{'name': 'name_unique', 'keys': [['name', 1]], 'unique': True}])
+
+        assert result['failed'][0]['name'] == 'name_unique'
+
+    def test_reportIndexes(self, collection):
+        collection.aggregate.return_value = [
+            {'name': '_id_', 'accesses': {'ops': 10}},
+            {'name': 'email_unique', 'accesses': {'ops': 5}},
+            {'name': 'legacy', 'accesses': {'ops': 0}}
+        ]
+        declarations = [{'name': 'email_unique', 'keys': [['email', 1]], 'unique': True}, {'name': 'text', 'keys': [['title', 'text']]}]
+
+        report = reportIndexes(collection, declarations)
+
+        assert report['missing'] == ['text']
+        assert report['undeclared'] == ['title', 'legacy']
+        assert report['unused'] == ['legacy']
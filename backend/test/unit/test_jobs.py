@@ -0,0 +1,188 @@
+import pytest
+import queue
+import threading
+import time
+from datetime import timedelta
+from bson.objectid import ObjectId
+
+from src.util.jobs import JobQueue, RUNNING, SUCCEEDED, FAILED, now
+
+
+def wait(jobs, id, timeout=5):
+    """Poll a job until it has finished."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = jobs.get(id)
+        if job['status'] in (SUCCEEDED, FAILED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'Job {id} has not finished')
+
+
+class TestJobQueue:
+    @pytest.fixture
+    def dao(self, memorydaos):
+        return memorydaos['job']
+
+    @pytest.fixture
+    def jobs(self, dao):
+        jobs = JobQueue(dao, workers=1, size=2, drain_timeout=5)
+        yield jobs
+        jobs.drain()
+
+    def test_result_and_progress(self, jobs):
+        def handler(progress, n):
+            for i in range(n):
+                progress(i, n)
+            return {'sum': n}
+        jobs.register('count', handler)
+
+        job = jobs.submit('count', {'n': 3})
+        job = wait(jobs, job['_id']['$oid'])
+
+        assert job['status'] == SUCCEEDED
+        assert job['result'] == {'sum': 3}
+        assert job['progress'] == {'done': 3, 'total': 3}
+        assert 'params' not in job
+
+    def test_failure(self, jobs):
+        def handler(progress):
+            raise ValueError('broken')
+        jobs.register('fail', handler)
+
+        job = wait(jobs, jobs.submit('fail')['_id']['$oid'])
+
+        assert job['status'] == FAILED
+        assert job['error'] == 'ValueError: broken'
+
+    def test_idempotency_key(self, jobs):
+        calls = []
+        jobs.register('count', lambda progress: calls.append(1))
+
+        first = jobs.submit('count', key='abc')
+        second = jobs.submit('count', key='abc')
+        wait(jobs, first['_id']['$oid'])
+
+        assert first['_id'] == second['_id']
+        assert len(calls) == 1
+        with pytest.raises(ValueError):
+            jobs.register('other', lambda progress: None)
+            jobs.submit('other', key='abc')
+
+    def test_bounded_queue(self, jobs):
+        release = threading.Event()
+        jobs.register('block', lambda progress: release.wait(5))
+
+        submitted = [jobs.submit('block')]
+        # the worker thread may not have started the first job yet
+        try:
+            for _ in range(3):
+                submitted.append(jobs.submit('block'))
+        except queue.Full:
+            pass
+        else:
+            pytest.fail('The queue is unbounded')
+        release.set()
+
+        assert len(submitted) <= 3
+
+    def abandoned(self, dao, key=None):
+        """Store a running job of a process which has ended without finishing it."""
+        job = {'kind': 'count', 'params': {}, 'status': RUNNING, 'progress': {'done': 0, 'total': 1}, 'created': now(), 'leased': now() - timedelta(seconds=1)}
+        if key is not None:
+            job['key'] = key
+        return dao.create(job)['_id']['$oid']
+
+    def test_abandoned_job(self, jobs, dao):
+        calls = []
+        jobs.register('count', lambda progress: calls.append(1))
+        id = self.abandoned(dao, key='abc')
+
+        job = jobs.get(id)
+
+        assert job['status'] == FAILED and 'Abandoned' in job['error']
+        # the retry of the abandoned job runs it again
+        retry = jobs.submit('count', key='abc')
+        assert retry['_id']['$oid'] != id
+        assert wait(jobs, retry['_id']['$oid'])['status'] == SUCCEEDED
+        assert calls == [1]
+
+    def test_reap_on_start(self, jobs, dao):
+        jobs.register('count', lambda progress: None)
+        id = self.abandoned(dao)
+
+        wait(jobs, jobs.submit('count')['_id']['$oid'])
+
+        assert dao.findOne(id)['status'] == FAILED
+
+    def test_lease_is_renewed(self, dao):
+        jobs = JobQueue(dao, workers=1, size=2, drain_timeout=5, lease=0.3)
+        release = threading.Event()
+        jobs.register('block', lambda progress: release.wait(5))
+        job = jobs.submit('block')
+
+        time.sleep(0.6)
+
+        assert jobs.get(job['_id']['$oid'])['status'] == RUNNING
+        release.set()
+        assert wait(jobs, job['_id']['$oid'])['status'] == SUCCEEDED
+        jobs.drain()
+
+    def test_drain(self, jobs):
+        release = threading.Event()
+        jobs.register('block', lambda progress: release.wait(5))
+        running = jobs.submit('block')
+        queued = jobs.submit('block')
+
+        jobs.drain(timeout=0.1)
+        release.set()
+
+        assert jobs.get(queued['_id']['$oid'])['status'] == FAILED
+        assert jobs.get(running['_id']['$oid'])['status'] in (FAILED, SUCCEEDED)
+        with pytest.raises(RuntimeError):
+            jobs.submit('block')
+
+
+class TestJobEndpoints:
+    @pytest.fixture
+    def client(self, memoryclient):
+        return memoryclient
+
+    @pytest.fixture
+    def user(self, client):
+        response = client.post('/users/create', data={'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'})
+        userid = response.json['_id']['$oid']
+        client.post('/tasks/create', data={'userid': userid, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b']})
+        return userid
+
+    def poll(self, client, location, timeout=5):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = client.get(location).json
+            if job['status'] in (SUCCEEDED, FAILED):
+                return job
+            time.sleep(0.01)
+        raise AssertionError(f'{location} has not finished')
+
+    def test_delete_user_in_background(self, client, user):
+        response = client.delete(f'/users/{user}?async=true', headers={'Idempotency-Key': 'delete-jane'})
+
+        assert response.status_code == 202
+        job = self.poll(client, response.headers['Location'])
+        assert job['status'] == SUCCEEDED
+        assert job['result'] == {'user': 1, 'task': 1, 'video': 1, 'todo': 2}
+
+        # a retry of the request responds with the same job
+        retry = client.delete(f'/users/{user}?async=true', headers={'Idempotency-Key': 'delete-jane'})
+        assert retry.json['_id'] == response.json['_id']
+
+    def test_create_task_in_background(self, client, user):
+        response = client.post('/tasks/create?async=true', data={'userid': user, 'title': 'Big', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b', 'c']})
+
+        job = self.poll(client, response.headers['Location'])
+        assert job['result']['title'] == 'Big'
+        assert len(job['result']['todos']) == 3
+
+    def test_unknown_job(self, client):
+        assert client.get(f'/jobs/{ObjectId()}').status_code == 404
+        assert client.get('/jobs/abc').status_code == 400
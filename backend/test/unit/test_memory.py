@@ -0,0 +1,184 @@
+import pytest
+from unittest.mock import patch
+from bson.objectid import ObjectId
+from pymongo import InsertOne, UpdateOne, DeleteOne
+from pymongo.errors import WriteError, DuplicateKeyError, BulkWriteError
+from src.util.memory import MemoryDatabase
+from src.util.validators import getValidator
+from src.util.dao import DAO, ensured
+from src.controllers.taskcontroller import TaskController
+from src.util.querytracker import track
+
+
+class TestMemoryCollection:
+    @pytest.fixture
+    def database(self):
+        return MemoryDatabase('test')
+
+    @pytest.fixture
+    def users(self, database):
+        collection = database.create_collection('user', validator=getValidator('user'))
+        collection.create_index([('email', 1)], name='email_unique', unique=True)
+        return collection
+
+    def test_insert_and_find(self, users):
+        result = users.insert_one({'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'})
+
+        assert users.find_one({'_id': result.inserted_id})['email'] == 'jane@doe.com'
+        assert users.find_one({'email': 'jane@doe.com'}, {'email': 1}) == {'_id': result.inserted_id, 'email': 'jane@doe.com'}
+        assert users.find_one({'email': 'john@doe.com'}) is None
+
+    def test_returned_documents_are_copies(self, users):
+        id = users.insert_one({'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com', 'tasks': []}).inserted_id
+
+        users.find_one({'_id': id})['tasks'].append(ObjectId())
+
+        assert users.find_one({'_id': id})['tasks'] == []
+
+    def test_validator(self, users):
+        with pytest.raises(WriteError) as e:
+            users.insert_one({'firstName': 'Jane', 'lastName': 'Doe'})
+        assert e.value.code == 121
+
+        id = users.insert_one({'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'}).inserted_id
+        with pytest.raises(WriteError):
+            users.update_one({'_id': id}, {'$push': {'tasks': 'not an id'}})
+        assert 'tasks' not in users.find_one({'_id': id})
+
+    def test_unique_index(self, users):
+        users.insert_one({'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'})
+        id = users.insert_one({'firstName': 'John', 'lastName': 'Doe', 'email': 'john@doe.com'}).inserted_id
+
+        with pytest.raises(DuplicateKeyError):
+            users.insert_one({'firstName': 'Jane', 'lastName': 'Roe', 'email': 'jane@doe.com'})
+        with pytest.raises(DuplicateKeyError):
+            users.update_one({'_id': id}, {'$set': {'email': 'jane@doe.com'}})
+
+        users.update_one({'_id': id}, {'$set': {'email': 'johnny@doe.com'}})
+        assert users.find_one({'email': 'johnny@doe.com'})['_id'] == id
+        assert users.find_one({'email': 'john@doe.com'}) is None
+
+    def test_insert_many_unordered(self, users):
+        documents = [{'firstName': 'A', 'lastName': 'B', 'email': email} for email in ['a', 'a', 'b']]
+
+        with pytest.raises(BulkWriteError) as e:
+            users.insert_many(documents, ordered=False)
+
+        assert [error['index'] for error in e.value.details['writeErrors']] == [1]
+        assert e.value.details['nInserted'] == 2
+
+    def test_query_operators(self, database):
+        collection = database['test']
+        collection.insert_many([{'n': n, 'tags': ['even' if n % 2 == 0 else 'odd']} for n in range(10)])
+
+        assert [d['n'] for d in collection.find({'n': {'$gte': 3, '$lt': 6}})] == [3, 4, 5]
+        assert [d['n'] for d in collection.find({'n': {'$in': [1, 8]}})] == [1, 8]
+        assert len(list(collection.find({'tags': 'even'}))) == 5
+        assert [d['n'] for d in collection.find({'$or': [{'n': 0}, {'n': 9}]})] == [0, 9]
+        assert [d['n'] for d in collection.find({'missing': {'$exists': False}}, sort=[('n', -1)], limit=2)] == [9, 8]
+
+    def test_update_operators(self, database):
+        collection = database['test']
+        id = collection.insert_one({'items': [1], 'count': 1}).inserted_id
+
+        result = collection.update_one({'_id': id}, {'$push': {'items': {'$each': [2, 3]}}, '$inc': {'count': 2, 'nested.count': 1}})
+        collection.update_one({'_id': id}, {'$pull': {'items': {'$in': [1]}}})
+
+        assert result.matched_count == 1 and result.modified_count == 1
+        assert collection.find_one({'_id': id}) == {'_id': id, 'items': [2, 3], 'count': 3, 'nested': {'count': 1}}
+
+    def test_bulk_write(self, database):
+        collection = database['test']
+        id = collection.insert_one({'n': 1}).inserted_id
+
+        result = collection.bulk_write([InsertOne({'n': 2}), UpdateOne({'_id': id}, {'$set': {'n': 3}}), DeleteOne({'n': 2})])
+
+        assert (result.inserted_count, result.modified_count, result.deleted_count) == (1, 1, 1)
+        assert [d['n'] for d in collection.find()] == [3]
+
+    def test_lookup(self, database):
+        videos = database['video']
+        tasks = database['task']
+        videoid = videos.insert_one({'url': 'abc'}).inserted_id
+        tasks.insert_one({'title': 'Task', 'video': videoid})
+
+        result = list(tasks.aggregate([
+            {'$lookup': {'from': 'video', 'localField': 'video', 'foreignField': '_id', 'as': 'video'}},
+            {'$set': {'video': {'$ifNull': [{'$arrayElemAt': ['$video', 0]}, None]}}},
+            {'$project': {'title': 1, 'video': 1, '_id': 0}}
+        ]))
+
+        assert result == [{'title': 'Task', 'video': {'_id': videoid, 'url': 'abc'}}]
+
+    def test_transaction_rolls_back(self, database):
+        collection = database['test']
+        collection.insert_one({'n': 1})
+
+        def callback(session):
+            collection.insert_one({'n': 2}, session=session)
+            raise WriteError('failed', code=121)
+
+        with pytest.raises(WriteError):
+            database.client.start_session().with_transaction(callback)
+
+        assert [d['n'] for d in collection.find()] == [1]
+
+
+class TestMemoryEngine:
+    @pytest.fixture
+    def daos(self):
+        database = MemoryDatabase('edutask')
+        with patch('src.util.dao.getMemoryDatabase', return_value=database):
+            ensured.clear()
+            yield {name: DAO(collection_name=name, engine='memory') for name in ['task', 'video', 'todo', 'user']}
+        ensured.clear()
+
+    def test_tasks_of_user(self, daos):
+        sut = TaskController(tasks_dao=daos['task'], videos_dao=daos['video'], todos_dao=daos['todo'], users_dao=daos['user'])
+        user = daos['user'].create({'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'})
+
+        sut.create({'userid': user['_id']['$oid'], 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b']})
+        tasks = sut.get_tasks_of_user(user['_id']['$oid'])
+
+        assert len(tasks) == 1
+        assert tasks[0]['video']['url'] == 'abc'
+        assert [todo['description'] for todo in tasks[0]['todos']] == ['a', 'b']
+        assert daos['user'].report_indexes()['missing'] == []
+
+    def test_update_returns_document(self, daos):
+        user = daos['user'].create({'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'})
+
+        updated = daos['user'].update(user['_id']['$oid'], {'$set': {'firstName': 'John'}}, return_document=True, projection={'firstName': 1})
+
+        assert updated == {'_id': user['_id'], 'firstName': 'John'}
+        assert daos['user'].update(str(ObjectId()), {'$set': {'firstName': 'John'}}, return_document=True) is None
+
+    def test_drop_recreates_collection(self, daos):
+        daos['user'].create({'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'})
+
+        daos['user'].drop()
+        daos['user'].create({'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'})
+
+        assert len(daos['user'].find()) == 1
+        with pytest.raises(WriteError):
+            daos['user'].create({'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'})
+
+    def test_find_by_ids(self, daos):
+        ids = [daos['todo'].create({'description': f'todo {i}'})['_id']['$oid'] for i in range(5)]
+        missing = str(ObjectId())
+
+        result = daos['todo'].find_by_ids([ids[3], missing, ids[0], ids[3]], chunk_size=2)
+
+        assert [todo['description'] for todo in result['found']] == ['todo 3', 'todo 0', 'todo 3']
+        assert result['missing'] == [missing]
+
+    def test_find_by_ids_in_concurrent_chunks(self, daos):
+        ids = [daos['todo'].create({'description': f'todo {i}'})['_id']['$oid'] for i in range(10)]
+
+        with track() as tracker:
+            result = daos['todo'].find_by_ids(list(reversed(ids)), chunk_size=3)
+
+        assert [todo['description'] for todo in result['found']] == [f'todo {i}' for i in reversed(range(10))]
+        # the chunks are looked up on other threads, but recorded for the caller
+        assert tracker.count == 4
+
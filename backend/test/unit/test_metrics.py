@@ -0,0 +1,77 @@
+import threading
+import pytest
+from src.util import metrics
+from src.util.metrics import instrument, exposition, request_started, request_finished, collect
+
+
+class FakeDAO:
+    collection_name = 'test'
+
+    @instrument
+    def find(self):
+        return list(self.iter_find())
+
+    @instrument
+    def iter_find(self):
+        yield 1
+        yield 2
+
+    @instrument
+    def fail(self):
+        raise ValueError('failed')
+
+
+class TestMetrics:
+    @pytest.fixture(autouse=True)
+    def reset(self):
+        metrics.resetMetrics()
+        yield
+        metrics.resetMetrics()
+
+    def counter(self, name, **labels):
+        counters, _ = collect()
+        return counters.get((name, tuple(labels.items())), 0)
+
+    def test_outermost_operation_only(self):
+        FakeDAO().find()
+
+        assert self.counter('edutask_dao_operations_total', collection='test', operation='find') == 1
+        assert self.counter('edutask_dao_operations_total', collection='test', operation='iter_find') == 0
+
+    def test_generator_recorded_when_exhausted(self):
+        items = FakeDAO().iter_find()
+        assert self.counter('edutask_dao_operations_total', collection='test', operation='iter_find') == 0
+
+        assert list(items) == [1, 2]
+        assert self.counter('edutask_dao_operations_total', collection='test', operation='iter_find') == 1
+
+    def test_errors(self):
+        with pytest.raises(ValueError):
+            FakeDAO().fail()
+
+        assert self.counter('edutask_dao_operation_errors_total', collection='test', operation='fail') == 1
+
+    def test_shards_of_threads_are_summed(self):
+        threads = [threading.Thread(target=lambda: [FakeDAO().find() for _ in range(100)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(metrics.shards) == 4
+        assert self.counter('edutask_dao_operations_total', collection='test', operation='find') == 400
+        # the shards of the ended threads have been merged
+        assert len(metrics.shards) == 0
+        assert self.counter('edutask_dao_operations_total', collection='test', operation='find') == 400
+
+    def test_exposition(self):
+        start = request_started()
+        request_finished(start, '/users/<id>', 'GET', 200)
+
+        text = exposition(pools={'localhost:27017': {'open': 2, 'in_use': 1, 'max_in_use': 2, 'checkouts': 5, 'failed_checkouts': 0, 'timeouts': 0, 'cleared': 0}})
+
+        assert '# TYPE edutask_http_request_duration_seconds histogram' in text
+        assert 'edutask_http_requests_total{route="/users/<id>",method="GET",status="200"} 1' in text
+        assert 'edutask_http_request_duration_seconds_bucket{route="/users/<id>",method="GET",le="+Inf"} 1' in text
+        assert 'edutask_http_requests_in_flight 0' in text
+        assert 'edutask_mongo_pool_connections_in_use{address="localhost:27017"} 1' in text
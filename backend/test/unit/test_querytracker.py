@@ -0,0 +1,136 @@
+import pytest
+from unittest.mock import patch
+from bson.objectid import ObjectId
+
+from src.util.querytracker import QueryTracker, shape, track, querybudget
+
+
+class TestQueryTracker:
+    def test_shape_ignores_values(self):
+        assert shape({'_id': ObjectId()}) == shape({'_id': ObjectId()})
+        assert shape({'_id': {'$in': [ObjectId(), ObjectId()]}}) == shape({'_id': {'$in': [ObjectId()]}})
+        assert shape({'_id': ObjectId()}) != shape({'email': 'jane@doe.com'})
+        assert shape(None) is None
+
+    def test_shape_keeps_order_of_stages(self):
+        assert shape([{'$match': {'_id': ObjectId()}}, {'$project': {'_id': 1}}]) != shape([{'$project': {'_id': 1}}, {'$match': {'_id': ObjectId()}}])
+
+    def test_repeated(self):
+        tracker = QueryTracker()
+        for _ in range(3):
+            tracker.record('find', 'video', {'_id': ObjectId()})
+        tracker.record('find', 'task', {'_id': ObjectId()})
+
+        assert tracker.count == 4
+        assert [(group['collection'], group['count']) for group in tracker.repeated()] == [('video', 3)]
+
+    def test_enclosing_tracker_receives_queries(self):
+        with track() as outer:
+            with track() as inner:
+                inner.record('find', 'user')
+
+        assert inner is outer
+        assert outer.count == 1
+
+    def test_budget_exceeded(self):
+        with pytest.raises(AssertionError):
+            with querybudget(1) as tracker:
+                tracker.record('find', 'user')
+                tracker.record('find', 'user')
+
+        with pytest.raises(AssertionError):
+            with querybudget(5, repeated=1) as tracker:
+                tracker.record('find', 'user', {'_id': ObjectId()})
+                tracker.record('find', 'user', {'_id': ObjectId()})
+
+    def test_nested_budget(self):
+        with querybudget(4, repeated=3) as outer:
+            outer.record('find', 'user', {'_id': ObjectId()})
+            outer.record('find', 'user', {'_id': ObjectId()})
+            # only the queries within the inner context count against its budget
+            with querybudget(1, repeated=1) as inner:
+                inner.record('find', 'user', {'_id': ObjectId()})
+
+            with pytest.raises(AssertionError):
+                with querybudget(0):
+                    inner.record('find', 'task')
+
+
+class TestQueryBudgets:
+    """Maximum number of queries per endpoint, such that N+1 regressions (e.g., one query per task of a user) fail."""
+
+    @pytest.fixture
+    def client(self, memoryclient):
+        return memoryclient
+
+    @pytest.fixture
+    def user(self, client):
+        response = client.post('/users/create', data={'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'})
+        userid = response.json['_id']['$oid']
+        for i in range(5):
+            client.post('/tasks/create', data={'userid': userid, 'title': f'Task {i}', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b']})
+        return userid
+
+    def test_tasks_of_user(self, client, user):
+        with querybudget(2):
+            response = client.get(f'/tasks/ofuser/{user}')
+
+        assert response.status_code == 200
+        assert len(response.json) == 5
+
+    def test_task(self, client, user):
+        taskid = client.get(f'/tasks/ofuser/{user}').json[0]['_id']['$oid']
+
+        with querybudget(2):
+            response = client.get(f'/tasks/byid/{taskid}')
+
+        assert response.status_code == 200
+
+    def test_create_task(self, client, user):
+        # including the one update of the dashboard of the user
+        with querybudget(7, repeated=1):
+            response = client.post('/tasks/create', data={'userid': user, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b', 'c']})
+
+        assert response.status_code == 200
+
+    def test_create_task_returns_new_task(self, client, user):
+        response = client.post('/tasks/create', data={'userid': user, 'title': 'New', 'description': 'Do it', 'url': 'abc', 'todos': ['a']})
+
+        assert response.json['title'] == 'New'
+        assert [todo['description'] for todo in response.json['todos']] == ['a']
+
+    def test_update_user(self, client, user):
+        # the update returning the user, the increment of its version and the update of its dashboard
+        with querybudget(3):
+            response = client.put(f'/users/{user}', data={'firstName': 'John'})
+
+        assert response.status_code == 200
+        assert response.json['firstName'] == 'John'
+
+    def test_user(self, client, user):
+        with querybudget(2):
+            response = client.get(f'/users/{user}')
+
+        assert response.status_code == 200
+
+    def test_delete_user(self, client, user):
+        # including the removal of the dashboard of the user
+        with querybudget(8, repeated=1):
+            response = client.delete(f'/users/{user}')
+
+        assert response.status_code == 200
+
+    def test_async_tasks_of_user(self, client, user):
+        with querybudget(1) as tracker:
+            response = client.get(f'/tasks/async/ofuser/{user}')
+
+        assert response.status_code == 200
+        # the queries run on the threads of the asynchronous data access objects are recorded as well
+        assert tracker.count == 1
+
+    def test_count_header_in_debug_mode(self, client, user):
+        with patch.dict('src.util.config.config', {'QUERY_DEBUG': 'true'}):
+            response = client.get(f'/tasks/ofuser/{user}')
+
+        assert response.headers['X-Query-Count'] == '2'
+        assert response.headers['X-Query-Repeated'] == '0'
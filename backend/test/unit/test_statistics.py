@@ -0,0 +1,106 @@
+import pytest
+from datetime import timedelta
+from unittest.mock import patch
+from bson.objectid import ObjectId
+
+from src.util.statistics import Statistics, utcnow
+
+
+@pytest.fixture
+def sut(memorydaos):
+    return Statistics(memorydaos['statistic'], users_dao=memorydaos['user'], tasks_dao=memorydaos['task'], todos_dao=memorydaos['todo'], ttl=60, categories=2)
+
+def create_user(daos, email):
+    return daos['user'].create({'firstName': 'Jane', 'lastName': 'Doe', 'email': email})['_id']['$oid']
+
+@pytest.fixture
+def users(memorydaos, controllers):
+    jane, john = create_user(memorydaos, 'jane@doe.com'), create_user(memorydaos, 'john@doe.com')
+    create_user(memorydaos, 'idle@doe.com')
+    past, future = utcnow() - timedelta(days=1), utcnow() + timedelta(days=1)
+    # one user with referenced todos and one with embedded todos (see src.util.taskstorage)
+    for embedded, userid in [(False, jane), (True, john)]:
+        _, tasks, _, _ = controllers(embedded)
+        tasks.create_many([
+            {'userid': userid, 'title': 'Late', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b'], 'duedate': past, 'categories': ['web', 'tools']},
+            {'userid': userid, 'title': 'Soon', 'description': 'Do it', 'url': 'abc', 'todos': ['c'], 'duedate': future, 'categories': ['web']},
+            {'userid': userid, 'title': 'Done', 'description': 'Do it', 'url': 'abc', 'todos': ['d'], 'duedate': past, 'categories': ['misc']}
+        ])
+        done = tasks.get_tasks_of_user(userid)[2]['todos'][0]['_id']['$oid']
+        if embedded:
+            memorydaos['task'].update_by({'todos._id': ObjectId(done)}, {'$set': {'todos.$.done': True}})
+        else:
+            memorydaos['todo'].update(done, {'$set': {'done': True}})
+    return jane, john
+
+
+class TestStatistics:
+    @pytest.mark.parametrize('index', [0, 1])
+    def test_of_user(self, sut, users, index):
+        figures = sut.of_user(users[index])
+
+        assert figures['tasks'] == {'total': 3, 'overdue': 1}
+        assert figures['todos'] == {'total': 4, 'done': 1, 'completion': 0.25}
+        assert figures['categories'] == [{'category': 'web', 'tasks': 2}, {'category': 'misc', 'tasks': 1}]
+
+    def test_of_user_without_tasks(self, sut, memorydaos):
+        userid = create_user(memorydaos, 'idle@doe.com')
+
+        assert sut.of_user(userid) == {'tasks': {'total': 0, 'overdue': 0}, 'todos': {'total': 0, 'done': 0, 'completion': None}, 'categories': []}
+        assert sut.of_user(str(ObjectId())) is None
+
+    def test_overview(self, sut, users):
+        overview = sut.overview()
+
+        assert overview['users'] == 3
+        assert overview['tasks'] == {'total': 6, 'overdue': 2, 'perUser': 2, 'max': 3}
+        assert overview['todos'] == {'total': 8, 'done': 2, 'completion': 0.25}
+        assert overview['categories'] == [{'category': 'web', 'tasks': 4}, {'category': 'misc', 'tasks': 2}]
+
+    def test_overview_ignores_deleted_tasks(self, sut, memorydaos, users):
+        # the id of a deleted task remains in the tasks of its user
+        memorydaos['user'].update(users[0], {'$push': {'tasks': ObjectId()}})
+
+        assert sut.overview()['tasks'] == {'total': 6, 'overdue': 2, 'perUser': 2, 'max': 3}
+
+    def test_overview_is_served_stored(self, sut, memorydaos, users):
+        first = sut.overview()
+        create_user(memorydaos, 'new@doe.com')
+
+        with patch.object(sut, 'compute') as compute:
+            assert sut.overview() == first
+        compute.assert_not_called()
+
+    def test_expired_overview_is_refreshed_once(self, sut, memorydaos, users):
+        first = sut.overview()
+        create_user(memorydaos, 'new@doe.com')
+        memorydaos['statistic'].update_by({'name': 'overview'}, {'$set': {'claimed': utcnow() - timedelta(seconds=61)}})
+
+        # the expired figures are served, while one of the requests refreshes them in the background
+        with patch('src.util.statistics.threading.Thread') as thread:
+            assert sut.overview() == first
+            assert sut.overview() == first
+        assert thread.call_count == 1
+
+        sut.refresh()
+        assert sut.overview()['users'] == 4
+
+    def test_empty(self, sut):
+        overview = sut.overview()
+
+        assert overview['users'] == 0 and overview['tasks']['perUser'] is None
+        assert overview['todos']['completion'] is None
+
+
+class TestStatisticsEndpoints:
+    def test_endpoints(self, memoryclient):
+        userid = memoryclient.post('/users/create', data={'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'}).json['_id']['$oid']
+        memoryclient.post('/tasks/create', data={'userid': userid, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b']})
+
+        assert memoryclient.get(f'/statistics/users/{userid}').json['todos'] == {'total': 2, 'done': 0, 'completion': 0}
+        overview = memoryclient.get('/statistics').json
+        assert overview['users'] == 1 and '$date' in overview['computed']
+
+    def test_errors(self, memoryclient):
+        assert memoryclient.get(f'/statistics/users/{ObjectId()}').status_code == 404
+        assert memoryclient.get('/statistics/users/abc').status_code == 400
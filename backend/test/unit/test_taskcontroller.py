@@ -0,0 +1,133 @@
+import pytest
+from unittest.mock import Mock
+from bson.objectid import ObjectId
+from pymongo.errors import WriteError
+from src.controllers.taskcontroller import TaskController
+
+
+def create_many(documents, **kwargs):
+    """Simulate DAO.create_many, which returns all documents with a new id."""
+    return {'inserted': [dict(document, _id={'$oid': str(ObjectId())}) for document in documents], 'errors': []}
+
+
+class TestTaskController:
+    @pytest.fixture
+    def daos(self):
+        daos = {}
+        for name in ['task', 'video', 'todo', 'user']:
+            daos[name] = Mock()
+            daos[name].collection_name = name
+        return daos
+
+    @pytest.fixture
+    def sut(self, daos):
+        return TaskController(tasks_dao=daos['task'], videos_dao=daos['video'], todos_dao=daos['todo'], users_dao=daos['user'])
+
+    def test_create_batched(self, sut, daos):
+        for dao in daos.values():
+            dao.create_many.side_effect = create_many
+        userid = str(ObjectId())
+
+        taskid = sut.create({'userid': userid, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b', 'c']})
+
+        assert daos['video'].create_many.call_count == 1
+        assert len(daos['todo'].create_many.call_args.args[0]) == 3
+        task = daos['task'].create_many.call_args.args[0][0]
+        assert 'userid' not in task and 'url' not in task
+        assert len(task['todos']) == 3
+        requests = daos['user'].bulk_write.call_args.args[0]
+        assert len(requests) == 1
+        assert requests[0]._filter == {'_id': ObjectId(userid)}
+        assert requests[0]._doc == {'$push': {'tasks': {'$each': [ObjectId(taskid)]}}}
+        daos['todo'].create.assert_not_called()
+
+    def test_create_many_for_several_users(self, sut, daos):
+        for dao in daos.values():
+            dao.create_many.side_effect = create_many
+        users = [str(ObjectId()), str(ObjectId())]
+
+        taskids = sut.create_many([{'userid': users[i % 2], 'title': f'Task {i}', 'description': 'Do it', 'url': 'abc', 'todos': ['a']} for i in range(5)])
+
+        assert len(taskids) == 5
+        assert daos['task'].create_many.call_count == 1
+        assert daos['user'].bulk_write.call_count == 1
+        assert len(daos['user'].bulk_write.call_args.args[0]) == 2
+
+    def test_create_removes_orphans_on_failure(self, sut, daos):
+        daos['video'].create_many.side_effect = create_many
+        daos['todo'].create_many.return_value = {'inserted': [], 'errors': [{'index': 0, 'code': 121, 'errmsg': 'Document failed validation'}]}
+
+        with pytest.raises(WriteError):
+            sut.create({'userid': str(ObjectId()), 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a']})
+
+        assert len(daos['video'].delete_many.call_args.args[0]) == 1
+        daos['task'].create_many.assert_not_called()
+        daos['user'].bulk_write.assert_not_called()
+
+    def test_create_without_userid(self, sut):
+        with pytest.raises(KeyError):
+            sut.create({'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': []})
+
+    def test_get_tasks_of_user_single_round_trip(self, sut, daos):
+        task = {'_id': {'$oid': str(ObjectId())}, 'title': 'Task', 'video': {'url': 'abc'}, 'todos': []}
+        daos['user'].aggregate.return_value = [{'tasks': [task]}]
+
+        tasks = sut.get_tasks_of_user(str(ObjectId()))
+
+        assert tasks == [task]
+        daos['user'].aggregate.assert_called_once()
+        daos['user'].findOne.assert_not_called()
+        daos['video'].findOne.assert_not_called()
+        daos['todo'].find.assert_not_called()
+
+    def test_get_tasks_of_user_lookup_into_tasks(self, sut, daos):
+        daos['user'].aggregate.return_value = [{'tasks': []}]
+        userid = str(ObjectId())
+
+        sut.get_tasks_of_user(userid)
+
+        pipeline = daos['user'].aggregate.call_args.args[0]
+        assert pipeline[0] == {'$match': {'_id': ObjectId(userid)}}
+        assert pipeline[1]['$lookup']['from'] == 'task'
+        assert pipeline[1]['$lookup']['pipeline'] == sut.populate_stages()
+
+    def test_get_tasks_of_unknown_user(self, sut, daos):
+        daos['user'].aggregate.return_value = []
+        assert sut.get_tasks_of_user(str(ObjectId())) == []
+
+    def test_get_unknown_task(self, sut, daos):
+        daos['task'].aggregate.return_value = []
+        assert sut.get(str(ObjectId())) is None
+
+    def test_populate_task(self, sut, daos):
+        taskid = str(ObjectId())
+        video = {'_id': {'$oid': str(ObjectId())}, 'url': 'abc'}
+        todos = [{'_id': {'$oid': str(ObjectId())}, 'description': 'Watch video', 'done': False}]
+        daos['task'].aggregate.return_value = [{'_id': {'$oid': taskid}, 'video': video, 'todos': todos}]
+
+        task = sut.populate_task({'_id': {'$oid': taskid}, 'video': {'$oid': video['_id']['$oid']}, 'todos': [{'$oid': todos[0]['_id']['$oid']}]})
+
+        assert task['video'] == video
+        assert task['todos'] == todos
+        daos['task'].aggregate.assert_called_once()
+
+    def test_delete_user_one_delete_many_per_collection(self, sut, daos):
+        userid, taskids = str(ObjectId()), [str(ObjectId()), str(ObjectId())]
+        daos['user'].findOne.return_value = {'_id': {'$oid': userid}, 'tasks': [{'$oid': id} for id in taskids]}
+        daos['task'].find_by_ids.return_value = {'found': [
+            {'_id': {'$oid': id}, 'video': {'$oid': str(ObjectId())}, 'todos': [{'$oid': str(ObjectId())} for _ in range(3)]} for id in taskids], 'missing': []}
+        for name, dao in daos.items():
+            dao.delete_many.side_effect = lambda ids, session=None: len(ids)
+
+        counts = sut.delete_user(userid)
+
+        assert counts == {'user': 1, 'task': 2, 'video': 2, 'todo': 6}
+        for dao in daos.values():
+            dao.delete.assert_not_called()
+            assert dao.delete_many.call_count == 1
+
+    def test_delete_of_user_keeps_user(self, sut, daos):
+        daos['user'].findOne.return_value = {'_id': {'$oid': str(ObjectId())}, 'tasks': []}
+
+        assert sut.delete_of_user(str(ObjectId())) == 0
+        daos['user'].delete_many.assert_not_called()
@@ -0,0 +1,155 @@
+import copy
+import pytest
+from unittest.mock import patch
+from bson.objectid import ObjectId
+from pymongo.errors import WriteError
+
+from src.util.taskstorage import Migration, getTaskStorage, positional
+from src.util.validators import getValidator
+
+
+def shape(tasks):
+    """The json of tasks without the ids, which differ between the storage modes."""
+    return [(task['title'], task['video']['url'], [(todo['description'], todo['done']) for todo in task['todos']]) for task in tasks]
+
+
+class TestTaskStorage:
+    def test_configuration(self):
+        with patch.dict('src.util.config.config', {}, clear=True):
+            assert getTaskStorage() == 'reference'
+        with patch.dict('src.util.config.config', {'TASK_STORAGE': 'embedded'}):
+            assert getTaskStorage() == 'embedded'
+        with patch.dict('src.util.config.config', {'TASK_STORAGE': 'nested'}):
+            with pytest.raises(ValueError):
+                getTaskStorage()
+
+    def test_positional(self):
+        assert positional({'done': True}) == {'$set': {'todos.$.done': True}}
+        assert positional({'$set': {'done': True}, '$unset': {'note': ''}}) == {'$set': {'todos.$.done': True}, '$unset': {'todos.$.note': ''}}
+
+    @pytest.mark.parametrize('embedded', [False, True])
+    def test_same_json_in_both_modes(self, memorydaos, user, embedded, controllers):
+        _, tasks, todos, _ = controllers(embedded)
+
+        tasks.create({'userid': user, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b']})
+        result = tasks.get_tasks_of_user(user)
+
+        assert shape(result) == [('Task', 'abc', [('a', False), ('b', False)])]
+        assert shape([tasks.get(result[0]['_id']['$oid'])]) == shape(result)
+        assert (memorydaos['todo'].find() == []) == embedded
+        assert (memorydaos['video'].find() == []) == embedded
+
+    @pytest.mark.parametrize('embedded', [False, True])
+    def test_todo_operations(self, user, embedded, controllers):
+        _, tasks, todos, _ = controllers(embedded)
+        taskid = tasks.create({'userid': user, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a']})
+
+        created = todos.create({'taskid': taskid, 'description': 'b'})
+        first = tasks.get(taskid)['todos'][0]['_id']['$oid']
+        updated = todos.update(first, {'$set': {'done': True}}, return_document=True)
+
+        assert updated['done'] is True
+        assert todos.get(created['_id']['$oid'])['description'] == 'b'
+        assert [todo['description'] for todo in todos.get_many([created['_id']['$oid'], first])['found']] == ['b', 'a']
+        assert todos.delete(created['_id']['$oid']) is True
+        assert todos.delete(created['_id']['$oid']) is False
+        assert todos.update(str(ObjectId()), {'$set': {'done': True}}) is False
+        assert shape([tasks.get(taskid)]) == [('Task', 'abc', [('a', True)])]
+
+    def test_batch_on_embedded_todos(self, memorydaos, user, controllers):
+        _, tasks, todos, _ = controllers(True)
+        taskid = tasks.create({'userid': user, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b']})
+        a, b = [todo['_id']['$oid'] for todo in tasks.get(taskid)['todos']]
+
+        results = todos.batch([
+            {'op': 'create', 'taskid': taskid, 'description': 'c'},
+            {'op': 'update', 'id': a, 'data': {'description': 'A'}},
+            {'op': 'delete', 'id': b},
+            {'op': 'done', 'taskid': taskid}
+        ])
+
+        assert all(result['ok'] for result in results)
+        # done applies to the todos the task had before the batch
+        assert shape([tasks.get(taskid)]) == [('Task', 'abc', [('A', True), ('c', False)])]
+        assert memorydaos['todo'].find() == []
+
+    def test_validator(self, memorydaos):
+        with pytest.raises(WriteError):
+            memorydaos['task'].create({'title': 'Task', 'description': 'Do it', 'todos': [{'_id': ObjectId(), 'done': False}]})
+
+
+class TestMigration:
+    @pytest.fixture
+    def migration(self, memorydaos):
+        return Migration(memorydaos['task'], memorydaos['video'], memorydaos['todo'], memorydaos['migration'])
+
+    @pytest.fixture
+    def tasks(self, user, controllers):
+        _, sut, _, _ = controllers(False)
+        for i in range(5):
+            sut.create({'userid': user, 'title': f'Task {i}', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b']})
+        return sut
+
+    def test_embed_and_back(self, memorydaos, user, migration, tasks, controllers):
+        before = shape(tasks.get_tasks_of_user(user))
+
+        state = migration.run('embedded', batch_size=2)
+
+        assert state['complete'] and state['converted'] == 5
+        assert memorydaos['todo'].find() == [] and memorydaos['video'].find() == []
+        assert shape(controllers(True)[1].get_tasks_of_user(user)) == before
+
+        state = migration.run('reference', batch_size=2)
+
+        assert state['converted'] == 5
+        assert len(memorydaos['todo'].find()) == 10 and len(memorydaos['video'].find()) == 5
+        assert all(isinstance(todo, ObjectId) for task in memorydaos['task'].collection.find() for todo in task['todos'])
+        assert shape(tasks.get_tasks_of_user(user)) == before
+
+    def test_resume(self, user, migration, tasks):
+        state = migration.run('embedded', batch_size=2, max_batches=1)
+
+        assert not state['complete'] and state['converted'] == 2
+        assert migration.status()['after'] == state['after']
+        # the reads handle the partially converted tasks
+        assert len(tasks.get_tasks_of_user(user)) == 5
+
+        state = migration.run('embedded', batch_size=2)
+
+        assert state['complete'] and state['converted'] == 5
+        assert migration.status()['complete']
+
+    def test_carries_over_modifications(self, memorydaos, user, migration, tasks, controllers):
+        task = tasks.get_tasks_of_user(user)[0]
+        todoid = task['todos'][0]['_id']['$oid']
+        original = migration._converted
+
+        def modify(*args, **kwargs):
+            # a todo is modified after it has been read by the migration, but before its task is converted
+            memorydaos['todo'].update(todoid, {'$set': {'done': True}})
+            migration._converted = original
+            return original(*args, **kwargs)
+
+        migration._converted = modify
+        migration.run('embedded')
+
+        assert controllers(True)[2].get(todoid)['done'] is True
+
+    def test_unknown_target(self, migration):
+        with pytest.raises(ValueError):
+            migration.run('nested')
+
+    def test_existing_collection(self, memorydaos, user, controllers):
+        # a task collection created before the embedded storage mode, whose validator only accepts references
+        validator = copy.deepcopy(getValidator('task'))
+        validator['$jsonSchema']['properties']['todos']['items'] = {'bsonType': 'objectId'}
+        validator['$jsonSchema']['properties']['video'] = {'bsonType': 'objectId'}
+        memorydaos['user'].collection.database.create_collection('task', validator=validator)
+        _, tasks, _, _ = controllers(False)
+        tasks.create({'userid': user, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a', 'b']})
+
+        state = Migration(memorydaos['task'], memorydaos['video'], memorydaos['todo'], memorydaos['migration']).run('embedded')
+
+        assert state['complete'] and state['converted'] == 1
+        controllers(True)[1].create({'userid': user, 'title': 'Embedded', 'description': 'Do it', 'url': 'abc', 'todos': ['c']})
+        assert len(controllers(True)[1].get_tasks_of_user(user)) == 2
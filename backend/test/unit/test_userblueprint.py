@@ -0,0 +1,60 @@
+import pytest
+import json
+from unittest.mock import patch
+from bson.objectid import ObjectId
+
+from main import create_app
+
+
+class TestGetUsers:
+    @pytest.fixture
+    def users(self):
+        return [{'_id': {'$oid': str(ObjectId())}, 'firstName': f'User {i}'} for i in range(3)]
+
+    @pytest.fixture
+    def client(self):
+        return create_app().test_client()
+
+    def test_all_users(self, client, users):
+        with patch('src.blueprints.userblueprint.controller') as mockedcontroller:
+            mockedcontroller.get_all.return_value = users
+            response = client.get('/users/all')
+
+        assert response.status_code == 200
+        assert response.json == users
+
+    def test_page_of_users(self, client, users):
+        with patch('src.blueprints.userblueprint.controller') as mockedcontroller:
+            mockedcontroller.get_page.return_value = iter(users[:2])
+            response = client.get(f'/users/all?limit=2&after={users[0]["_id"]["$oid"]}')
+            mockedcontroller.get_page.assert_called_once_with(limit=2, after=users[0]['_id']['$oid'])
+
+        assert response.json == users[:2]
+        assert response.headers['X-Next-After'] == users[1]['_id']['$oid']
+
+    def test_last_page_of_users(self, client, users):
+        with patch('src.blueprints.userblueprint.controller') as mockedcontroller:
+            mockedcontroller.get_page.return_value = iter(users[:1])
+            response = client.get('/users/all?limit=2')
+
+        assert 'X-Next-After' not in response.headers
+
+    def test_stream_users(self, client, users):
+        with patch('src.blueprints.userblueprint.controller') as mockedcontroller:
+            mockedcontroller.get_page.return_value = iter(users)
+            response = client.get('/users/all?stream=true')
+            lines = response.get_data(as_text=True).splitlines()
+
+        assert response.mimetype == 'application/x-ndjson'
+        assert [json.loads(line) for line in lines] == users
+
+    @pytest.mark.parametrize('query', ['limit=-1', 'limit=abc', 'limit=2&after=abc', 'stream=true&after=abc'])
+    def test_invalid_page_of_users(self, memoryclient, query):
+        assert memoryclient.get(f'/users/all?{query}').status_code == 400
+
+    def test_cursor_is_exposed_to_cross_origin_clients(self, client, users):
+        with patch('src.blueprints.userblueprint.controller') as mockedcontroller:
+            mockedcontroller.get_page.return_value = iter(users[:2])
+            response = client.get('/users/all?limit=2', headers={'Origin': 'http://localhost:3000'})
+
+        assert 'X-Next-After' in response.headers['Access-Control-Expose-Headers']
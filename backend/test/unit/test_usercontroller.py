@@ -9,7 +9,7 @@ class TestUserController:
         return Mock()
 
     def test_get_user_by_email_valid(self, mock):
-        mock.find.return_value = [{'email': 'smith@gmail.com', 'name': 'Smith'}]
+        mock.find_one_by.return_value = {'email': 'smith@gmail.com', 'name': 'Smith'}
         user_controller = UserController(mock)
         user = user_controller.get_user_by_email('smith@gmail.com')
         assert user == {'email': 'smith@gmail.com', 'name': 'Smith'}
@@ -20,19 +20,20 @@ class TestUserController:
             user_controller.get_user_by_email('abcd123')
 
     def test_get_user_by_email_nonexistent(self, mock):
-        mock.find.return_value = []
+        mock.find_one_by.return_value = None
         user_controller = UserController(mock)
         user = user_controller.get_user_by_email('nonexistent@example.com')
         assert user is None, "The user does not exist"
 
-    def test_get_user_by_email_multiple_users(self, mock):
-        mock.find.return_value = [{'email': 'smith@gmail.com', 'name': 'Smith'}, {'email': 'smith@gmail.com', 'name': 'John'}]
+    def test_get_user_by_email_indexed_lookup(self, mock):
+        mock.find_one_by.return_value = {'email': 'smith@gmail.com', 'name': 'Smith'}
         user_controller = UserController(mock)
-        user = user_controller.get_user_by_email('smith@gmail.com')
-        assert user == {'email': 'smith@gmail.com', 'name': 'Smith'}
+        user_controller.get_user_by_email('smith@gmail.com')
+        mock.find_one_by.assert_called_once_with({'email': 'smith@gmail.com'})
+        mock.find.assert_not_called()
 
     def test_get_user_by_email_database_connection_failure(self, mock):
-        mock.find.side_effect = ConnectionError("Database connection failed")
+        mock.find_one_by.side_effect = ConnectionError("Database connection failed")
         with pytest.raises(ConnectionError, match="Database connection failed"):
             user_controller = UserController(mock)
             user_controller.get_user_by_email('test@example.com')
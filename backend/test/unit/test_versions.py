@@ -0,0 +1,130 @@
+import pytest
+import json
+from unittest.mock import patch
+
+from bson.objectid import ObjectId
+from pymongo import DeleteMany, UpdateOne
+
+from src.util.cache import DocumentCache
+from src.util.daos import getDao
+from src.util.querytracker import querybudget
+from src.util.versions import getVersions
+
+
+class TestConditionalGet:
+    @pytest.fixture
+    def client(self, memoryclient):
+        return memoryclient
+
+    @pytest.fixture
+    def user(self, client):
+        response = client.post('/users/create', data={'firstName': 'Jane', 'lastName': 'Doe', 'email': 'jane@doe.com'})
+        userid = response.json['_id']['$oid']
+        client.post('/tasks/create', data={'userid': userid, 'title': 'Task', 'description': 'Do it', 'url': 'abc', 'todos': ['a']})
+        return userid
+
+    @pytest.fixture
+    def task(self, client, user):
+        return client.get(f'/tasks/ofuser/{user}').json[0]
+
+    def revalidate(self, client, url):
+        """Fetch the url, then revalidate it with the obtained ETag and return the status of the revalidation."""
+        etag = client.get(url).headers['ETag']
+        return client.get(url, headers={'If-None-Match': etag}).status_code
+
+    def test_not_modified_without_populating(self, client, user):
+        etag = client.get(f'/tasks/ofuser/{user}').headers['ETag']
+
+        with patch('src.blueprints.taskblueprint.controller') as mockedcontroller:
+            with querybudget(1):
+                response = client.get(f'/tasks/ofuser/{user}', headers={'If-None-Match': etag})
+
+        assert response.status_code == 304
+        assert response.data == b''
+        mockedcontroller.get_tasks_of_user.assert_not_called()
+
+    def test_user_update(self, client, user):
+        etag = client.get(f'/users/{user}').headers['ETag']
+
+        client.put(f'/users/{user}', data={'firstName': 'Janet'})
+
+        response = client.get(f'/users/{user}', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.json['firstName'] == 'Janet'
+        assert self.revalidate(client, f'/users/{user}') == 304
+
+    def test_todo_update(self, client, user, task):
+        etags = {url: client.get(url).headers['ETag'] for url in [f'/tasks/ofuser/{user}', f'/tasks/byid/{task["_id"]["$oid"]}']}
+
+        client.put(f'/todos/byid/{task["todos"][0]["_id"]["$oid"]}', data={'data': json.dumps({'$set': {'done': True}})})
+
+        for url, etag in etags.items():
+            assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
+
+    def test_todo_creation(self, client, user, task):
+        etag = client.get(f'/tasks/byid/{task["_id"]["$oid"]}').headers['ETag']
+
+        client.post('/todos/create', data={'taskid': task['_id']['$oid'], 'description': 'b'})
+
+        response = client.get(f'/tasks/byid/{task["_id"]["$oid"]}', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert len(response.json['todos']) == 2
+
+    def test_task_creation(self, client, user):
+        etags = {url: client.get(url).headers['ETag'] for url in [f'/users/{user}', f'/tasks/ofuser/{user}']}
+
+        client.post('/tasks/create', data={'userid': user, 'title': 'Another', 'description': 'Do it', 'url': 'def', 'todos': ['c']})
+
+        for url, etag in etags.items():
+            assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
+
+    def test_restarted_counters(self, client, user):
+        etag = client.get(f'/users/{user}').headers['ETag']
+
+        # the counters restart at 0 (e.g., after a restore of the database) and reach the same version again
+        versions = getDao(collection_name='version')
+        count = versions.find_one_by({'_id': f'user:{user}'})['version']
+        versions.bulk_write([DeleteMany({})])
+        for _ in range(count):
+            getVersions().bump([f'user:{user}'])
+
+        assert versions.find_one_by({'_id': f'user:{user}'})['version'] == count
+        assert client.get(f'/users/{user}', headers={'If-None-Match': etag}).status_code == 200
+
+    def test_reads_do_not_create_counters(self, client, user):
+        versions = getDao(collection_name='version')
+        before = versions.find()
+
+        assert 'ETag' not in client.get(f'/users/{ObjectId()}').headers
+        assert client.get('/users/abc').status_code == 400
+        assert client.get('/tasks/ofuser/abc').status_code == 400
+        assert versions.find() == before
+
+    def test_lost_counters(self, client, user):
+        getDao(collection_name='version').bulk_write([DeleteMany({})])
+
+        # without a counter, the user is served without an ETag until it is modified again
+        assert 'ETag' not in client.get(f'/users/{user}').headers
+        client.put(f'/users/{user}', data={'firstName': 'Janet'})
+        assert self.revalidate(client, f'/users/{user}') == 304
+
+    def test_document_cache_is_bypassed(self, client, user):
+        users = getDao(collection_name='user')
+        with patch.object(users, 'cache', DocumentCache(ttl=60, max_entries=10, max_bytes=10000)):
+            etag = client.get(f'/users/{user}').headers['ETag']
+            users.findOne(user)
+            # another process modifies the user, while this process still caches it
+            users.collection.bulk_write([UpdateOne({'_id': ObjectId(user)}, {'$set': {'firstName': 'Janet'}})])
+            getVersions().bump([f'user:{user}'])
+
+            response = client.get(f'/users/{user}', headers={'If-None-Match': etag})
+
+        assert response.status_code == 200
+        assert response.json['firstName'] == 'Janet'
+
+    def test_async_user_deletion(self, client, user, task):
+        etag = client.get(f'/tasks/byid/{task["_id"]["$oid"]}').headers['ETag']
+
+        client.delete(f'/users/async/{user}')
+
+        assert client.get(f'/tasks/byid/{task["_id"]["$oid"]}', headers={'If-None-Match': etag}).status_code == 200
@@ -29,12 +29,9 @@ function TaskCreator(props) {
             method: 'post',
             body: data
         }).then(res => res.json())
-            .then(tasklist => {
-                let convertedTasks = [];
-                for (const task of tasklist) {
-                    convertedTasks.push(Converter.convertTask(task));
-                }
-                props.setTasks(convertedTasks);
+            .then(task => {
+                // the server responds with the new task only, which is appended to the current tasks
+                props.setTasks(tasks => [...tasks, Converter.convertTask(task)]);
             })
             .catch(function (error) {
                 console.error(error)
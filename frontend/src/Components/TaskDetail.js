@@ -20,7 +20,8 @@ function TaskDetail({ taskid, updateTasks }) {
     const updateTask = () => {
         fetch(`http://localhost:${process.env.REACT_APP_BACKEND_PORT}/tasks/byid/${taskid}`, {
             method: 'get',
-            headers: { 'Cache-Control': 'no-cache' }
+            // revalidate the stored response via its ETag (a 304 reuses it)
+            cache: 'no-cache'
         })
             .then(res => res.json())
             .then(tobj => {
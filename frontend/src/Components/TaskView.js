@@ -21,17 +21,16 @@ function TaskView(props) {
   }, []);
 
   /**
-   * Fetch all tasks associated to this user from the server
+   * Fetch all tasks associated to this user from the server (via the precomputed dashboard of the user)
    */
   const updateTasks = () => {
-    fetch(`http://localhost:${process.env.REACT_APP_BACKEND_PORT}/tasks/ofuser/${props.user._id}`, {
-      method: 'get',
-      headers: { 'Cache-Control': 'no-cache' }
+    fetch(`http://localhost:${process.env.REACT_APP_BACKEND_PORT}/users/${props.user._id}/dashboard`, {
+      method: 'get'
     })
       .then(res => res.json())
-      .then(tasklist => {
+      .then(dashboard => {
         let convertedTasks = [];
-        for (const task of tasklist) {
+        for (const task of dashboard.tasks) {
           convertedTasks.push(Converter.convertTask(task));
         }
         setTasks(convertedTasks);
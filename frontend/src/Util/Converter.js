@@ -15,6 +15,11 @@ module.exports = {
             })
         }
 
+        // the tasks of a dashboard carry the counts of their (done) todos
+        if (taskobj.total !== undefined) {
+            done = (taskobj.done === taskobj.total);
+        }
+
         let task = {
             _id: taskobj['_id']['$oid'],
             title: taskobj.title,